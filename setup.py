@@ -13,6 +13,22 @@ except ImportError:
 
     using_setuptools = False
 
+try:
+    from setuptools.command.build_py import build_py
+except ImportError:
+    from distutils.command.build_py import build_py
+
+
+class build_py_versioned(build_py):
+    # the asyncio proxy module uses Python 3.5+ syntax, don't install (and byte-compile) it on older versions
+    py3_only_modules = {("Pyro4", "aioproxy")}
+
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 5):
+            modules = [module for module in modules if module[:2] not in self.py3_only_modules]
+        return modules
+
 
 def pyro_test_suite():
     testloader = unittest.TestLoader()
@@ -55,6 +71,7 @@ The documentation can be found here: http://pyro4.readthedocs.io
         },
         package_dir={'': 'src'},
         packages=['Pyro4', 'Pyro4.socketserver', 'Pyro4.test', 'Pyro4.utils'],
+        cmdclass={"build_py": build_py_versioned},
         scripts=[],
         platforms="any",
         test_suite="setup.pyro_test_suite",
@@ -93,7 +110,8 @@ The documentation can be found here: http://pyro4.readthedocs.io
                 'pyro4-test-echoserver=Pyro4.test.echoserver:main',
                 'pyro4-check-config=Pyro4.configuration:main',
                 'pyro4-flameserver=Pyro4.utils.flameserver:main',
-                'pyro4-httpgateway=Pyro4.utils.httpgateway:main'
+                'pyro4-httpgateway=Pyro4.utils.httpgateway:main',
+                'pyro4-replay=Pyro4.utils.wirecapture:main'
             ]
         },
         options={"install": {"optimize": 0}}
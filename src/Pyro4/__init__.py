@@ -62,6 +62,7 @@ del _configLogging
 
 # import the required Pyro symbols into this package
 from Pyro4.configuration import config
-from Pyro4.core import URI, Proxy, Daemon, callback, batch, asyncproxy, oneway, expose, behavior, current_context
+from Pyro4.core import URI, Proxy, ProxyPool, LoadBalancedProxy, Daemon, callback, batch, asyncproxy, oneway, cacheable, expose, behavior
+from Pyro4.core import idempotent, current_context
 from Pyro4.core import _locateNS as locateNS, _resolve as resolve
 from Pyro4.futures import Future
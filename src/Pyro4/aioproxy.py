@@ -0,0 +1,453 @@
+"""
+Proxy for asyncio code: ``result = await proxy.method(args)``, without a thread per call.
+Requires Python 3.5 or newer (this module is not imported by the Pyro4 package itself).
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+import asyncio
+import collections
+import logging
+import struct
+import sys
+from Pyro4 import constants, core, errors, message, socketutil, util
+from Pyro4.configuration import config
+from Pyro4.core import current_context
+
+
+__all__ = ["AsyncProxy"]
+
+log = logging.getLogger("Pyro4.aioproxy")
+
+if sys.version_info >= (3, 7):
+    asyncio_current_task = asyncio.current_task
+else:
+    asyncio_current_task = asyncio.Task.current_task
+
+
+class _StreamConnection(object):
+    """
+    Connection over asyncio streams, that Message.send and Message.recv can use.
+    The frames of a message are first read (asynchronously) into a buffer, from which Message.recv then
+    parses the message as usual. Also holds the connection options that were negotiated in the handshake.
+    """
+    def __init__(self, reader, writer, objectId):
+        self.reader = reader
+        self.writer = writer
+        self.objectId = objectId
+        self.buffer = b""
+        self.position = 0
+        self.compressor = None
+        self.decompressor = None
+        self.hmac_digest = None
+        self.hmac_skip = False
+        self.fragments = False
+
+    def send(self, data):
+        self.writer.write(data)
+
+    def sendmsg(self, parts):
+        self.writer.writelines(parts)
+
+    def recv(self, size):
+        chunk = self.buffer[self.position:self.position + size]
+        if len(chunk) != size:
+            raise errors.ProtocolError("message data is incomplete")
+        self.position += size
+        return chunk
+
+    def close(self):
+        self.writer.close()
+
+    async def read_message(self):
+        """reads all frames of the next message into the buffer"""
+        try:
+            header = await self.reader.readexactly(message.Message.header_size)
+            msg = message.Message.from_header(header)
+            self.__check_size(msg.data_size + msg.annotations_size)
+            frames = [header, await self.reader.readexactly(msg.annotations_size + msg.data_size)]
+            if msg.flags & message.FLAGS_FRAGMENT:
+                total_size = self.__fragments_total(frames[1][:msg.annotations_size])
+                self.__check_size(total_size)
+                received = msg.data_size
+                while received < total_size:
+                    header = await self.reader.readexactly(message.Message.header_size)
+                    fragment = message.Message.from_header(header)
+                    frames.append(header)
+                    frames.append(await self.reader.readexactly(fragment.annotations_size + fragment.data_size))
+                    received += fragment.data_size
+        except asyncio.IncompleteReadError:
+            raise errors.ConnectionClosedError("receiving: connection lost")
+        except (OSError, ConnectionError) as x:
+            raise errors.ConnectionClosedError("receiving: connection lost: " + str(x))
+        self.buffer = b"".join(frames)
+        self.position = 0
+
+    @staticmethod
+    def __fragments_total(annotations_data):
+        i = 0
+        while i < len(annotations_data):
+            anno, length = struct.unpack("!4sH", annotations_data[i:i + 6])
+            if anno == b"FRAG":
+                return struct.unpack("!Q", annotations_data[i + 6:i + 6 + length])[0]
+            i += 6 + length
+        raise errors.ProtocolError("fragmented message without total size")
+
+    @staticmethod
+    def __check_size(size):
+        if 0 < config.MAX_MESSAGE_SIZE < size:
+            raise errors.MessageTooLargeError("max message size exceeded (%d where max=%d)" % (size, config.MAX_MESSAGE_SIZE))
+
+
+class _AsyncRemoteMethod(object):
+    """method call abstraction for the asyncio proxy, calling it returns a coroutine"""
+
+    def __init__(self, proxy, name, max_retries):
+        self.__proxy = proxy
+        self.__name = name
+        self.__max_retries = max_retries
+
+    def __getattr__(self, name):
+        return _AsyncRemoteMethod(self.__proxy, "%s.%s" % (self.__name, name), self.__max_retries)
+
+    def __call__(self, *args, **kwargs):
+        return self.__invoke(args, kwargs)
+
+    async def __invoke(self, args, kwargs):
+        for attempt in range(self.__max_retries + 1):
+            try:
+                return await self.__proxy._pyroInvoke(self.__name, args, kwargs)
+            except (errors.ConnectionClosedError, errors.TimeoutError):
+                # only retry for recoverable network errors
+                if attempt >= self.__max_retries:
+                    raise
+
+
+class _AsyncStreamResultIterator(object):
+    """
+    The asyncio proxy returns this as the result of a remote call which returns an iterator or generator.
+    It is an asynchronous iterator (use ``async for``) that gets the items one by one from the remote iterator.
+    """
+    def __init__(self, streamId, proxy, invoke):
+        self.streamId = streamId
+        self.proxy = proxy
+        self.__invoke = invoke
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.proxy is None:
+            raise StopAsyncIteration
+        if self.proxy._pyroConnection is None:
+            raise errors.ConnectionClosedError("the proxy for this stream result has been closed")
+        value, is_exception = await self.__invoke("get_next_stream_item", [self.streamId], {}, 0, constants.DAEMON_NAME)
+        if is_exception:
+            if isinstance(value, (StopIteration, GeneratorExit)):
+                # the server has closed its part of the stream by itself already
+                self.proxy = None
+                raise StopAsyncIteration
+            raise value
+        return value
+
+    async def aclose(self):
+        """Closes the remote iterator, if it has not been exhausted yet."""
+        if self.proxy and self.proxy._pyroConnection is not None:
+            await self.proxy._pyroInvoke("close_stream", [self.streamId], {},
+                                         flags=message.FLAGS_ONEWAY, objectId=constants.DAEMON_NAME)
+        self.proxy = None
+
+
+class AsyncProxy(object):
+    """
+    Pyro proxy for a remote object, for asyncio code. Calling a method on it returns a coroutine: ``await proxy.method()``.
+    It uses asyncio streams instead of blocking sockets and threads. Calls from different tasks are sent
+    on the same connection without waiting for each other (at most max_inflight at a time);
+    the responses are matched to the calls by their sequence number.
+    A remote iterator or generator is returned as an asynchronous iterator (``async for``).
+    Remote attributes can be read with ``await proxy.attribute``, once the proxy is connected.
+    The annotations and correlation id in ``current_context`` are local to the asyncio task that does the call.
+    Use it as an asynchronous context manager (``async with``) or call :py:meth:`_pyroRelease` to close the connection.
+
+    The settings and hooks are the same as those of the normal :py:class:`Pyro4.core.Proxy`:
+    ``_pyroTimeout``, ``_pyroHmacKey``, ``_pyroMaxRetries``, ``_pyroSerializer``, ``_pyroHandshake``,
+    ``_pyroAnnotations``, ``_pyroResponseAnnotations`` and ``_pyroValidateHandshake``.
+    """
+    def __init__(self, uri, max_inflight=100):
+        if isinstance(uri, str):
+            uri = core.URI(uri)
+        elif not isinstance(uri, core.URI):
+            raise TypeError("expected Pyro URI")
+        self._pyroUri = uri
+        self._pyroConnection = None
+        self._pyroSerializer = None
+        self._pyroMethods = set()
+        self._pyroAttrs = set()
+        self._pyroOneway = set()
+        self._pyroSeq = 0
+        self._pyroHandshake = "hello"
+        self._pyroMaxRetries = config.MAX_RETRIES
+        self._pyroTimeout = config.COMMTIMEOUT
+        self._pyroHmacKey = None
+        self.__max_inflight = max(1, max_inflight)
+        self.__inflight = None       # semaphore, created when it is first needed
+        self.__connect_lock = None   # lock, created when it is first needed
+        self.__pending = collections.deque()   # (seq, hmac key, future) of the calls waiting for their response
+        self.__receiver = None
+        util.get_serializer(config.SERIALIZER)  # assert that the configured serializer is available
+
+    @property
+    def _pyroHmacKey(self):
+        """the HMAC key (bytes) that this proxy uses"""
+        return self.__hmac_key
+
+    @_pyroHmacKey.setter
+    def _pyroHmacKey(self, value):
+        if value and type(value) is not bytes:
+            value = value.encode("utf-8")
+        self.__hmac_key = value
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name.startswith("_AsyncProxy__") or name.startswith("_pyro"):
+            raise AttributeError(name)
+        if name in self._pyroAttrs:
+            return self._pyroInvoke("__getattr__", (name,), None)
+        if config.METADATA and self._pyroConnection is not None and name not in self._pyroMethods:
+            # client side check if the requested attr actually exists
+            raise AttributeError("remote object '%s' has no exposed attribute or method '%s'" % (self._pyroUri, name))
+        return _AsyncRemoteMethod(self, name, self._pyroMaxRetries)
+
+    def __repr__(self):
+        connected = "connected" if self._pyroConnection else "not connected"
+        return "<%s.%s at 0x%x; %s; for %s>" % (self.__class__.__module__, self.__class__.__name__,
+                                                id(self), connected, self._pyroUri)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._pyroRelease()
+
+    def _pyroRelease(self):
+        """release the connection to the pyro daemon. Calls that are still waiting for their response, fail."""
+        self.__close(errors.ConnectionClosedError("proxy connection was released"))
+        log.debug("connection released")
+
+    async def _pyroBind(self):
+        """
+        Bind this proxy to the exact object from the uri. That means that the proxy's uri
+        will be updated with a direct PYRO uri, if it isn't one yet.
+        If the proxy is already bound, it will not bind again.
+        """
+        return await self.__connect(True)
+
+    async def _pyroInvoke(self, methodname, vargs, kwargs, flags=0, objectId=None):
+        """perform the remote method call communication"""
+        value, is_exception = await self.__invoke(methodname, vargs, kwargs, flags, objectId)
+        if is_exception:
+            if isinstance(value, StopIteration):
+                raise RuntimeError("remote method raised StopIteration") from value
+            raise value  # if you see this in your traceback, you should probably inspect the remote traceback as well
+        return value
+
+    def _pyroAnnotations(self):
+        """Override to return a dict with custom user annotations to be sent with each request message."""
+        return {}
+
+    def _pyroResponseAnnotations(self, annotations, msgtype):
+        """Process any response annotations (dictionary set by the daemon)."""
+        pass
+
+    def _pyroValidateHandshake(self, response):
+        """
+        Process and validate the initial connection handshake response data received from the daemon.
+        Simply return without error if everything is ok.
+        Raise an exception if something is wrong and the connection should not be made.
+        """
+        return
+
+    async def __invoke(self, methodname, vargs, kwargs, flags, objectId):
+        # does the remote call, returns the result and if it is an exception
+        current_context.response_annotations = {}
+        if self._pyroConnection is None:
+            await self.__connect()
+        if self.__inflight is None:
+            self.__inflight = asyncio.Semaphore(self.__max_inflight)
+        await self.__inflight.acquire()
+        try:
+            conn = self._pyroConnection
+            if conn is None:
+                raise errors.ConnectionClosedError("the connection was lost")
+            serializer = util.get_serializer(self._pyroSerializer or config.SERIALIZER)
+            compressor = core._get_compressor(conn)
+            data, compressed = serializer.serializeCall(objectId or conn.objectId, methodname, vargs, kwargs, compress=compressor)
+            if compressed:
+                flags |= message.FLAGS_COMPRESSED
+            else:
+                compressor = None
+            if methodname in self._pyroOneway:
+                flags |= message.FLAGS_ONEWAY
+            self._pyroSeq = (self._pyroSeq + 1) & 0xffff
+            hmac_key, hmac_digest = core._get_hmac(conn, self._pyroHmacKey)
+            msg = message.Message(message.MSG_INVOKE, data, serializer.serializer_id, flags, self._pyroSeq,
+                                  annotations=self.__annotations(), hmac_key=hmac_key, compressor=compressor, hmac_digest=hmac_digest)
+            if config.LOGWIRE:
+                core._log_wiredata(log, "proxy wiredata sending", msg)
+            if not flags & message.FLAGS_ONEWAY:
+                response = asyncio.get_event_loop().create_future()
+                self.__pending.append((self._pyroSeq, hmac_key, response))
+            msg.send(conn)   # just buffers the data, so the order of the requests is the order of the sequence numbers
+            del msg
+            try:
+                await conn.writer.drain()
+            except (OSError, ConnectionError) as x:
+                self.__close(errors.ConnectionClosedError("sending: connection lost: " + str(x)), conn)
+            if flags & message.FLAGS_ONEWAY:
+                return None, False
+            try:
+                msg = await asyncio.wait_for(response, self._pyroTimeout or None)
+            except asyncio.TimeoutError:
+                # the response will still arrive later, and is then discarded
+                raise errors.TimeoutError("receiving: timeout")
+        finally:
+            self.__inflight.release()
+        if msg.annotations:
+            current_context.response_annotations = msg.annotations
+            self._pyroResponseAnnotations(msg.annotations, msg.type)
+        if msg.serializer_id != serializer.serializer_id:
+            error = "invalid serializer in response: %d" % msg.serializer_id
+            log.error(error)
+            raise errors.SerializeError(error)
+        data = serializer.deserializeData(msg.data, compressed=msg.compressor)
+        if msg.flags & message.FLAGS_ITEMSTREAMRESULT:
+            streamId = bytes(msg.annotations.get("STRM", b"")).decode()
+            if not streamId:
+                raise errors.ProtocolError("result of call is an iterator, but the server is not configured to allow streaming")
+            return _AsyncStreamResultIterator(streamId, self, self.__invoke), False
+        return data, bool(msg.flags & message.FLAGS_EXCEPTION)
+
+    async def __receive(self, conn):
+        # Receives the responses, in order, and hands them to the calls that are waiting for them.
+        try:
+            while True:
+                await conn.read_message()
+                if not self.__pending:
+                    raise errors.ProtocolError("received a response without a request")
+                seq, hmac_key, response = self.__pending.popleft()
+                msg = message.Message.recv(conn, [message.MSG_RESULT], hmac_key=hmac_key)
+                if config.LOGWIRE:
+                    core._log_wiredata(log, "proxy wiredata received", msg)
+                if msg.seq != seq:
+                    raise errors.ProtocolError("invoke: reply sequence out of sync, got %d expected %d" % (msg.seq, seq))
+                if not response.done():
+                    response.set_result(msg)
+        except asyncio.CancelledError:
+            raise
+        except Exception as x:
+            log.debug("connection failed: %s", x)
+            self.__close(x, conn)
+
+    def __close(self, exception, conn=None):
+        # closes the connection (if it is still the current one), and fails the calls that wait for a response
+        if conn is not None and conn is not self._pyroConnection:
+            return
+        if self._pyroConnection is not None:
+            self._pyroConnection.close()
+            self._pyroConnection = None
+        if self.__receiver is not None:
+            if self.__receiver is not asyncio_current_task():
+                self.__receiver.cancel()
+            self.__receiver = None
+        pending, self.__pending = self.__pending, collections.deque()
+        for _, _, response in pending:
+            if not response.done():
+                response.set_exception(exception)
+
+    async def __connect(self, replaceUri=False):
+        if self.__connect_lock is None:
+            self.__connect_lock = asyncio.Lock()
+        async with self.__connect_lock:
+            if self._pyroConnection is not None:
+                return False  # already connected
+            loop = asyncio.get_event_loop()
+            # resolving may have to talk to the name server, which is done with blocking sockets
+            uri = await loop.run_in_executor(None, core._resolve, self._pyroUri, self._pyroHmacKey)
+            log.debug("connecting to %s", uri)
+            if config.SSL:
+                sslContext = socketutil.getSSLcontext(clientcert=config.SSL_CLIENTCERT,
+                                                      clientkey=config.SSL_CLIENTKEY,
+                                                      keypassword=config.SSL_CLIENTKEYPASSWD,
+                                                      cacerts=config.SSL_CACERTS)
+            else:
+                sslContext = None
+            connect_location = uri.sockname or (uri.host, uri.port)
+            conn = None
+            try:
+                if uri.sockname:
+                    connecting = asyncio.open_unix_connection(uri.sockname, ssl=sslContext)
+                else:
+                    connecting = asyncio.open_connection(uri.host, uri.port, ssl=sslContext)
+                reader, writer = await asyncio.wait_for(connecting, self._pyroTimeout or None)
+                conn = _StreamConnection(reader, writer, uri.object)
+                serializer = util.get_serializer(self._pyroSerializer or config.SERIALIZER)
+                msg = core._handshake_message(serializer, self._pyroHandshake, uri.object, self.__annotations(False),
+                                              self._pyroSeq, self._pyroHmacKey, sslContext is not None)
+                if config.LOGWIRE:
+                    core._log_wiredata(log, "proxy connect sending", msg)
+                msg.send(conn)
+                await writer.drain()
+                await asyncio.wait_for(conn.read_message(), self._pyroTimeout or None)
+                msg = message.Message.recv(conn, [message.MSG_CONNECTOK, message.MSG_CONNECTFAIL], hmac_key=self._pyroHmacKey)
+                if config.LOGWIRE:
+                    core._log_wiredata(log, "proxy connect response received", msg)
+            except Exception as x:
+                if conn:
+                    conn.close()
+                err = "cannot connect to %s: %s" % (connect_location, x)
+                log.error(err)
+                if isinstance(x, errors.CommunicationError):
+                    raise
+                if isinstance(x, asyncio.TimeoutError):
+                    raise errors.TimeoutError(err) from x
+                raise errors.CommunicationError(err) from x
+            handshake_response = "?"
+            if msg.data:
+                serializer = util.get_serializer_by_id(msg.serializer_id)
+                handshake_response = serializer.deserializeData(msg.data, compressed=msg.compressor)
+            if msg.type == message.MSG_CONNECTFAIL:
+                conn.close()
+                error = "connection to %s rejected: %s" % (connect_location, handshake_response)
+                log.error(error)
+                raise errors.CommunicationError(error)
+            if msg.flags & message.FLAGS_META_ON_CONNECT:
+                if handshake_response["meta"]:
+                    self._pyroOneway, self._pyroMethods, self._pyroAttrs = core._parse_metadata(handshake_response["meta"])
+                handshake_response = handshake_response["handshake"]
+            core._handshake_negotiate(conn, msg, self._pyroHmacKey, sslContext is not None)
+            try:
+                self._pyroValidateHandshake(handshake_response)
+            except Exception:
+                conn.close()
+                raise
+            self._pyroConnection = conn
+            self.__receiver = asyncio.ensure_future(self.__receive(conn))
+            if replaceUri:
+                self._pyroUri = uri
+            log.debug("connected to %s - %s", self._pyroUri, "SSL" if sslContext else "unencrypted")
+            if msg.annotations:
+                self._pyroResponseAnnotations(msg.annotations, msg.type)
+        if config.METADATA and not self._pyroMethods and not self._pyroAttrs:
+            metadata = await self._pyroInvoke("get_metadata", [uri.object], {}, objectId=constants.DAEMON_NAME)
+            self._pyroOneway, self._pyroMethods, self._pyroAttrs = core._parse_metadata(metadata)
+        return True
+
+    def __annotations(self, clear=True):
+        annotations = current_context.annotations
+        if current_context.correlation_id:
+            annotations["CORR"] = current_context.correlation_id.bytes
+        else:
+            annotations.pop("CORR", None)
+        annotations.update(self._pyroAnnotations())
+        if clear:
+            current_context.annotations = {}
+        return annotations
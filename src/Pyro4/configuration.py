@@ -17,17 +17,20 @@ from Pyro4 import constants
 
 
 class Configuration(object):
-    __slots__ = ("HOST", "NS_HOST", "NS_PORT", "NS_BCPORT", "NS_BCHOST", "NS_AUTOCLEAN",
-                 "COMPRESSION", "SERVERTYPE", "COMMTIMEOUT", "POLLTIMEOUT", "ONEWAY_THREADED",
+    __slots__ = ("HOST", "NS_HOST", "NS_PORT", "NS_BCPORT", "NS_BCHOST", "NS_AUTOCLEAN", "NS_LOOKUP_CACHE_TTL", "NS_LOOKUP_NEGATIVE_TTL",
+                 "NS_LOCATE_CACHE", "NS_LOCATE_NEGATIVE_TTL",
+                 "COMPRESSION", "COMPRESSION_CODEC", "COMPRESSION_LEVEL", "COMPRESSION_ZDICT",
+                 "SERVERTYPE", "COMMTIMEOUT", "POLLTIMEOUT", "ONEWAY_THREADED",
                  "DETAILED_TRACEBACK", "SOCK_REUSE", "SOCK_NODELAY", "PREFER_IP_VERSION",
                  "THREADPOOL_SIZE", "THREADPOOL_SIZE_MIN", "AUTOPROXY", "PICKLE_PROTOCOL_VERSION",
-                 "BROADCAST_ADDRS", "NATHOST", "NATPORT", "MAX_MESSAGE_SIZE",
-                 "FLAME_ENABLED", "SERIALIZER", "SERIALIZERS_ACCEPTED", "LOGWIRE",
+                 "BROADCAST_ADDRS", "NATHOST", "NATPORT", "MAX_MESSAGE_SIZE", "FRAGMENT_SIZE",
+                 "FLAME_ENABLED", "SERIALIZER", "SERIALIZERS_ACCEPTED", "LOGWIRE", "WIRECAPTURE",
                  "METADATA", "REQUIRE_EXPOSE", "USE_MSG_WAITALL", "JSON_MODULE",
-                 "MAX_RETRIES", "DILL_PROTOCOL_VERSION", "ITER_STREAMING", "ITER_STREAM_LIFETIME",
-                 "ITER_STREAM_LINGER", "SSL", "SSL_REQUIRECLIENTCERT", "SSL_CACERTS",
+                 "MAX_RETRIES", "CIRCUIT_BREAKER", "CIRCUIT_BREAKER_RESET", "CALL_STATS",
+                 "ASYNC_WORKERS", "ASYNC_QUEUE_SIZE", "BATCH_WORKERS", "DILL_PROTOCOL_VERSION", "ITER_STREAMING", "ITER_STREAM_LIFETIME",
+                 "ITER_STREAM_LINGER", "ITER_STREAM_CHUNK", "ITER_STREAM_PREFETCH", "SSL", "SSL_REQUIRECLIENTCERT", "SSL_CACERTS",
                  "SSL_SERVERCERT", "SSL_SERVERKEY", "SSL_SERVERKEYPASSWD",
-                 "SSL_CLIENTCERT", "SSL_CLIENTKEY", "SSL_CLIENTKEYPASSWD")
+                 "SSL_CLIENTCERT", "SSL_CLIENTKEY", "SSL_CLIENTKEYPASSWD", "SSL_SKIP_HMAC", "HMAC_DIGEST")
 
     def __init__(self):
         self.reset()
@@ -43,9 +46,16 @@ class Configuration(object):
         self.NS_BCPORT = 9091  # udp
         self.NS_BCHOST = None
         self.NS_AUTOCLEAN = 0.0
+        self.NS_LOOKUP_CACHE_TTL = 0.0
+        self.NS_LOOKUP_NEGATIVE_TTL = 0.0
+        self.NS_LOCATE_CACHE = False
+        self.NS_LOCATE_NEGATIVE_TTL = 10.0
         self.NATHOST = None
         self.NATPORT = 0
         self.COMPRESSION = False
+        self.COMPRESSION_CODEC = "zlib"  # preferred codec, used if the other side supports it too (otherwise zlib)
+        self.COMPRESSION_LEVEL = -1  # -1 = default level of the codec
+        self.COMPRESSION_ZDICT = ""  # file with preset dictionary for the zlib-stream codec
         self.SERVERTYPE = "thread"
         self.COMMTIMEOUT = 0.0
         self.POLLTIMEOUT = 2.0  # seconds
@@ -57,12 +67,14 @@ class Configuration(object):
         self.THREADPOOL_SIZE_MIN = 4
         self.AUTOPROXY = True
         self.MAX_MESSAGE_SIZE = 0  # 0 = unlimited
+        self.FRAGMENT_SIZE = 64 * 1024 * 1024  # larger messages are sent in fragments (0 = only if larger than 2 Gb)
         self.BROADCAST_ADDRS = "<broadcast>, 0.0.0.0"  # comma separated list of broadcast addresses
         self.FLAME_ENABLED = False
         self.PREFER_IP_VERSION = 4  # 4, 6 or 0 (let OS choose according to RFC 3484)
         self.SERIALIZER = "serpent"
         self.SERIALIZERS_ACCEPTED = "serpent,marshal,json"   # these are the 'safe' serializers that are always available
         self.LOGWIRE = False  # log wire-level messages
+        self.WIRECAPTURE = ""  # file to capture the raw wire-level messages in (empty = disabled)
         self.PICKLE_PROTOCOL_VERSION = pickle.HIGHEST_PROTOCOL
         try:
             import dill
@@ -74,9 +86,17 @@ class Configuration(object):
         self.USE_MSG_WAITALL = hasattr(socket, "MSG_WAITALL") and platform.system() != "Windows"  # waitall is not reliable on windows
         self.JSON_MODULE = "json"
         self.MAX_RETRIES = 0
+        self.CIRCUIT_BREAKER = 0
+        self.CIRCUIT_BREAKER_RESET = 5.0
+        self.CALL_STATS = False
+        self.ASYNC_WORKERS = 16
+        self.ASYNC_QUEUE_SIZE = 1000
+        self.BATCH_WORKERS = 16
         self.ITER_STREAMING = True
         self.ITER_STREAM_LIFETIME = 0.0
         self.ITER_STREAM_LINGER = 30.0
+        self.ITER_STREAM_CHUNK = 1
+        self.ITER_STREAM_PREFETCH = False
         self.SSL = False
         self.SSL_SERVERCERT = ""
         self.SSL_SERVERKEY = ""
@@ -86,6 +106,8 @@ class Configuration(object):
         self.SSL_CLIENTKEY = ""
         self.SSL_CLIENTKEYPASSWD = ""
         self.SSL_CACERTS = ""
+        self.SSL_SKIP_HMAC = False  # don't use message hmac on SSL connections, if the other side agrees
+        self.HMAC_DIGEST = "sha1"  # preferred hmac digest algorithm, used if the other side supports it too (otherwise sha1)
 
         if useenvironment:
             # process environment variables
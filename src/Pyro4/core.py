@@ -17,13 +17,28 @@ import uuid
 import base64
 import warnings
 import socket
+import select
 import random
+import struct
+import itertools
+import collections
+import contextlib
+from timeit import default_timer as perf_timer
 from Pyro4 import errors, socketutil, util, constants, message, futures
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+if sys.version_info < (3, 4):
+    from collections import MutableSet
+else:
+    from collections.abc import MutableSet
 from Pyro4.configuration import config
 
 
-__all__ = ["URI", "Proxy", "Daemon", "current_context", "callback", "batch", "asyncproxy", "expose", "behavior",
-           "oneway", "SerializedBlob", "_resolve", "_locateNS"]
+__all__ = ["URI", "Proxy", "ProxyPool", "LoadBalancedProxy", "Daemon", "current_context", "callback", "batch", "asyncproxy",
+           "expose", "behavior", "oneway", "cacheable", "idempotent", "SerializedBlob", "resolve_cache_stats", "clear_resolve_cache",
+           "circuit_breaker_stats", "reset_circuit_breakers", "call_stats", "reset_call_stats", "_resolve", "_locateNS"]
 
 if sys.version_info >= (3, 0):
     basestring = str
@@ -198,20 +213,19 @@ class Proxy(object):
     .. automethod:: _pyroRelease
     .. automethod:: _pyroReconnect
     .. automethod:: _pyroBatch
+    .. automethod:: _pyroPipeline
     .. automethod:: _pyroAsync
     .. automethod:: _pyroAnnotations
     .. automethod:: _pyroResponseAnnotations
     .. automethod:: _pyroValidateHandshake
+    .. automethod:: _pyroCallStats
     .. autoattribute:: _pyroTimeout
     .. autoattribute:: _pyroHmacKey
+    .. autoattribute:: _pyroSerializer
     .. attribute:: _pyroMaxRetries
 
         Number of retries to perform on communication calls by this proxy, allows you to override the default setting.
 
-    .. attribute:: _pyroSerializer
-
-        Name of the serializer to use by this proxy, allows you to override the default setting.
-
     .. attribute:: _pyroHandshake
 
         The data object that should be sent in the initial connection handshake message. Can be any serializable object.
@@ -220,7 +234,10 @@ class Proxy(object):
         ["__getnewargs__", "__getnewargs_ex__", "__getinitargs__", "_pyroConnection", "_pyroUri",
          "_pyroOneway", "_pyroMethods", "_pyroAttrs", "_pyroTimeout", "_pyroSeq", "_pyroHmacKey",
          "_pyroRawWireResponse", "_pyroHandshake", "_pyroMaxRetries", "_pyroSerializer", "_Proxy__async",
-         "_Proxy__pyroHmacKey", "_Proxy__pyroTimeout", "_Proxy__pyroConnLock"])
+         "_Proxy__pyroHmacKey", "_Proxy__pyroTimeout", "_Proxy__pyroConnLock", "_Proxy__pyroPipeline",
+         "_Proxy__pyroAsyncPool", "_pyroCacheable", "_pyroCacheResults", "_Proxy__pyroResultCache",
+         "_Proxy__pyroCacheBypass", "_pyroIdempotent", "_Proxy__pyroCheckedMethods", "_Proxy__pyroCallStats",
+         "_Proxy__pyroConnFree", "_Proxy__pyroPushing", "_Proxy__pyroSerializer", "_Proxy__pyroConnSerializer"])
 
     def __init__(self, uri, connected_socket=None):
         if connected_socket:
@@ -232,9 +249,12 @@ class Proxy(object):
         self._pyroUri = uri
         self._pyroConnection = None
         self._pyroSerializer = None  # can be set to the name of a serializer to override the global one per-proxy
-        self._pyroMethods = set()  # all methods of the remote object, gotten from meta-data
-        self._pyroAttrs = set()  # attributes of the remote object, gotten from meta-data
-        self._pyroOneway = set()  # oneway-methods of the remote object, gotten from meta-data
+        self._pyroMethods = _SharedSet()  # all methods of the remote object, gotten from meta-data
+        self._pyroAttrs = _SharedSet()  # attributes of the remote object, gotten from meta-data
+        self._pyroOneway = _SharedSet()  # oneway-methods of the remote object, gotten from meta-data
+        self._pyroCacheable = {}  # cacheable methods of the remote object with their (ttl, maxsize), gotten from meta-data
+        self._pyroCacheResults = True  # use the result cache for the cacheable methods
+        self._pyroIdempotent = frozenset()  # idempotent methods of the remote object, gotten from meta-data
         self._pyroSeq = 0  # message sequence number
         self._pyroRawWireResponse = False  # internal switch to enable wire level responses
         self._pyroHandshake = "hello"  # the data object that should be sent in the initial connection handshake message
@@ -242,6 +262,14 @@ class Proxy(object):
         self.__pyroHmacKey = None
         self.__pyroTimeout = config.COMMTIMEOUT
         self.__pyroConnLock = threading.RLock()
+        self.__pyroConnFree = threading.Condition(self.__pyroConnLock)
+        self.__pyroPushing = None  # (connection, consuming thread) while a pushed item stream has taken over the connection
+        self.__pyroPipeline = None
+        self.__pyroAsyncPool = None
+        self.__pyroResultCache = _ResultCache()
+        self.__pyroCacheBypass = threading.local()
+        self.__pyroCheckedMethods = set()  # names of the methods that passed the metadata checks already
+        self.__pyroCallStats = _CallStats()  # recorded if CALL_STATS is enabled
         util.get_serializer(config.SERIALIZER)  # assert that the configured serializer is available
         self.__async = False
         current_context.annotations = {}
@@ -261,6 +289,23 @@ class Proxy(object):
             value = value.encode("utf-8")  # convert to bytes
         self.__pyroHmacKey = value
 
+    @property
+    def _pyroSerializer(self):
+        """Name of the serializer to use by this proxy, allows you to override the default setting."""
+        return self.__pyroSerializer
+
+    @_pyroSerializer.setter
+    def _pyroSerializer(self, value):
+        self.__pyroSerializer = value
+        self.__pyroConnSerializer = None  # resolve it again for the next call
+
+    def __pyroGetSerializer(self):
+        # the serializer is resolved once per connection (and again when _pyroSerializer is changed)
+        serializer = self.__pyroConnSerializer
+        if serializer is None:
+            serializer = self.__pyroConnSerializer = util.get_serializer(self.__pyroSerializer or config.SERIALIZER)
+        return serializer
+
     def __del__(self):
         if hasattr(self, "_pyroConnection"):
             self._pyroRelease()
@@ -269,15 +314,18 @@ class Proxy(object):
         if name in Proxy.__pyroAttributes:
             # allows it to be safely pickled
             raise AttributeError(name)
-        if config.METADATA:
-            # get metadata if it's not there yet
-            if not self._pyroMethods and not self._pyroAttrs:
-                self._pyroGetMetadata()
-        if name in self._pyroAttrs:
-            return self._pyroInvoke("__getattr__", (name,), None)
-        if config.METADATA and name not in self._pyroMethods:
-            # client side check if the requested attr actually exists
-            raise AttributeError("remote object '%s' has no exposed attribute or method '%s'" % (self._pyroUri, name))
+        if name not in self.__pyroCheckedMethods:
+            if config.METADATA:
+                # get metadata if it's not there yet
+                if not self._pyroMethods and not self._pyroAttrs:
+                    self._pyroGetMetadata()
+            if name in self._pyroAttrs:
+                return self._pyroInvoke("__getattr__", (name,), None)
+            if config.METADATA and name not in self._pyroMethods:
+                # client side check if the requested attr actually exists
+                raise AttributeError("remote object '%s' has no exposed attribute or method '%s'" % (self._pyroUri, name))
+            self.__pyroCheckedMethods.add(name)     # skip the checks the next time
+        # the method objects are not kept: they refer to the proxy, which then could no longer be freed right away
         if self.__async:
             return _AsyncRemoteMethod(self, name, self._pyroMaxRetries)
         return _RemoteMethod(self._pyroInvoke, name, self._pyroMaxRetries)
@@ -335,13 +383,14 @@ class Proxy(object):
 
     def __getstate__(self):
         # for backwards compatibility reasons we also put the timeout and maxretries into the state
-        return self._pyroUri, self._pyroOneway, self._pyroMethods, self._pyroAttrs, self.__pyroTimeout, \
+        return self._pyroUri, set(self._pyroOneway), set(self._pyroMethods), set(self._pyroAttrs), self.__pyroTimeout, \
             self._pyroHmacKey, self._pyroHandshake, self._pyroMaxRetries, self._pyroSerializer
 
     def __setstate__(self, state):
         # Note that the timeout and maxretries are also part of the state (for backwards compatibility reasons),
         # but we're not using them here. Instead we get the configured values from the 'local' config.
-        self._pyroUri, self._pyroOneway, self._pyroMethods, self._pyroAttrs, _, self._pyroHmacKey, self._pyroHandshake = state[:7]
+        self._pyroUri, oneway, methods, attrs, _, self._pyroHmacKey, self._pyroHandshake = state[:7]
+        self._pyroOneway, self._pyroMethods, self._pyroAttrs = _SharedSet(oneway), _SharedSet(methods), _SharedSet(attrs)
         self._pyroSerializer = None if len(state) < 9 else state[8]
         self.__pyroTimeout = config.COMMTIMEOUT
         self._pyroMaxRetries = config.MAX_RETRIES
@@ -349,14 +398,28 @@ class Proxy(object):
         self._pyroSeq = 0
         self._pyroRawWireResponse = False
         self.__pyroConnLock = threading.RLock()
+        self.__pyroConnFree = threading.Condition(self.__pyroConnLock)
+        self.__pyroPushing = None
+        self.__pyroPipeline = None
+        self.__pyroAsyncPool = None
+        self._pyroCacheable = {}
+        self._pyroCacheResults = True
+        self._pyroIdempotent = frozenset()
+        self.__pyroResultCache = _ResultCache()
+        self.__pyroCacheBypass = threading.local()
+        self.__pyroCheckedMethods = set()
+        self.__pyroCallStats = _CallStats()
         self.__async = False
 
     def __copy__(self):
         uriCopy = URI(self._pyroUri)
         p = type(self)(uriCopy)
-        p._pyroOneway = set(self._pyroOneway)
-        p._pyroMethods = set(self._pyroMethods)
-        p._pyroAttrs = set(self._pyroAttrs)
+        p._pyroOneway = _SharedSet(self._pyroOneway)
+        p._pyroMethods = _SharedSet(self._pyroMethods)
+        p._pyroAttrs = _SharedSet(self._pyroAttrs)
+        p._pyroCacheable = self._pyroCacheable
+        p._pyroIdempotent = self._pyroIdempotent
+        p._pyroCacheResults = self._pyroCacheResults
         p._pyroSerializer = self._pyroSerializer
         p._pyroTimeout = self._pyroTimeout
         p._pyroHandshake = self._pyroHandshake
@@ -392,11 +455,17 @@ class Proxy(object):
     def _pyroRelease(self):
         """release the connection to the pyro daemon"""
         with self.__pyroConnLock:
+            if self.__pyroPushing is not None:
+                self.__pyroPushed(self.__pyroPushing[0])   # releasing the connection ends the pushed stream
+            if self.__pyroAsyncPool is not None:
+                self.__pyroAsyncPool.close()
+                self.__pyroAsyncPool = None
             if self._pyroConnection is not None:
                 if self._pyroConnection.keep_open:
                     return
                 self._pyroConnection.close()
                 self._pyroConnection = None
+                self.__pyroConnSerializer = None
                 log.debug("connection released")
 
     def _pyroBind(self):
@@ -422,55 +491,91 @@ class Proxy(object):
 
     def _pyroInvoke(self, methodname, vargs, kwargs, flags=0, objectId=None):
         """perform the remote method call communication"""
-        current_context.response_annotations = {}
+        if methodname in self._pyroCacheable and self._pyroCacheResults and not flags and objectId is None:
+            return self.__pyroInvokeCached(methodname, vargs, kwargs)
+        return self.__pyroInvoke(methodname, vargs, kwargs, flags, objectId)
+
+    def __pyroInvokeCached(self, methodname, vargs, kwargs):
+        # answer the call with a cached result if there is one, otherwise do the call and cache its result
+        serializer = self.__pyroGetSerializer()
+        try:
+            key = serializer.dumps((vargs, sorted(kwargs.items()) if kwargs else None))
+        except Exception:
+            return self.__pyroInvoke(methodname, vargs, kwargs, 0, None)   # can't make a key for these arguments
+        if not getattr(self.__pyroCacheBypass, "active", False):
+            found, data = self.__pyroResultCache.get(methodname, key)
+            if found:
+                current_context.response_annotations = {}
+                # deserialized every time just like the response of a real call, so callers can't change the cached result
+                return serializer.deserializeData(data)
+        reply = []
+        value = self.__pyroInvoke(methodname, vargs, kwargs, 0, None, reply)
+        if reply:
+            ttl, maxsize = self._pyroCacheable[methodname]
+            self.__pyroResultCache.put(methodname, key, reply[0], ttl, maxsize)
+        return value
+
+    def _pyroCacheBypass(self):
+        """Context manager for calls (in the current thread) that should not get a cached result.
+        The results of these calls do replace the results in the cache."""
+        return _CacheBypass(self.__pyroCacheBypass)
+
+    def _pyroCacheStats(self):
+        """returns a dict with the hits and misses of the result cache, and the number of cached results"""
+        return self.__pyroResultCache.stats()
+
+    def _pyroCacheClear(self):
+        """removes all cached results"""
+        self.__pyroResultCache.clear()
+
+    def _pyroCallStats(self):
+        """
+        Returns a dict with the statistics of the remote calls done by this proxy, per method name
+        (only recorded if the CALL_STATS config item is enabled). See :py:func:`Pyro4.core.call_stats`.
+        """
+        return self.__pyroCallStats.stats()
+
+    def _pyroCallStatsClear(self):
+        """forgets the recorded statistics of the remote calls done by this proxy"""
+        self.__pyroCallStats.clear()
+
+    def __pyroRecordCall(self, methodname, timing):
+        values = timing.values()
+        self.__pyroCallStats.record(methodname, values)
+        _call_stats.record((self._pyroUri.object, methodname), values)
+
+    def __pyroInvoke(self, methodname, vargs, kwargs, flags, objectId, reply=None):
+        if current_context.response_annotations:
+            current_context.response_annotations = {}
         with self.__pyroConnLock:
-            if self._pyroConnection is None:
-                self.__pyroCreateConnection()
-            serializer = util.get_serializer(self._pyroSerializer or config.SERIALIZER)
-            objectId = objectId or self._pyroConnection.objectId
-            annotations = self.__annotations()
-            if vargs and isinstance(vargs[0], SerializedBlob):
-                # special serialization of a 'blob' that stays serialized
-                data, compressed, flags = self.__serializeBlobArgs(vargs, kwargs, annotations, flags, objectId, methodname, serializer)
-            else:
-                # normal serialization of the remote call
-                data, compressed = serializer.serializeCall(objectId, methodname, vargs, kwargs, compress=config.COMPRESSION)
-            if compressed:
-                flags |= message.FLAGS_COMPRESSED
-            if methodname in self._pyroOneway:
-                flags |= message.FLAGS_ONEWAY
-            self._pyroSeq = (self._pyroSeq + 1) & 0xffff
-            msg = message.Message(message.MSG_INVOKE, data, serializer.serializer_id, flags, self._pyroSeq,
-                                  annotations=annotations, hmac_key=self._pyroHmacKey)
-            if config.LOGWIRE:
-                _log_wiredata(log, "proxy wiredata sending", msg)
+            if self.__pyroPushing is not None:
+                self.__pyroAwaitConnection()
+            if self.__pyroPipeline:
+                self.__pyroPipeline.drain()   # the responses of the pipelined calls have to be received first
+            timing = None
+            if config.CALL_STATS:
+                if self._pyroConnection is None:
+                    self.__pyroCreateConnection()   # making the connection is not part of the timed call
+                timing = _CallTiming()
+            msg, serializer, hmac_key = self.__pyroCreateRequest(methodname, vargs, kwargs, flags, objectId)
+            flags = msg.flags
+            if timing:
+                timing.mark()
+                timing.request_size = msg.header_size + msg.annotations_size + msg.data_size
             try:
-                self._pyroConnection.send(msg.to_bytes())
+                msg.send(self._pyroConnection)
                 del msg  # invite GC to collect the object, don't wait for out-of-scope
+                if timing:
+                    timing.mark()
                 if flags & message.FLAGS_ONEWAY:
+                    if timing:
+                        self.__pyroRecordCall(methodname, timing)
                     return None  # oneway call, no response data
                 else:
-                    msg = message.Message.recv(self._pyroConnection, [message.MSG_RESULT], hmac_key=self._pyroHmacKey)
-                    if config.LOGWIRE:
-                        _log_wiredata(log, "proxy wiredata received", msg)
-                    self.__pyroCheckSequence(msg.seq)
-                    if msg.serializer_id != serializer.serializer_id:
-                        error = "invalid serializer in response: %d" % msg.serializer_id
-                        log.error(error)
-                        raise errors.SerializeError(error)
-                    if msg.annotations:
-                        current_context.response_annotations = msg.annotations
-                        self._pyroResponseAnnotations(msg.annotations, msg.type)
-                    if self._pyroRawWireResponse:
-                        msg.decompress_if_needed()
-                        return msg
-                    data = serializer.deserializeData(msg.data, compressed=msg.flags & message.FLAGS_COMPRESSED)
-                    if msg.flags & message.FLAGS_ITEMSTREAMRESULT:
-                        streamId = bytes(msg.annotations.get("STRM", b"")).decode()
-                        if not streamId:
-                            raise errors.ProtocolError("result of call is an iterator, but the server is not configured to allow streaming")
-                        return _StreamResultIterator(streamId, self)
-                    if msg.flags & message.FLAGS_EXCEPTION:
+                    data, is_exception = self.__pyroReceiveResponse(self._pyroConnection, self._pyroSeq, serializer, hmac_key, timing, reply)
+                    if timing:
+                        self.__pyroRecordCall(methodname, timing)
+                    if is_exception:
                         if sys.platform == "cli":
                             util.fixIronPythonExceptionForPickle(data, False)
                         raise data  # if you see this in your traceback, you should probably inspect the remote traceback as well
@@ -486,9 +591,208 @@ class Proxy(object):
                 self._pyroRelease()
                 raise
 
-    def __pyroCheckSequence(self, seq):
-        if seq != self._pyroSeq:
-            err = "invoke: reply sequence out of sync, got %d expected %d" % (seq, self._pyroSeq)
+    def _pyroInvokePipelined(self, methodname, vargs, kwargs, flags=0, objectId=None):
+        """
+        Send the remote method call without waiting for the response of this or earlier calls (the proxy must be
+        pipelined, see :py:meth:`_pyroPipeline`). Returns a :py:class:`Pyro4.futures.FutureResult`, or None for oneway calls.
+        The responses are received in a background thread. The daemon processes the requests on a connection
+        one after another, so the responses arrive in the same order as the requests were sent.
+        """
+        pipeline = self.__pyroPipeline
+        if pipeline is None:
+            raise errors.PyroError("proxy is not pipelined")
+        with self.__pyroConnLock:
+            if self.__pyroPushing is not None:
+                self.__pyroAwaitConnection()
+            with pipeline.condition:
+                while len(pipeline.pending) >= pipeline.max_inflight:
+                    pipeline.condition.wait()
+            msg, serializer, hmac_key = self.__pyroCreateRequest(methodname, vargs, kwargs, flags, objectId)
+            flags = msg.flags
+            try:
+                msg.send(self._pyroConnection)
+            except (errors.CommunicationError, KeyboardInterrupt):
+                self._pyroRelease()
+                raise
+            del msg
+            if flags & message.FLAGS_ONEWAY:
+                return None
+            result = futures.FutureResult()
+            with pipeline.condition:
+                pipeline.pending.append((self._pyroSeq, serializer, hmac_key, result))
+                if not pipeline.receiving:
+                    pipeline.receiving = True
+                    thread = threading.Thread(target=self.__pyroReceivePipelined, args=(self._pyroConnection,))
+                    thread.setDaemon(True)
+                    thread.start()
+            return result
+
+    def __pyroReceivePipelined(self, connection):
+        # Receives the responses of the pipelined calls, in order, until there are no outstanding calls anymore.
+        pipeline = self.__pyroPipeline
+        while True:
+            with pipeline.condition:
+                if not pipeline.pending:
+                    pipeline.receiving = False
+                    return
+                seq, serializer, hmac_key, result = pipeline.pending[0]
+            try:
+                data, is_exception = self.__pyroReceiveResponse(connection, seq, serializer, hmac_key)
+            except Exception as x:
+                # the connection is no longer usable, all outstanding calls fail with this error
+                with pipeline.condition:
+                    failed = list(pipeline.pending)
+                    pipeline.pending.clear()
+                    pipeline.receiving = False
+                    pipeline.condition.notify_all()
+                with self.__pyroConnLock:
+                    if self._pyroConnection is connection:
+                        self._pyroRelease()
+                for _, _, _, result in failed:
+                    result.value = futures._ExceptionWrapper(x)
+                return
+            with pipeline.condition:
+                pipeline.pending.popleft()
+                pipeline.condition.notify_all()
+            result.value = futures._ExceptionWrapper(data) if is_exception else data
+
+    def _pyroPushedItems(self, streamId, window):
+        """
+        Asks the daemon to push the items of the given item stream over the connection of this proxy,
+        as they are produced. Returns a generator that yields the items. At most window items are underway:
+        the generator grants the daemon new credits when it has consumed half of them. The stream takes over
+        the connection of the proxy until it has ended or the proxy is released: calls on the proxy from other
+        threads wait until then, so use a separate proxy for this. The connection is closed when the stream ends.
+        """
+        with self.__pyroConnLock:
+            if self.__pyroPushing is not None:
+                self.__pyroAwaitConnection()
+            msg, serializer, hmac_key = self.__pyroCreateRequest("push_stream", [streamId, window], {}, 0, constants.DAEMON_NAME)
+            socketutil.setNoDelay(self._pyroConnection.sock)   # the credits are small messages that mustn't be delayed
+            try:
+                msg.send(self._pyroConnection)
+            except (errors.CommunicationError, KeyboardInterrupt):
+                self._pyroRelease()
+                raise
+            self.__pyroPushing = (self._pyroConnection, threading.current_thread())
+            return self.__pyroReceivePushed(self._pyroConnection, self._pyroSeq, serializer, hmac_key, max(1, window // 2))
+
+    def __pyroAwaitConnection(self):
+        # called with the connection lock: waits until a pushed item stream no longer occupies the connection
+        while self.__pyroPushing is not None:
+            if self.__pyroPushing[1] is threading.current_thread():
+                raise errors.PyroError("the connection of the proxy is in use by a pushed item stream in this thread")
+            self.__pyroConnFree.wait()
+
+    def __pyroPushed(self, connection):
+        # the pushed item stream no longer occupies the connection
+        with self.__pyroConnLock:
+            if self.__pyroPushing is not None and self.__pyroPushing[0] is connection:
+                self.__pyroPushing = None
+                self.__pyroConnFree.notify_all()
+
+    def __pyroReceivePushed(self, connection, seq, serializer, hmac_key, credit):
+        # receives the pushed items until the final response of the push_stream call arrives
+        consumed = 0
+        try:
+            while True:
+                with self.__pyroConnLock:
+                    if self.__pyroPushing is None or self.__pyroPushing[0] is not connection:
+                        raise errors.ConnectionClosedError("the proxy for this pushed stream has been released")
+                    self.__pyroPushing = (connection, threading.current_thread())
+                msg = message.Message.recv(connection, [message.MSG_RESULT], hmac_key=hmac_key)
+                if config.LOGWIRE:
+                    _log_wiredata(log, "proxy wiredata received", msg)
+                self.__pyroCheckSequence(msg.seq, seq)
+                data = serializer.deserializeData(msg.data, compressed=msg.compressor)
+                if msg.flags & message.FLAGS_EXCEPTION:
+                    raise data
+                if not msg.flags & message.FLAGS_ITEMSTREAMRESULT:
+                    return  # the stream has ended
+                yield data
+                consumed += 1
+                if consumed >= credit:
+                    hmac_digest = _get_hmac(connection, self._pyroHmacKey)[1]
+                    message.Message(message.MSG_PING, str(consumed).encode(), serializer.serializer_id, 0, seq,
+                                    hmac_key=hmac_key, hmac_digest=hmac_digest).send(connection)
+                    consumed = 0
+        finally:
+            # credits that the daemon won't read anymore may still be underway, so the connection can't be used again
+            with self.__pyroConnLock:
+                if self._pyroConnection is connection:
+                    self._pyroRelease()
+                self.__pyroPushed(connection)
+
+    def __pyroCreateRequest(self, methodname, vargs, kwargs, flags, objectId):
+        # creates the invoke message for the remote call, with the next sequence number
+        if self._pyroConnection is None:
+            self.__pyroCreateConnection()
+        serializer = self.__pyroGetSerializer()
+        objectId = objectId or self._pyroConnection.objectId
+        annotations = self.__annotations()
+        compressor = _get_compressor(self._pyroConnection)
+        if vargs and isinstance(vargs[0], SerializedBlob):
+            # special serialization of a 'blob' that stays serialized
+            annotations = annotations or {}
+            data, compressor, flags = self.__serializeBlobArgs(vargs, kwargs, annotations, flags, objectId, methodname,
+                                                               serializer, compressor)
+        else:
+            # normal serialization of the remote call
+            data, compressed = serializer.serializeCall(objectId, methodname, vargs, kwargs, compress=compressor)
+            if not compressed:
+                compressor = None
+        if compressor:
+            flags |= message.FLAGS_COMPRESSED
+        if methodname in self._pyroOneway:
+            flags |= message.FLAGS_ONEWAY
+        self._pyroSeq = (self._pyroSeq + 1) & 0xffff
+        hmac_key, hmac_digest = _get_hmac(self._pyroConnection, self._pyroHmacKey)
+        msg = message.Message(message.MSG_INVOKE, data, serializer.serializer_id, flags, self._pyroSeq,
+                              annotations=annotations, hmac_key=hmac_key, compressor=compressor, hmac_digest=hmac_digest)
+        if config.LOGWIRE:
+            _log_wiredata(log, "proxy wiredata sending", msg)
+        return msg, serializer, hmac_key
+
+    def __pyroReceiveResponse(self, connection, seq, serializer, hmac_key, timing=None, reply=None):
+        # receives the response message of a remote call, returns the result and if it is an exception
+        # if reply is a list, the serialized result (not of an exception or item stream) is appended to it
+        if timing:
+            # mark the moment the response arrives, separately from receiving the rest of it
+            header = connection.recv(message.Message.header_size)
+            timing.mark()
+            msg = message.Message.recv(connection, [message.MSG_RESULT], hmac_key=hmac_key, header=header)
+            timing.mark()
+            timing.response_size = msg.header_size + msg.annotations_size + msg.data_size
+        else:
+            msg = message.Message.recv(connection, [message.MSG_RESULT], hmac_key=hmac_key)
+        if config.LOGWIRE:
+            _log_wiredata(log, "proxy wiredata received", msg)
+        self.__pyroCheckSequence(msg.seq, seq)
+        if msg.serializer_id != serializer.serializer_id:
+            error = "invalid serializer in response: %d" % msg.serializer_id
+            log.error(error)
+            raise errors.SerializeError(error)
+        if msg.annotations:
+            current_context.response_annotations = msg.annotations
+            self._pyroResponseAnnotations(msg.annotations, msg.type)
+        if self._pyroRawWireResponse:
+            msg.decompress_if_needed()
+            return msg, False
+        if reply is not None and not msg.flags & (message.FLAGS_EXCEPTION | message.FLAGS_ITEMSTREAMRESULT):
+            reply.append(bytes(msg.decompress_if_needed().data))
+        data = serializer.deserializeData(msg.data, compressed=msg.compressor)
+        if timing:
+            timing.mark()
+        if msg.flags & message.FLAGS_ITEMSTREAMRESULT:
+            streamId = bytes(msg.annotations.get("STRM", b"")).decode()
+            if not streamId:
+                raise errors.ProtocolError("result of call is an iterator, but the server is not configured to allow streaming")
+            return _StreamResultIterator(streamId, self), False
+        return data, bool(msg.flags & message.FLAGS_EXCEPTION)
+
+    def __pyroCheckSequence(self, seq, expected_seq):
+        if seq != expected_seq:
+            err = "invoke: reply sequence out of sync, got %d expected %d" % (seq, expected_seq)
             log.error(err)
             raise errors.ProtocolError(err)
 
@@ -514,24 +818,18 @@ class Proxy(object):
                                                nodelay=config.SOCK_NODELAY,
                                                sslContext=sslContext)
                 conn = socketutil.SocketConnection(sock, uri.object)
-                # Do handshake.
-                serializer = util.get_serializer(self._pyroSerializer or config.SERIALIZER)
-                data = {"handshake": self._pyroHandshake}
+                # Do handshake. Make sure to pass the resolved object id instead of the logical id.
+                self.__pyroConnSerializer = None  # a new connection uses the serializer that is configured now
+                serializer = self.__pyroGetSerializer()
+                annotations = dict(self.__annotations(False) or {})
                 if config.METADATA:
-                    # the object id is only used/needed when piggybacking the metadata on the connection response
-                    # make sure to pass the resolved object id instead of the logical id
-                    data["object"] = uri.object
-                    flags = message.FLAGS_META_ON_CONNECT
-                else:
-                    flags = 0
-                data, compressed = serializer.serializeData(data, config.COMPRESSION)
-                if compressed:
-                    flags |= message.FLAGS_COMPRESSED
-                msg = message.Message(message.MSG_CONNECT, data, serializer.serializer_id, flags, self._pyroSeq,
-                                      annotations=self.__annotations(False), hmac_key=self._pyroHmacKey)
+                    # tell the daemon which metadata of the object we have already, so it doesn't have to send it again
+                    annotations["MTAG"] = _metadata_cache.tag(uri.location, uri.object)
+                msg = _handshake_message(serializer, self._pyroHandshake, uri.object, annotations,
+                                         self._pyroSeq, self._pyroHmacKey, sslContext is not None)
                 if config.LOGWIRE:
                     _log_wiredata(log, "proxy connect sending", msg)
-                conn.send(msg.to_bytes())
+                msg.send(conn)
                 msg = message.Message.recv(conn, [message.MSG_CONNECTOK, message.MSG_CONNECTFAIL], hmac_key=self._pyroHmacKey)
                 if config.LOGWIRE:
                     _log_wiredata(log, "proxy connect response received", msg)
@@ -551,7 +849,7 @@ class Proxy(object):
                 handshake_response = "?"
                 if msg.data:
                     serializer = util.get_serializer_by_id(msg.serializer_id)
-                    handshake_response = serializer.deserializeData(msg.data, compressed=msg.flags & message.FLAGS_COMPRESSED)
+                    handshake_response = serializer.deserializeData(msg.data, compressed=msg.compressor)
                 if msg.type == message.MSG_CONNECTFAIL:
                     if sys.version_info < (3, 0):
                         error = "connection to %s rejected: %s" % (connect_location, handshake_response.decode())
@@ -562,8 +860,9 @@ class Proxy(object):
                     raise errors.CommunicationError(error)
                 elif msg.type == message.MSG_CONNECTOK:
                     if msg.flags & message.FLAGS_META_ON_CONNECT:
-                        self.__processMetadata(handshake_response["meta"])
+                        self.__processMetadata(_metadata_cache.from_handshake(uri, msg.annotations.get("MTAG"), handshake_response["meta"]))
                         handshake_response = handshake_response["handshake"]
+                    _handshake_negotiate(conn, msg, self._pyroHmacKey, sslContext is not None)
                     self._pyroConnection = conn
                     if replaceUri:
                         self._pyroUri = uri
@@ -593,7 +892,29 @@ class Proxy(object):
             if connected_socket:
                 self._pyroConnection = socketutil.SocketConnection(connected_socket, uri.object, True)
             else:
-                connect_and_handshake(conn)
+                try:
+                    probe = _circuit_breakers.before_connect(uri.location)
+                    try:
+                        connect_and_handshake(conn)
+                        if probe:
+                            # the circuit breaker only closes again if the daemon answers a ping too
+                            message.Message.ping(self._pyroConnection, _get_hmac(self._pyroConnection, self._pyroHmacKey)[0])
+                    except errors.CommunicationError:
+                        self._pyroRelease()
+                        _circuit_breakers.failed(uri.location)
+                        raise
+                    except Exception:
+                        _circuit_breakers.succeeded(uri.location)   # the daemon is reachable, it's not a connection problem
+                        raise
+                    finally:
+                        if probe:
+                            _circuit_breakers.probe_finished(uri.location)  # also when the probe was interrupted
+                    _circuit_breakers.succeeded(uri.location)
+                except errors.CommunicationError:
+                    if uri is not self._pyroUri:
+                        # the location that the uri was resolved to might be stale, resolve it again next time
+                        _resolve_cache.invalidate(uri.location)
+                    raise
             if config.METADATA:
                 # obtain metadata if this feature is enabled, and the metadata is not known yet
                 if self._pyroMethods or self._pyroAttrs:
@@ -629,14 +950,14 @@ class Proxy(object):
     def __processMetadata(self, metadata):
         if not metadata:
             return
-        self._pyroOneway = set(metadata["oneway"])
-        self._pyroMethods = set(metadata["methods"])
-        self._pyroAttrs = set(metadata["attrs"])
-        if log.isEnabledFor(logging.DEBUG):
-            log.debug("from meta: methods=%s, oneway methods=%s, attributes=%s",
-                      sorted(self._pyroMethods), sorted(self._pyroOneway), sorted(self._pyroAttrs))
-        if not self._pyroMethods and not self._pyroAttrs:
-            raise errors.PyroError("remote object doesn't expose any methods or attributes. Did you forget setting @expose on them?")
+        if not isinstance(metadata, _MetadataRecord):
+            metadata = _MetadataRecord.create(metadata)
+        # the record is shared with other proxies, a proxy only copies a set of it when it changes the set
+        self._pyroOneway = _SharedSet(metadata.oneway)
+        self._pyroMethods = _SharedSet(metadata.methods)
+        self._pyroAttrs = _SharedSet(metadata.attrs)
+        self._pyroCacheable, self._pyroIdempotent = metadata.cacheable, metadata.idempotent
+        self.__pyroCheckedMethods = set()  # the methods must be checked against the new metadata again
 
     def _pyroReconnect(self, tries=100000000):
         """
@@ -645,6 +966,7 @@ class Proxy(object):
         and retries making a new connection until it succeeds or the given amount of tries ran out.
         """
         self._pyroRelease()
+        attempt = 0
         while tries:
             try:
                 self.__pyroCreateConnection()
@@ -652,14 +974,35 @@ class Proxy(object):
             except errors.CommunicationError:
                 tries -= 1
                 if tries:
-                    time.sleep(2)
+                    # exponential backoff with jitter, so that many clients don't all reconnect at the same moment
+                    time.sleep(min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+                    attempt += 1
         msg = "failed to reconnect"
         log.error(msg)
         raise errors.ConnectionClosedError(msg)
 
-    def _pyroBatch(self):
-        """returns a helper class that lets you create batched method calls on the proxy"""
-        return _BatchProxyAdapter(self)
+    def _pyroBatch(self, parallel=False):
+        """returns a helper class that lets you create batched method calls on the proxy.
+        If parallel is True, the daemon executes the calls in the batch concurrently instead of one after another."""
+        return _BatchProxyAdapter(self, parallel)
+
+    def _pyroPipeline(self, max_inflight=100):
+        """returns a helper class that lets you do pipelined method calls, on a new connection to the remote object.
+        Every call is sent immediately without waiting for the responses of the earlier calls,
+        and returns a :py:class:`Pyro4.futures.FutureResult`. At most max_inflight calls can wait for their response."""
+        proxy = self.__copy__()
+        proxy.__pyroPipeline = _PipelineState(max_inflight)
+        return _PipelineProxyAdapter(proxy, proxy.__pyroPipeline)
+
+    def _pyroAutoBatch(self, max_calls=100, max_delay=0.01, parallel=False):
+        """returns a helper class that collects the method calls that are done on it, by one or more threads,
+        and sends them in batches over a new connection to the remote object. A batch is sent when it has max_calls calls
+        or max_delay seconds after its first call. Every call returns a :py:class:`Pyro4.futures.FutureResult`.
+        If parallel is True, the daemon executes the calls in a batch concurrently."""
+        proxy = self.__copy__()
+        if config.METADATA and not (proxy._pyroMethods or proxy._pyroAttrs):
+            proxy._pyroBind()   # we need to know the oneway methods
+        return _AutoBatchProxyAdapter(proxy, max_calls, max_delay, parallel)
 
     def _pyroAsync(self, asynchronous=True):
         """turns the proxy into asynchronous mode so you can do asynchronous method calls,
@@ -668,6 +1011,14 @@ class Proxy(object):
         via copy.copy)."""
         self.__async = asynchronous
 
+    def _pyroAsyncCheckout(self):
+        """Context manager that checks out a connected copy of this proxy, to do an asynchronous call with.
+        The copies are kept in a pool for reuse by the next asynchronous calls, until the proxy is released."""
+        with self.__pyroConnLock:
+            if self.__pyroAsyncPool is None:
+                self.__pyroAsyncPool = ProxyPool(self, max_size=config.ASYNC_WORKERS)
+            return self.__pyroAsyncPool.checkout()
+
     if sys.version_info < (3, 7):
         # async keyword backwards compatibility
         _pyroAsync_37 = _pyroAsync
@@ -680,10 +1031,12 @@ class Proxy(object):
                 asynchronous = kwargs["async"]
             return Proxy._pyroAsync_37(self, asynchronous)
 
-    def _pyroInvokeBatch(self, calls, oneway=False):
+    def _pyroInvokeBatch(self, calls, oneway=False, parallel=False):
         flags = message.FLAGS_BATCH
         if oneway:
             flags |= message.FLAGS_ONEWAY
+        if parallel:
+            flags |= message.FLAGS_BATCH_PARALLEL
         return self._pyroInvoke("<batch>", calls, None, flags)
 
     def _pyroAnnotations(self):
@@ -711,22 +1064,28 @@ class Proxy(object):
         return
 
     def __annotations(self, clear=True):
+        # the annotations for the next message, or None if there are none (the common case that needs no dicts)
         annotations = current_context.annotations
-        if current_context.correlation_id:
-            annotations["CORR"] = current_context.correlation_id.bytes
+        custom_annotations = self._pyroAnnotations()
+        correlation_id = current_context.correlation_id
+        if not annotations and not custom_annotations and not correlation_id:
+            return None
+        if correlation_id:
+            annotations["CORR"] = correlation_id.bytes
         else:
             annotations.pop("CORR", None)
-        annotations.update(self._pyroAnnotations())
+        annotations.update(custom_annotations)
         if clear:
             current_context.annotations = {}
         return annotations
 
-    def __serializeBlobArgs(self, vargs, kwargs, annotations, flags, objectId, methodname, serializer):
+    def __serializeBlobArgs(self, vargs, kwargs, annotations, flags, objectId, methodname, serializer, compressor):
         """
         Special handling of a "blob" argument that has to stay serialized until explicitly deserialized in client code.
         This makes efficient, transparent gateways or dispatchers and such possible:
         they don't have to de/reserialize the message and are independent from the serialized class definitions.
         Annotations are passed in because some blob metadata is added. They're not part of the blob itself.
+        Returns the data, the compressor that was used for it (None if it is not compressed), and the flags.
         """
         if len(vargs) > 1 or kwargs:
             raise errors.SerializeError("if SerializedBlob is used, it must be the only argument")
@@ -744,11 +1103,174 @@ class Proxy(object):
         if blob._contains_blob:
             # directly pass through the already serialized msg data from within the blob
             protocol_msg = blob._data
-            data, compressed = protocol_msg.data, protocol_msg.flags & message.FLAGS_COMPRESSED
+            return protocol_msg.data, protocol_msg.compressor, flags
         else:
             # replaces SerializedBlob argument with the data to be serialized
-            data, compressed = serializer.serializeCall(objectId, methodname, blob._data, kwargs, compress=config.COMPRESSION)
-        return data, compressed, flags
+            data, compressed = serializer.serializeCall(objectId, methodname, blob._data, kwargs, compress=compressor)
+            return data, compressor if compressed else None, flags
+
+
+class _ResultCache(object):
+    """LRU caches for the (serialized) results of the cacheable methods of a proxy, one cache per method"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods = {}   # method name -> OrderedDict of serialized arguments -> (expiry time, serialized result)
+        self.hits = self.misses = 0
+
+    def get(self, methodname, key):
+        with self.lock:
+            results = self.methods.get(methodname)
+            if results is not None and key in results:
+                expiry, value = results.pop(key)
+                if expiry is None or expiry > time.time():
+                    results[key] = (expiry, value)   # it is the most recently used result now
+                    self.hits += 1
+                    return True, value
+            self.misses += 1
+            return False, None
+
+    def put(self, methodname, key, value, ttl, maxsize):
+        with self.lock:
+            results = self.methods.setdefault(methodname, collections.OrderedDict())
+            results.pop(key, None)
+            results[key] = (None if ttl is None else time.time() + ttl, value)
+            while len(results) > maxsize:
+                results.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.methods.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": sum(len(r) for r in self.methods.values())}
+
+
+class _Histogram(object):
+    """
+    HDR-style histogram of non-negative integer values. The buckets grow exponentially and are each divided
+    into 32 linear sub-buckets, so every recorded value is kept with a precision of about 3%, whatever its size.
+    """
+    sub_bits = 5
+
+    def __init__(self):
+        self.buckets = collections.defaultdict(int)   # bucket index -> count
+        self.count = self.total = 0
+        self.min = self.max = None
+
+    def record(self, value):
+        shift = value.bit_length() - self.sub_bits - 1
+        if shift < 0:
+            self.buckets[value] += 1   # the small values each have their own bucket
+        else:
+            self.buckets[(shift << self.sub_bits) + (value >> shift)] += 1
+        if self.count:
+            if value < self.min:
+                self.min = value
+            elif value > self.max:
+                self.max = value
+        else:
+            self.min = self.max = value
+        self.count += 1
+        self.total += value
+
+    def __bucket_value(self, index):
+        # the value in the middle of the bucket
+        if index < 1 << self.sub_bits:
+            return index
+        shift = (index >> self.sub_bits) - 1
+        low = ((index & ((1 << self.sub_bits) - 1)) + (1 << self.sub_bits)) << shift
+        return low + ((1 << shift) - 1) // 2
+
+    def percentile(self, percentile):
+        if not self.count:
+            return None
+        rank = max(1, int(percentile / 100.0 * self.count + 0.5))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.max, max(self.min, self.__bucket_value(index)))
+        return self.max
+
+    def summary(self, divisor=1):
+        """returns a dict with the count, min, mean, max and the 50th, 90th and 99th percentile of the values"""
+        summary = {
+            "min": self.min,
+            "mean": self.total / self.count,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max
+        }
+        if divisor != 1:
+            summary = dict((name, value / divisor) for name, value in summary.items())
+        summary["count"] = self.count
+        return summary
+
+
+class _CallTiming(object):
+    """the moments at which the phases of a remote call ended (the first is when it started), and its message sizes"""
+    __slots__ = ("moments", "request_size", "response_size")
+    phases = ("serialize", "send", "wait", "receive", "deserialize")
+
+    def __init__(self):
+        self.moments = [perf_timer()]
+        self.request_size = 0
+        self.response_size = None
+
+    def mark(self):
+        self.moments.append(perf_timer())
+
+    def values(self):
+        """returns (name, value) pairs of the durations of the phases and the total in microseconds, and the message sizes"""
+        moments = self.moments
+        values = [(phase, max(0, int((end - start) * 1000000))) for phase, start, end in zip(self.phases, moments, moments[1:])]
+        values.append(("total", max(0, int((moments[-1] - moments[0]) * 1000000))))
+        values.append(("request_bytes", self.request_size))
+        if self.response_size is not None:
+            values.append(("response_bytes", self.response_size))
+        return values
+
+
+class _CallStats(object):
+    """latency histograms of the phases of remote calls, and histograms of their message sizes, per key"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}   # key -> dict of histograms
+
+    def record(self, key, values):
+        with self.lock:
+            histograms = self.calls.get(key)
+            if histograms is None:
+                histograms = self.calls[key] = collections.defaultdict(_Histogram)
+            for name, value in values:
+                histograms[name].record(value)
+
+    def clear(self):
+        with self.lock:
+            self.calls.clear()
+
+    def stats(self):
+        with self.lock:
+            result = {}
+            for key, histograms in self.calls.items():
+                stats = result[key] = {"calls": histograms["total"].count}
+                for name, histogram in histograms.items():
+                    stats[name] = histogram.summary(1 if name.endswith("_bytes") else 1000000)
+            return result
+
+
+class _CacheBypass(object):
+    """context manager that makes the calls in the current thread bypass the result cache of a proxy"""
+    def __init__(self, flag):
+        self.flag = flag
+
+    def __enter__(self):
+        self.flag.active = True
+
+    def __exit__(self, *args):
+        self.flag.active = False
 
 
 class _StreamResultIterator(object):
@@ -756,11 +1278,20 @@ class _StreamResultIterator(object):
     Pyro returns this as a result of a remote call which returns an iterator or generator.
     It is a normal iterable and produces elements on demand from the remote iterator.
     You can simply use it in for loops, list comprehensions etc.
+    If ITER_STREAM_CHUNK is larger than 1, it gets multiple items per round trip: the number of items
+    is adapted to the time the round trips take and the size of the items, up to ITER_STREAM_CHUNK.
+    With ITER_STREAM_PREFETCH, the next items are fetched in the background while the current ones are consumed.
     """
+    chunk_latency = 0.1     # grow the chunk size while a round trip takes less than this many seconds
+    chunk_bytes = 1024 * 1024   # and while the chunk is smaller than this many bytes
+
     def __init__(self, streamId, proxy):
         self.streamId = streamId
         self.proxy = proxy
         self.pyroseq = proxy._pyroSeq
+        self.__buffer = collections.deque()
+        self.__chunk = min(config.ITER_STREAM_CHUNK, 8)     # 1 means: one item per round trip
+        self.__prefetch = None      # FutureResult of the items that are being fetched in the background
 
     def __iter__(self):
         return self
@@ -770,23 +1301,95 @@ class _StreamResultIterator(object):
         return self.__next__()
 
     def __next__(self):
+        if self.__buffer:
+            return self.__buffer.popleft()
         if self.proxy is None:
             raise StopIteration
         if self.proxy._pyroConnection is None:
             raise errors.ConnectionClosedError("the proxy for this stream result has been closed")
-        self.pyroseq += 1
         try:
-            return self.proxy._pyroInvoke("get_next_stream_item", [self.streamId], {}, objectId=constants.DAEMON_NAME)
+            if self.__prefetch is not None:
+                prefetch, self.__prefetch = self.__prefetch, None
+                items, ended = prefetch.value
+            elif self.__chunk > 1:
+                items, ended = self.__fetch()
+            else:
+                self.pyroseq += 1
+                return self.proxy._pyroInvoke("get_next_stream_item", [self.streamId], {}, objectId=constants.DAEMON_NAME)
         except (StopIteration, GeneratorExit):
             # when the iterator is exhausted, the proxy is removed to avoid unneeded close_stream calls later
             # (the server has closed its part of the stream by itself already)
             self.proxy = None
             raise
+        self.__buffer.extend(items)
+        if ended:
+            self.proxy = None
+        elif config.ITER_STREAM_PREFETCH:
+            prefetch = futures.FutureResult()
+            if futures.get_executor().try_submit(self.__prefetchItems, prefetch):
+                self.__prefetch = prefetch
+            # otherwise the next chunk is fetched when it's needed, instead of waiting for room in the executor
+        if self.__buffer:
+            return self.__buffer.popleft()
+        raise StopIteration
+
+    def __fetch(self):
+        # get the next chunk of items, and adapt the size of the next chunk
+        connection = self.proxy._pyroConnection
+        received = getattr(connection, "bytes_received", 0)
+        start = time.time()
+        self.pyroseq += 1
+        try:
+            items, ended = self.proxy._pyroInvoke("get_next_stream_items", [self.streamId, self.__chunk], {},
+                                                  objectId=constants.DAEMON_NAME)
+        except AttributeError:
+            # the daemon is too old to know about chunks, get the items one by one
+            log.debug("daemon doesn't support chunked item streams")
+            self.__chunk = 1
+            self.pyroseq += 1
+            return [self.proxy._pyroInvoke("get_next_stream_item", [self.streamId], {}, objectId=constants.DAEMON_NAME)], False
+        if len(items) >= self.__chunk:
+            duration = time.time() - start
+            item_size = max(1, (getattr(connection, "bytes_received", 0) - received) // len(items))
+            chunk = self.__chunk * 2 if duration < self.chunk_latency else self.__chunk // 2
+            self.__chunk = max(2, min(chunk, self.chunk_bytes // item_size, config.ITER_STREAM_CHUNK))
+        return items, ended
+
+    def __prefetchItems(self, result):
+        try:
+            result.value = self.__fetch()
+        except Exception as x:
+            result.value = futures._ExceptionWrapper(x)
+
+    def push(self, window=100):
+        """
+        Lets the daemon push the remaining items of the stream as they are produced, instead of asking for them.
+        At most window items are underway at any time, so a slow consumer bounds the memory that is used.
+        Returns an iterator over the items, that uses a new connection to the daemon (the stream occupies it).
+        Closing that iterator cancels the stream. This requires the thread server type on the daemon.
+        """
+        items = list(self.__buffer)
+        self.__buffer.clear()
+        if self.__prefetch is not None:
+            prefetch, self.__prefetch = self.__prefetch, None
+            fetched, ended = prefetch.value
+            items.extend(fetched)
+            if ended:
+                self.proxy = None
+        if self.proxy is None:
+            return iter(items)
+        pushed = _PushedStreamIterator(self.streamId, self.proxy, window, items)
+        self.proxy = None   # the pushed stream is responsible for closing the stream now
+        return pushed
 
     def __del__(self):
         self.close()
 
     def close(self):
+        self.__buffer.clear()
+        if self.__prefetch is not None:
+            self.__prefetch.wait()
+            self.__prefetch = None
         if self.proxy and self.proxy._pyroConnection is not None:
             if self.pyroseq == self.proxy._pyroSeq:
                 # we're still in sync, it's okay to use the same proxy to close this stream
@@ -807,6 +1410,54 @@ class _StreamResultIterator(object):
         self.proxy = None
 
 
+class _PushedStreamIterator(object):
+    """
+    Iterator over the items of an item stream that the daemon pushes to the client, see :py:meth:`_StreamResultIterator.push`.
+    It uses its own connection to the daemon. Close it to cancel the stream.
+    """
+    def __init__(self, streamId, proxy, window, items):
+        self.streamId = streamId
+        self.__buffer = collections.deque(items)
+        self.__items = None
+        self.__proxy = proxy.__copy__()
+        self.__items = self.__proxy._pyroPushedItems(streamId, window)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        # python 2.x support
+        return self.__next__()
+
+    def __next__(self):
+        if self.__buffer:
+            return self.__buffer.popleft()
+        if self.__items is None:
+            raise StopIteration
+        try:
+            return next(self.__items)
+        except Exception:
+            # the stream has ended, or failed: the daemon has removed it already
+            self.__items = None
+            self.__proxy._pyroRelease()
+            raise
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        self.__buffer.clear()
+        if self.__items is not None:
+            self.__items = None
+            try:
+                with self.__proxy.__copy__() as closingProxy:
+                    closingProxy._pyroInvoke("close_stream", [self.streamId], {},
+                                             flags=message.FLAGS_ONEWAY, objectId=constants.DAEMON_NAME)
+            except errors.CommunicationError:
+                pass
+            self.__proxy._pyroRelease()
+
+
 class _BatchedRemoteMethod(object):
     """method call abstraction that is used with batched calls"""
 
@@ -821,6 +1472,26 @@ class _BatchedRemoteMethod(object):
         self.__calls.append((self.__name, args, kwargs))
 
 
+class _BatchResultsIterator(object):
+    """
+    Iterator over the results of a batch. A call that failed raises its remote exception when the iteration gets to it.
+    The iteration can continue after that, with the results of the calls after it (that only a parallel batch executes).
+    """
+    def __init__(self, results):
+        self.__results = iter(results)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        result = next(self.__results)
+        if isinstance(result, futures._ExceptionWrapper):
+            result.raiseIt()  # re-raise the remote exception locally.
+        return result  # it is a regular result object, return that
+
+    next = __next__     # Python 2
+
+
 class _BatchProxyAdapter(object):
     """Helper class that lets you batch multiple method calls into one.
     It is constructed with a reference to the normal proxy that will
@@ -828,8 +1499,9 @@ class _BatchProxyAdapter(object):
     and finally call the batch proxy itself. That call will return a generator
     for the results of every method call in the batch (in sequence)."""
 
-    def __init__(self, proxy):
+    def __init__(self, proxy, parallel=False):
         self.__proxy = proxy
+        self.__parallel = parallel
         self.__calls = []
 
     def __getattr__(self, name):
@@ -842,27 +1514,20 @@ class _BatchProxyAdapter(object):
         pass
 
     def __copy__(self):
-        copy = type(self)(self.__proxy)
+        copy = type(self)(self.__proxy, self.__parallel)
         copy.__calls = list(self.__calls)
         return copy
 
-    def __resultsgenerator(self, results):
-        for result in results:
-            if isinstance(result, futures._ExceptionWrapper):
-                result.raiseIt()  # re-raise the remote exception locally.
-            else:
-                yield result  # it is a regular result object, yield that and continue.
-
     def __call__(self, oneway=False, asynchronous=False):
         if oneway and asynchronous:
             raise errors.PyroError("async oneway calls make no sense")
         if asynchronous:
-            return _AsyncRemoteMethod(self, "<asyncbatch>", self.__proxy._pyroMaxRetries)()
+            return _AsyncRemoteMethod(self.__copy__(), "<asyncbatch>", self.__proxy._pyroMaxRetries)()
         else:
-            results = self.__proxy._pyroInvokeBatch(self.__calls, oneway)
+            results = self.__proxy._pyroInvokeBatch(self.__calls, oneway, self.__parallel)
             self.__calls = []  # clear for re-use
             if not oneway:
-                return self.__resultsgenerator(results)
+                return _BatchResultsIterator(results)
 
     if sys.version_info < (3, 7):
         # async keyword backwards compatibility
@@ -878,15 +1543,231 @@ class _BatchProxyAdapter(object):
             kwargs["oneway"] = oneway
             return _BatchProxyAdapter.call_37(self, **kwargs)
 
+    def _pyroAsyncCheckout(self):
+        return self     # an asynchronous batch is executed on a copy of the batch adapter already
+
     def _pyroInvoke(self, name, args, kwargs):
         # ignore all parameters, we just need to execute the batch
-        results = self.__proxy._pyroInvokeBatch(self.__calls)
+        with self.__proxy._pyroAsyncCheckout() as proxy:
+            results = proxy._pyroInvokeBatch(self.__calls, parallel=self.__parallel)
         self.__calls = []  # clear for re-use
-        return self.__resultsgenerator(results)
+        return _BatchResultsIterator(results)
+
+
+class _PipelineState(object):
+    """the calls on a pipelined proxy that are waiting for their response, in the order they were sent"""
+    def __init__(self, max_inflight):
+        self.max_inflight = max(1, max_inflight)
+        self.pending = collections.deque()   # (seq, serializer, hmac key, FutureResult)
+        self.condition = threading.Condition()
+        self.receiving = False
+
+    def drain(self):
+        with self.condition:
+            while self.pending:
+                self.condition.wait()
+
+
+class _PipelinedRemoteMethod(object):
+    """method call abstraction that is used with pipelined calls"""
+
+    def __init__(self, proxy, name):
+        self.__proxy = proxy
+        self.__name = name
+
+    def __getattr__(self, name):
+        return _PipelinedRemoteMethod(self.__proxy, "%s.%s" % (self.__name, name))
+
+    def __call__(self, *args, **kwargs):
+        return self.__proxy._pyroInvokePipelined(self.__name, args, kwargs)
+
+
+class _PipelineProxyAdapter(object):
+    """Helper class that lets you pipeline method calls over a single connection.
+    Calls on this object are sent right away, without waiting for the response of
+    the previous calls, and return a FutureResult. Close it (or use it as a context manager)
+    to wait for the outstanding calls and close the connection."""
+
+    def __init__(self, proxy, pipeline):
+        self.__proxy = proxy
+        self.__pipeline = pipeline
+
+    def __getattr__(self, name):
+        return _PipelinedRemoteMethod(self.__proxy, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.__pipeline.drain()
+        self.__proxy._pyroRelease()
+
+
+class _AutoBatchedRemoteMethod(object):
+    """method call abstraction that is used with automatically batched calls"""
+
+    def __init__(self, collect, name):
+        self.__collect = collect
+        self.__name = name
+
+    def __getattr__(self, name):
+        return _AutoBatchedRemoteMethod(self.__collect, "%s.%s" % (self.__name, name))
+
+    def __call__(self, *args, **kwargs):
+        return self.__collect(self.__name, args, kwargs)
+
+
+class _AutoBatchProxyAdapter(object):
+    """Helper class that collects the method calls done on it, from one or more threads, into batches.
+    Every call immediately returns a FutureResult. A batch is sent over its own connection to the remote object
+    as soon as it has max_calls calls, or max_delay seconds after the first call in it.
+    Calls of oneway methods are sent in oneway batches; their result is None once the batch has been sent.
+    Close it (or use it as a context manager) to send the remaining calls, wait for them, and close the connection."""
+
+    def __init__(self, proxy, max_calls, max_delay, parallel=False):
+        self.__proxy = proxy
+        self.__max_calls = max(1, max_calls)
+        self.__max_delay = max_delay
+        self.__parallel = parallel
+        self.__condition = threading.Condition()
+        self.__pending = []     # (method, vargs, kwargs, FutureResult) of the batch that is being collected
+        self.__pending_oneway = False
+        self.__timer = None
+        self.__ready = collections.deque()  # (oneway, calls) of the batches waiting to be sent, in order
+        self.__unfinished = 0   # batches that have not been sent (and answered) yet
+        self.__sending = False  # is there a task that sends the ready batches
+        self.__closed = False
+        self.__calls_sent = self.__batches_sent = 0
+
+    def __getattr__(self, name):
+        return _AutoBatchedRemoteMethod(self.__collect, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def flush(self):
+        """sends the calls that have been collected so far, without waiting for the batch to fill up"""
+        start = False
+        with self.__condition:
+            if self.__pending:
+                start = self.__seal()
+        if start:
+            self.__startSending()
+
+    def close(self):
+        """sends the remaining calls, waits until all batches have been processed, and closes the connection"""
+        start = False
+        with self.__condition:
+            if self.__pending:
+                start = self.__seal()
+            self.__closed = True
+        if start:
+            self.__startSending()
+        with self.__condition:
+            while self.__unfinished:
+                self.__condition.wait()
+        self.__proxy._pyroRelease()
+
+    def stats(self):
+        """returns a dict with the number of calls and batches that have been sent"""
+        with self.__condition:
+            return {"calls": self.__calls_sent, "batches": self.__batches_sent}
+
+    def __collect(self, method, vargs, kwargs):
+        oneway = method in self.__proxy._pyroOneway
+        result = futures.FutureResult()
+        start = False
+        with self.__condition:
+            if self.__closed:
+                raise errors.PyroError("the auto batch proxy has been closed")
+            if self.__pending and oneway != self.__pending_oneway:
+                start = self.__seal()   # a batch is either oneway or not, keep the calls in order
+            self.__pending.append((method, vargs, kwargs, result))
+            self.__pending_oneway = oneway
+            if len(self.__pending) >= self.__max_calls:
+                start = self.__seal() or start
+            elif len(self.__pending) == 1:
+                self.__timer = futures._scheduler.schedule(self.__max_delay, self.__expired, self.__pending)
+        if start:
+            self.__startSending()
+        return result
+
+    def __expired(self, batch):
+        # called from the timer thread
+        start = False
+        with self.__condition:
+            if self.__pending is batch:
+                start = self.__seal()
+        if start:
+            self.__startSending(block=False)
+
+    def __seal(self):
+        # move the batch that is being collected to the send queue (called with the lock held)
+        # returns True if the caller has to start the task that sends it, after releasing the lock
+        if self.__timer is not None:
+            futures._scheduler.cancel(self.__timer)
+            self.__timer = None
+        self.__ready.append((self.__pending_oneway, self.__pending))
+        self.__pending = []
+        self.__unfinished += 1
+        if self.__sending:
+            return False    # the running task also sends this batch
+        self.__sending = True
+        return True
+
+    def __startSending(self, block=True):
+        executor = futures.get_executor()
+        if block:
+            executor.submit(self.__send)
+        elif not executor.try_submit(self.__send):
+            futures._scheduler.schedule_submit(0, executor, self.__send)
+
+    def __send(self):
+        # there is at most one of these tasks per adapter, so the batches are sent in order
+        while True:
+            with self.__condition:
+                if not self.__ready:
+                    self.__sending = False
+                    return
+                oneway, batch = self.__ready.popleft()
+            try:
+                self.__execute(oneway, batch)
+            finally:
+                with self.__condition:
+                    self.__unfinished -= 1
+                    self.__condition.notify_all()
+
+    def __execute(self, oneway, batch):
+        try:
+            while batch:
+                results = self.__proxy._pyroInvokeBatch([call[:3] for call in batch], oneway, self.__parallel)
+                with self.__condition:
+                    self.__batches_sent += 1
+                    self.__calls_sent += len(batch)
+                if oneway:
+                    for call in batch:
+                        call[3].value = None
+                    return
+                if not results:
+                    raise errors.ProtocolError("batch returned no results")
+                for call, result in zip(batch, results):
+                    call[3].value = result
+                # the daemon stops processing a batch at the first exception, send the calls that weren't executed again
+                batch = batch[len(results):]
+        except Exception as x:
+            error = futures._ExceptionWrapper(x)
+            for call in batch:
+                call[3].value = error
 
 
 class _AsyncRemoteMethod(object):
-    """asynchronous method call abstraction (call will run in a background thread)"""
+    """asynchronous method call abstraction (call will run in a worker thread of the shared executor)"""
     def __init__(self, proxy, name, max_retries):
         self.__proxy = proxy
         self.__name = name
@@ -897,29 +1778,27 @@ class _AsyncRemoteMethod(object):
 
     def __call__(self, *args, **kwargs):
         result = futures.FutureResult()
-        thread = threading.Thread(target=self.__asynccall, args=(result, args, kwargs))
-        thread.setDaemon(True)
-        thread.start()
+        futures.get_executor().submit(self.__asynccall, result, args, kwargs)
         return result
 
     def __asynccall(self, asyncresult, args, kwargs):
         for attempt in range(self.__max_retries + 1):
             try:
-                # use a copy of the proxy otherwise calls would still be done in sequence,
-                # and use contextmanager to close the proxy after we're done
-                with self.__proxy.__copy__() as proxy:
-                    delay = 0.1 + random.random() / 5
-                    while not proxy._pyroConnection:
-                        try:
-                            proxy._pyroBind()
-                        except errors.CommunicationError as x:
-                            if "no free workers" not in str(x):
-                                raise
-                            time.sleep(delay)   # wait a bit until a worker might be available again
-                            delay += 0.4 + random.random() / 2
-                            if 0 < config.COMMTIMEOUT / 2 < delay:
-                                raise
-                    value = proxy._pyroInvoke(self.__name, args, kwargs)
+                # use a connected copy of the proxy otherwise calls would still be done in sequence
+                delay = 0.1 + random.random() / 5
+                while True:
+                    try:
+                        with self.__proxy._pyroAsyncCheckout() as proxy:
+                            value = proxy._pyroInvoke(self.__name, args, kwargs)
+                        break
+                    except errors.CommunicationError as x:
+                        # connecting the copy failed because the daemon is busy
+                        if "no free workers" not in str(x):
+                            raise
+                        time.sleep(delay)   # wait a bit until a worker might be available again
+                        delay += 0.4 + random.random() / 2
+                        if 0 < config.COMMTIMEOUT / 2 < delay:
+                            raise
                 asyncresult.value = value
                 return
             except (errors.ConnectionClosedError, errors.TimeoutError) as x:
@@ -934,9 +1813,472 @@ class _AsyncRemoteMethod(object):
                 return
 
 
-def batch(proxy):
+class ProxyPool(object):
+    """
+    A thread-safe pool of connected proxies for the same Pyro object, that many threads can share.
+    Every method call on the pool checks out a proxy, does the call with it, and puts the proxy back in the pool.
+    You can also check out a proxy yourself for a series of calls: ``with pool.checkout() as proxy: ...``
+
+    The pool keeps at most max_size proxies (connections). This also caps the number of calls that are in progress
+    on the daemon at the same time; keep it below the size of the daemon's thread pool to avoid "no free workers" errors.
+    If all proxies are in use, a call waits for a free one for at most checkout_timeout seconds (None=no limit).
+    A proxy that has been idle for more than ping_interval seconds is checked with a ping before it is used,
+    and proxies that have been idle for more than idle_timeout seconds are closed.
+    Instead of an uri you can pass a proxy: the pool then creates copies of it, with the same settings (hmac key, timeout...)
+    The uri is resolved once, all proxies connect to the same daemon.
+    """
+    def __init__(self, uri, max_size=8, checkout_timeout=None, idle_timeout=60.0, ping_interval=5.0):
+        if isinstance(uri, Proxy):
+            self.__template = uri.__copy__()
+        else:
+            self.__template = Proxy(uri)
+        self.max_size = max(1, max_size)
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.__resolved = False
+        self.__idle = []    # (proxy, time it was put back), least recently used first
+        self.__size = 0     # number of proxies that exist, idle or in use
+        self.__closed = False
+        self.__condition = threading.Condition()
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name.startswith("_ProxyPool__"):
+            raise AttributeError(name)
+        return _RemoteMethod(self.__invoke, name, self.__template._pyroMaxRetries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return "<%s.%s at 0x%x; %d of %d in use; for %s>" % (self.__class__.__module__, self.__class__.__name__, id(self),
+                                                             self.__size - len(self.__idle), self.max_size, self.__template._pyroUri)
+
+    @property
+    def size(self):
+        """number of proxies in the pool (idle or in use)"""
+        return self.__size
+
+    @property
+    def idle(self):
+        """number of idle proxies in the pool"""
+        return len(self.__idle)
+
+    @contextlib.contextmanager
+    def checkout(self):
+        """Context manager that checks out a connected proxy, and puts it back in the pool afterwards."""
+        proxy = self.__acquire()
+        try:
+            yield proxy
+        finally:
+            self.__release(proxy)
+
+    def close(self):
+        """Closes the idle proxies in the pool. The proxies that are in use are closed when they are put back."""
+        with self.__condition:
+            self.__closed = True
+            for proxy, _ in self.__idle:
+                proxy._pyroRelease()
+            self.__size -= len(self.__idle)
+            self.__idle = []
+            self.__condition.notify_all()
+
+    def __invoke(self, methodname, vargs, kwargs):
+        with self.checkout() as proxy:
+            return proxy._pyroInvoke(methodname, vargs, kwargs)
+
+    def __acquire(self):
+        deadline = None if self.checkout_timeout is None else time.time() + self.checkout_timeout
+        with self.__condition:
+            while True:
+                if self.__closed:
+                    raise errors.PyroError("proxy pool is closed")
+                self.__reap()
+                if self.__idle:
+                    proxy, last_used = self.__idle.pop()
+                    break
+                if self.__size < self.max_size:
+                    self.__size += 1
+                    proxy = last_used = None
+                    break
+                wait = None if deadline is None else deadline - time.time()
+                if wait is not None and wait <= 0:
+                    raise errors.TimeoutError("no free proxy in the pool")
+                self.__condition.wait(wait)
+        try:
+            if proxy is not None and time.time() - last_used > self.ping_interval and not self.__ping(proxy):
+                log.debug("proxy from the pool failed the ping check, replacing it")
+                proxy._pyroRelease()
+                proxy = None
+            if proxy is None:
+                proxy = self.__create()
+            return proxy
+        except BaseException:
+            with self.__condition:
+                self.__size -= 1
+                self.__condition.notify()
+            raise
+
+    def __release(self, proxy):
+        with self.__condition:
+            if self.__closed or proxy._pyroConnection is None:
+                # the pool is closed, or the connection failed during the call: get rid of the proxy
+                proxy._pyroRelease()
+                self.__size -= 1
+            else:
+                self.__idle.append((proxy, time.time()))
+            self.__condition.notify()
+
+    def __reap(self):
+        # close the proxies that have been idle for too long (called with the lock held)
+        if self.idle_timeout is None:
+            return
+        too_old = time.time() - self.idle_timeout
+        while self.__idle and self.__idle[0][1] < too_old:
+            proxy, _ = self.__idle.pop(0)
+            proxy._pyroRelease()
+            self.__size -= 1
+
+    def __create(self):
+        if not self.__resolved:
+            self.__template._pyroUri = _resolve(self.__template._pyroUri, self.__template._pyroHmacKey)
+            self.__resolved = True
+        proxy = self.__template.__copy__()
+        proxy._pyroBind()
+        return proxy
+
+    @staticmethod
+    def __ping(proxy):
+        connection = proxy._pyroConnection
+        if connection is None:
+            return False
+        try:
+            hmac_key, _ = _get_hmac(connection, proxy._pyroHmacKey)
+            message.Message.ping(connection, hmac_key)
+            return True
+        except errors.CommunicationError:
+            return False
+
+
+class _HedgedCall(object):
+    """
+    A call on a load balanced proxy, that gets a backup call on another replica if it takes too long.
+    If the backup call answers first, it closes the connection of the call that is still waiting.
+    """
+    def __init__(self, uri, context):
+        self.lock = threading.Lock()
+        self.context = context
+        self.tried = {uri}          # the replicas that got the call
+        self.proxy = None           # the proxy that does the call, while it is in progress
+        self.done = False
+        self.interrupted = False    # the backup call has closed the connection of the call
+        self.backup = None          # FutureResult of the backup call, once it has been started
+
+    def started(self, proxy):
+        with self.lock:
+            self.proxy = proxy
+
+    def finished(self):
+        """no backup call can be started after this. Returns True if the call was interrupted"""
+        with self.lock:
+            self.proxy = None
+            self.done = True
+            return self.interrupted
+
+    def start_backup(self):
+        with self.lock:
+            if self.done or self.backup is not None:
+                return None
+            self.backup = futures.FutureResult()
+            return self.backup
+
+    def interrupt(self):
+        with self.lock:
+            connection = None if self.proxy is None else self.proxy._pyroConnection
+            if connection is not None:
+                self.interrupted = True
+                try:
+                    connection.sock.shutdown(socket.SHUT_RDWR)    # wakes up the call that waits for the response
+                except (socket.error, OSError):
+                    pass
+
+
+class _Replica(object):
+    """bookkeeping of one of the Pyro objects that a load balanced proxy spreads its calls over"""
+    def __init__(self, uri, pool):
+        self.uri = uri
+        self.pool = pool
+        self.outstanding = 0    # calls in progress
+        self.latency = 0.0      # exponentially weighted moving average of the call duration
+        self.calls = 0
+        self.failures = 0
+        self.failed = False     # skipped until the next membership refresh
+
+
+class LoadBalancedProxy(object):
+    """
+    Spreads the method calls over all Pyro objects that match a PYROMETA uri: replicas of the same object,
+    registered in the name server by different daemons with the same metadata.
+    It keeps a pool of connections (see :py:class:`ProxyPool`) to every replica, and sends each call to the replica with
+    the fewest calls in progress; replicas that are equally busy are ordered by their average latency.
+    With strategy="latency" it picks the replica with the lowest average latency weighed by the calls in progress instead.
+    The replicas are looked up again every refresh_interval seconds, to pick up new ones and drop the ones that are gone.
+    If a call fails with a communication error, the call is retried on another replica, and the failed replica is
+    avoided until the next refresh. This means a call may be executed twice if the connection failed after the replica received it.
+    Instead of an uri you can pass a proxy: the connections then use copies of it, with the same settings.
+    It is safe to share between threads.
+
+    With hedge set to a percentile (for instance 95), calls of the methods that are marked @idempotent are hedged:
+    if the replica hasn't answered a call within that percentile of the recent durations of the method,
+    the call is also sent to another replica. The first answer is returned, the other one is discarded.
+    Communication errors don't count as an answer; if both calls fail, the call fails over to the other replicas.
+    The retries of _pyroMaxRetries apply to the hedged call as a whole.
+    """
+    hedge_samples = 20      # minimum number of durations of a method before its calls are hedged
+    hedge_window = 200      # number of recent durations per method that the hedge delay is computed from
+
+    def __init__(self, uri, refresh_interval=30.0, max_connections=4, strategy="outstanding", hedge=None):
+        if strategy not in ("outstanding", "latency"):
+            raise ValueError("invalid strategy")
+        if hedge is not None and not 0 < hedge < 100:
+            raise ValueError("hedge must be a percentile between 0 and 100")
+        if isinstance(uri, Proxy):
+            self.__template = uri.__copy__()
+        else:
+            self.__template = Proxy(uri)
+        self.refresh_interval = refresh_interval
+        self.max_connections = max(1, max_connections)
+        self.strategy = strategy
+        self.hedge = hedge
+        self.__durations = {}   # method name -> recent durations of the calls, to compute the hedge delay from
+        self.__idempotent = frozenset()     # the idempotent methods, from the metadata of the replicas
+        self.__hedged = 0
+        self.__hedgesWon = 0
+        self.__replicas = {}    # uri string -> _Replica
+        self.__refreshed = 0.0
+        self.__closed = False
+        self.__lock = threading.Lock()
+        self.__refreshLock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name.startswith("_LoadBalancedProxy__"):
+            raise AttributeError(name)
+        return _RemoteMethod(self.__invoke, name, self.__template._pyroMaxRetries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return "<%s.%s at 0x%x; %d replicas; for %s>" % (self.__class__.__module__, self.__class__.__name__, id(self),
+                                                         len(self.__replicas), self.__template._pyroUri)
+
+    @property
+    def replicas(self):
+        """
+        The replicas that calls are spread over, as a list of dicts with their uri, the number of calls in progress,
+        the average latency (seconds), the number of calls and failures, and if the replica is currently skipped.
+        """
+        with self.__lock:
+            return [{"uri": replica.uri, "outstanding": replica.outstanding, "latency": replica.latency,
+                     "calls": replica.calls, "failures": replica.failures, "failed": replica.failed}
+                    for replica in self.__replicas.values()]
+
+    @property
+    def hedge_stats(self):
+        """The number of calls that were hedged, and how many of those were answered first by the second replica."""
+        with self.__lock:
+            return {"hedged": self.__hedged, "won": self.__hedgesWon}
+
+    def refresh(self):
+        """Looks up the replicas in the name server now, instead of waiting for the refresh interval to pass."""
+        with self.__refreshLock:
+            self.__refresh()
+
+    def __refresh(self):
+        # called with the refresh lock held
+        uri = self.__template._pyroUri
+        if uri.protocol == "PYRO":
+            candidates = [uri]
+        else:
+            candidates = _lookupCandidates(uri, self.__template._pyroHmacKey)
+        candidates = set(str(candidate) for candidate in candidates)
+        with self.__lock:
+            if self.__closed:
+                raise errors.PyroError("load balanced proxy is closed")
+            for key in list(self.__replicas):
+                if key not in candidates:
+                    log.debug("replica %s is gone", key)
+                    self.__replicas.pop(key).pool.close()
+            for key in candidates:
+                replica = self.__replicas.get(key)
+                if replica is None:
+                    log.debug("new replica %s", key)
+                    template = self.__template.__copy__()
+                    template._pyroUri = URI(key)
+                    self.__replicas[key] = _Replica(key, ProxyPool(template, max_size=self.max_connections))
+                else:
+                    replica.failed = False  # still registered, give it another chance
+            self.__refreshed = time.time()
+
+    def close(self):
+        """Closes the connections to all replicas."""
+        with self.__lock:
+            self.__closed = True
+            for replica in self.__replicas.values():
+                replica.pool.close()
+            self.__replicas = {}
+
+    def __invoke(self, methodname, vargs, kwargs):
+        if self.hedge is not None and methodname in self.__idempotent:
+            delay = self.__hedgeDelay(methodname)
+            if delay is not None:
+                return self.__invokeHedged(methodname, vargs, kwargs, delay)
+        return self.__invokeFailover(methodname, vargs, kwargs, set())
+
+    def __invokeFailover(self, methodname, vargs, kwargs, tried):
+        while True:
+            replica = self.__select(tried)
+            try:
+                return self.__call(replica, methodname, vargs, kwargs)
+            except errors.CommunicationError as x:
+                log.debug("call to replica %s failed, failing over: %s", replica.uri, x)
+                tried.add(replica.uri)
+
+    def __invokeHedged(self, methodname, vargs, kwargs, delay):
+        # the call itself is done in this thread, only the backup call (if it's needed) runs on the executor
+        replica = self.__select(set())
+        hedge = _HedgedCall(replica.uri, current_context.to_global())
+        timer = futures._scheduler.schedule(delay, self.__hedge, hedge, methodname, vargs, kwargs)
+        try:
+            return self.__call(replica, methodname, vargs, kwargs, hedge)
+        except errors.CommunicationError as x:
+            log.debug("call to replica %s failed: %s", replica.uri, x)
+        finally:
+            futures._scheduler.cancel(timer)
+            hedge.finished()
+        if hedge.backup is not None:
+            try:
+                value = hedge.backup.value
+            except errors.CommunicationError:
+                pass    # not an answer either
+            else:
+                with self.__lock:
+                    self.__hedgesWon += 1
+                return value
+        return self.__invokeFailover(methodname, vargs, kwargs, set(hedge.tried))
+
+    def __hedge(self, hedge, methodname, vargs, kwargs):
+        # called from the timer thread when the call takes too long, so it must not block on the executor
+        if not futures.get_executor().try_submit(self.__callBackup, hedge, methodname, vargs, kwargs):
+            log.debug("no room in the executor for a backup call of %s", methodname)
+
+    def __callBackup(self, hedge, methodname, vargs, kwargs):
+        result = hedge.start_backup()
+        if result is None:
+            return      # the call has finished already
+        previous_context = current_context.to_global()
+        current_context.from_global(hedge.context)
+        try:
+            with hedge.lock:
+                tried = set(hedge.tried)
+            backup = self.__select(tried)
+            log.debug("hedging call %s to replica %s", methodname, backup.uri)
+            with hedge.lock:
+                hedge.tried.add(backup.uri)
+            with self.__lock:
+                self.__hedged += 1
+            result.value = self.__call(backup, methodname, vargs, kwargs)
+            hedge.interrupt()   # the backup call won, the waiting call doesn't have to wait any longer
+        except Exception as x:
+            result.value = futures._ExceptionWrapper(x)
+        finally:
+            current_context.from_global(previous_context)
+
+    def __call(self, replica, methodname, vargs, kwargs, hedge=None):
+        # does the call on the given replica, that was selected for it, and keeps the statistics of the replica
+        start = time.time()
+        try:
+            with replica.pool.checkout() as proxy:
+                if hedge is not None:
+                    hedge.started(proxy)
+                try:
+                    result = proxy._pyroInvoke(methodname, vargs, kwargs)
+                finally:
+                    if hedge is not None and hedge.finished():
+                        proxy._pyroRelease()    # the backup call closed the connection, don't put it back in the pool
+                self.__idempotent = proxy._pyroIdempotent
+        except errors.CommunicationError:
+            with self.__lock:
+                replica.outstanding -= 1
+                if hedge is None or not hedge.interrupted:
+                    replica.failures += 1
+                    replica.failed = True
+            raise
+        except BaseException:
+            with self.__lock:
+                replica.outstanding -= 1
+            raise
+        duration = time.time() - start
+        with self.__lock:
+            replica.outstanding -= 1
+            replica.calls += 1
+            replica.latency = duration if replica.calls == 1 else 0.8 * replica.latency + 0.2 * duration
+            if self.hedge is not None and methodname in self.__idempotent:
+                durations = self.__durations.get(methodname)
+                if durations is None:
+                    durations = self.__durations[methodname] = collections.deque(maxlen=self.hedge_window)
+                durations.append(duration)
+        return result
+
+    def __hedgeDelay(self, methodname):
+        # the hedge percentile of the recent durations of the method, or None if there are too few of them yet
+        with self.__lock:
+            durations = self.__durations.get(methodname)
+            if durations is None or len(durations) < self.hedge_samples:
+                return None
+            durations = sorted(durations)
+        return durations[min(len(durations) - 1, int(len(durations) * self.hedge / 100.0))]
+
+    def __select(self, tried):
+        # picks the replica for the next call, and counts the call as outstanding on it
+        if self.__closed:
+            raise errors.PyroError("load balanced proxy is closed")
+        if not self.__replicas:
+            self.refresh()
+        elif time.time() - self.__refreshed > self.refresh_interval and self.__refreshLock.acquire(False):
+            # refresh in this thread, the other threads carry on with the current replicas meanwhile
+            try:
+                self.__refresh()
+            except errors.CommunicationError as x:
+                log.warning("can't refresh the replicas, keeping the current ones: %s", x)
+                self.__refreshed = time.time()
+            finally:
+                self.__refreshLock.release()
+        with self.__lock:
+            candidates = [replica for replica in self.__replicas.values() if replica.uri not in tried]
+            if not candidates:
+                raise errors.CommunicationError("no replica available for " + str(self.__template._pyroUri))
+            # replicas that failed earlier are only used when there's nothing else left
+            candidates = [replica for replica in candidates if not replica.failed] or candidates
+            if self.strategy == "latency":
+                replica = min(candidates, key=lambda replica: replica.latency * (replica.outstanding + 1))
+            else:
+                replica = min(candidates, key=lambda replica: (replica.outstanding, replica.latency))
+            replica.outstanding += 1
+            return replica
+
+
+def batch(proxy, parallel=False):
     """convenience method to get a batch proxy adapter"""
-    return proxy._pyroBatch()
+    if parallel:
+        return proxy._pyroBatch(parallel=True)
+    return proxy._pyroBatch()   # don't break proxy classes with a _pyroBatch override that has no parallel parameter
 
 
 def asyncproxy(proxy, asynchronous=True):
@@ -974,6 +2316,32 @@ def oneway(method):
     return method
 
 
+def cacheable(ttl=60.0, maxsize=128):
+    """
+    decorator to mark a method as cacheable: proxies may remember its results and return them for
+    calls with the same arguments, without calling the remote object again. The results are cached
+    for at most ttl seconds (None=forever), for at most maxsize different arguments per proxy.
+    Only use this on methods that don't have side effects, and whose result only depends on the arguments.
+    It can be used without arguments too: ``@cacheable``
+    """
+    if callable(ttl):
+        return cacheable()(ttl)
+
+    def _cacheable(method):
+        method._pyroCacheable = (ttl, maxsize)
+        return method
+    return _cacheable
+
+
+def idempotent(method):
+    """
+    decorator to mark a method as idempotent: calling it more than once has the same effect as calling it once.
+    A :py:class:`LoadBalancedProxy` may send a call of such a method to a second replica, if the first one is slow to answer.
+    """
+    method._pyroIdempotent = True
+    return method
+
+
 def expose(method_or_class):
     """
     Decorator to mark a method or class to be exposed for remote calls (relevant when REQUIRE_EXPOSE=True)
@@ -1042,6 +2410,7 @@ def behavior(instance_mode="session", instance_creator=None):
 @expose
 class DaemonObject(object):
     """The part of the daemon that is exposed as a Pyro object."""
+    push_poll_interval = 0.2    # seconds between the checks if a pushed stream was closed while waiting for credits
 
     def __init__(self, daemon):
         self.daemon = daemon
@@ -1096,10 +2465,96 @@ class DaemonObject(object):
             del self.daemon.streaming_responses[streamId]
             raise
 
+    def get_next_stream_items(self, streamId, count):
+        """
+        Returns the next items of the item stream in one go, at most count of them, as a tuple (items, ended).
+        Ended is True if the stream is exhausted after these items. If the stream raises an error after producing
+        some items, those items are returned and the error is raised on the next call.
+        """
+        if streamId not in self.daemon.streaming_responses:
+            raise errors.PyroError("item stream terminated")
+        client, timestamp, linger_timestamp, stream = self.daemon.streaming_responses[streamId]
+        if client is None:
+            # reset client connection association (can be None if proxy disconnected)
+            client = current_context.client
+            self.daemon.streaming_responses[streamId] = (client, timestamp, 0, stream)
+        items = []
+        try:
+            for _ in range(max(1, count)):
+                items.append(next(stream))
+        except StopIteration:
+            del self.daemon.streaming_responses[streamId]
+            return items, True
+        except Exception as x:
+            del self.daemon.streaming_responses[streamId]
+            if not items:
+                raise
+            self.daemon.streaming_responses[streamId] = (client, timestamp, 0, _failed_stream(x))
+        return items, False
+
     def close_stream(self, streamId):
         if streamId in self.daemon.streaming_responses:
             del self.daemon.streaming_responses[streamId]
 
+    def push_stream(self, streamId, window):
+        """
+        Sends the items of the item stream to the client as they are produced, over the connection of this call,
+        instead of waiting for the client to ask for them. Every item is sent as a result message with the
+        ITEMSTREAMRESULT flag. At most window items are sent ahead: the client grants credits for more items
+        by sending ping messages that contain the number of items it consumed. The normal result of this call
+        (None) marks the end of the stream. Closing the stream with close_stream stops the pushing, also while
+        waiting for credits; a generator that is busy producing its next item is stopped when that item is there.
+        This occupies a worker thread for the duration of the stream, so it requires the thread server type.
+        """
+        if streamId not in self.daemon.streaming_responses:
+            raise errors.PyroError("item stream terminated")
+        from Pyro4.socketserver.multiplexserver import SocketServer_Multiplex
+        if isinstance(self.daemon.transportServer, SocketServer_Multiplex):
+            raise errors.PyroError("pushing item streams requires the thread server type")
+        conn = current_context.client
+        seq = current_context.seq
+        serializer = util.get_serializer_by_id(current_context.serializer_id)
+        hmac_key, hmac_digest = _get_hmac(conn, self.daemon._pyroHmacKey)
+        client, timestamp, linger_timestamp, stream = self.daemon.streaming_responses[streamId]
+        # the stream now belongs to the push connection, it is closed when that connection goes away
+        self.daemon.streaming_responses[streamId] = (conn, timestamp, 0, stream)
+        socketutil.setNoDelay(conn.sock)     # don't let nagle delay the items of a live feed
+        credits = max(1, window)
+        try:
+            while streamId in self.daemon.streaming_responses:
+                if credits <= 0:
+                    # wait for new credits, but check every now and then if the stream was closed in the meantime
+                    sock = conn.sock
+                    if getattr(sock, "pending", lambda: 0)() or select.select([sock], [], [], self.push_poll_interval)[0]:
+                        msg = message.Message.recv(conn, [message.MSG_PING], hmac_key=hmac_key)
+                        credits += int(msg.data)
+                    continue
+                try:
+                    item = next(stream)
+                except StopIteration:
+                    return None
+                if streamId not in self.daemon.streaming_responses:
+                    break   # closed while the item was being produced
+                compressor = _get_compressor(conn)
+                data, compressed = serializer.serializeData(item, compress=compressor)
+                flags = message.FLAGS_ITEMSTREAMRESULT
+                if compressed:
+                    flags |= message.FLAGS_COMPRESSED
+                msg = message.Message(message.MSG_RESULT, data, serializer.serializer_id, flags, seq,
+                                      hmac_key=hmac_key, compressor=compressor, hmac_digest=hmac_digest)
+                if config.LOGWIRE:
+                    _log_wiredata(log, "daemon wiredata sending (pushed stream item)", msg)
+                msg.send(conn)
+                credits -= 1
+        finally:
+            self.daemon.streaming_responses.pop(streamId, None)
+
+
+def _failed_stream(exception):
+    # an item stream that raises the error of the original stream on the next item
+    raise exception
+    yield
+
 
 class Daemon(object):
     """
@@ -1159,7 +2614,12 @@ class Daemon(object):
         log.debug("accepted serializers: %s" % config.SERIALIZERS_ACCEPTED)
         log.debug("pyro protocol version: %d  pickle version: %d" % (constants.PROTOCOL_VERSION, config.PICKLE_PROTOCOL_VERSION))
         self.__pyroHmacKey = None
+        self._pyroInstanceId = uuid.uuid4().bytes   # identifies this daemon in the metadata tags
+        self.__metadataGenerations = {}     # object id -> generation number of its metadata, for the metadata tags
+        self.__metadataGenerationCounter = itertools.count(1)
         self._pyroInstances = {}   # pyro objects for instance_mode=single (singletons, just one per daemon)
+        self.__batchExecutor = None     # runs the calls of parallel batches, created when needed
+        self.__batchExecutorLock = threading.Lock()
         self.streaming_responses = {}   # stream_id -> (client, creation_timestamp, linger_timestamp, stream)
         self.housekeeper_lock = threading.Lock()
         self.create_single_instance_lock = threading.Lock()
@@ -1270,6 +2730,7 @@ class Daemon(object):
         """
         serializer_id = util.MarshalSerializer.serializer_id
         msg_seq = 0
+        client_compressors = client_digests = metadata_tag = None
         try:
             msg = message.Message.recv(conn, [message.MSG_CONNECT], hmac_key=self._pyroHmacKey)
             msg_seq = msg.seq
@@ -1285,15 +2746,31 @@ class Daemon(object):
                 current_context.correlation_id = uuid.uuid4()
             serializer_id = msg.serializer_id
             serializer = util.get_serializer_by_id(serializer_id)
-            data = serializer.deserializeData(msg.data, msg.flags & message.FLAGS_COMPRESSED)
+            data = serializer.deserializeData(msg.data, msg.compressor)
+            client_compressors = msg.annotations.get("CMPA")
+            conn.compressor = util.negotiate_compressor(client_compressors, msg.annotations.get("CMPD"))
+            conn.fragments = "FRGA" in msg.annotations
+            client_digests = msg.annotations.get("HMCA")
+            if client_digests:
+                conn.hmac_digest = message.negotiate_hmac_digest(client_digests)
+                # the hmac is only skipped if both sides want it, and the connection uses SSL
+                conn.hmac_skip = "NOHM" in msg.annotations and config.SSL_SKIP_HMAC and \
+                    hasattr(getattr(conn, "sock", None), "getpeercert")
             handshake_response = self.validateHandshake(conn, data["handshake"])
             if msg.flags & message.FLAGS_META_ON_CONNECT:
                 # Usually this flag will be enabled, which results in including the object metadata
                 # in the handshake response. This avoids a separate remote call to get_metadata.
                 flags = message.FLAGS_META_ON_CONNECT
+                if "MTAG" in msg.annotations:
+                    # the proxy caches metadata: it is omitted if the proxy has the current metadata already
+                    metadata_tag = self.__metadataTag(data["object"])
+                if metadata_tag and msg.annotations["MTAG"] == metadata_tag:
+                    metadata = None
+                else:
+                    metadata = self.objectsById[constants.DAEMON_NAME].get_metadata(data["object"], as_lists=True)
                 handshake_response = {
                     "handshake": handshake_response,
-                    "meta": self.objectsById[constants.DAEMON_NAME].get_metadata(data["object"], as_lists=True)
+                    "meta": metadata
                 }
             else:
                 flags = 0
@@ -1312,10 +2789,22 @@ class Daemon(object):
             flags = message.FLAGS_COMPRESSED if compressed else 0
         # We need a minimal amount of response data or the socket will remain blocked
         # on some systems... (messages smaller than 40 bytes)
-        msg = message.Message(msgtype, data, serializer_id, flags, msg_seq, annotations=self.__annotations(), hmac_key=self._pyroHmacKey)
+        annotations = dict(self.__annotations())
+        if msgtype == message.MSG_CONNECTOK and client_compressors:
+            annotations["CMPA"] = util.get_compressor_ids()
+            annotations["CMPD"] = util.get_zdict_id()
+        if msgtype == message.MSG_CONNECTOK and getattr(conn, "fragments", False):
+            annotations["FRGA"] = b""
+        if msgtype == message.MSG_CONNECTOK and metadata_tag:
+            annotations["MTAG"] = metadata_tag
+        if msgtype == message.MSG_CONNECTOK and client_digests:
+            annotations["HMCA"] = message.get_hmac_digest_ids()
+            if conn.hmac_skip:
+                annotations["NOHM"] = b""
+        msg = message.Message(msgtype, data, serializer_id, flags, msg_seq, annotations=annotations, hmac_key=self._pyroHmacKey)
         if config.LOGWIRE:
             _log_wiredata(log, "daemon handshake response", msg)
-        conn.send(msg.to_bytes())
+        msg.send(conn)
         return msg.type == message.MSG_CONNECTOK
 
     def validateHandshake(self, conn, data):
@@ -1344,8 +2833,9 @@ class Daemon(object):
         request_serializer_id = util.MarshalSerializer.serializer_id
         wasBatched = False
         isCallback = False
+        hmac_key, hmac_digest = _get_hmac(conn, self._pyroHmacKey)
         try:
-            msg = message.Message.recv(conn, [message.MSG_INVOKE, message.MSG_PING], hmac_key=self._pyroHmacKey)
+            msg = message.Message.recv(conn, [message.MSG_INVOKE, message.MSG_PING], hmac_key=hmac_key)
         except errors.CommunicationError as x:
             # we couldn't even get data from the client, this is an immediate error
             # log.info("error receiving data from client %s: %s", conn.sock.getpeername(), x)
@@ -1360,10 +2850,10 @@ class Daemon(object):
             if msg.type == message.MSG_PING:
                 # return same seq, but ignore any data (it's a ping, not an echo). Nothing is deserialized.
                 msg = message.Message(message.MSG_PING, b"pong", msg.serializer_id, 0, msg.seq,
-                                      annotations=self.__annotations(), hmac_key=self._pyroHmacKey)
+                                      annotations=self.__annotations(), hmac_key=hmac_key, hmac_digest=hmac_digest)
                 if config.LOGWIRE:
                     _log_wiredata(log, "daemon wiredata sending", msg)
-                conn.send(msg.to_bytes())
+                msg.send(conn)
                 return
             if msg.serializer_id not in self.__serializer_ids:
                 raise errors.SerializeError("message used serializer that is not accepted: %d" % msg.serializer_id)
@@ -1373,7 +2863,7 @@ class Daemon(object):
                 objId, method, vargs, kwargs = self.__deserializeBlobArgs(msg)
             else:
                 # normal deserialization of remote call arguments
-                objId, method, vargs, kwargs = serializer.deserializeCall(msg.data, compressed=msg.flags & message.FLAGS_COMPRESSED)
+                objId, method, vargs, kwargs = serializer.deserializeCall(msg.data, compressed=msg.compressor)
             current_context.client = conn
             try:
                 current_context.client_sock_addr = conn.sock.getpeername()   # store, because on oneway calls, socket will be disconnected
@@ -1389,22 +2879,18 @@ class Daemon(object):
                 if inspect.isclass(obj):
                     obj = self._getInstance(obj, conn)
                 if request_flags & message.FLAGS_BATCH:
-                    # batched method calls, loop over them all and collect all results
-                    data = []
-                    for method, vargs, kwargs in vargs:
-                        method = util.getAttribute(obj, method)
-                        try:
-                            result = method(*vargs, **kwargs)  # this is the actual method call to the Pyro object
-                        except Exception:
-                            xt, xv = sys.exc_info()[0:2]
-                            log.debug("Exception occurred while handling batched request: %s", xv)
-                            xv._pyroTraceback = util.formatTraceback(detailed=config.DETAILED_TRACEBACK)
-                            if sys.platform == "cli":
-                                util.fixIronPythonExceptionForPickle(xv, True)  # piggyback attributes
-                            data.append(futures._ExceptionWrapper(xv))
-                            break  # stop processing the rest of the batch
-                        else:
+                    if request_flags & message.FLAGS_BATCH_PARALLEL:
+                        # batched method calls that are independent of each other, run them concurrently
+                        data = self.__parallelBatch([(util.getAttribute(obj, method), vargs, kwargs) for method, vargs, kwargs in vargs])
+                    else:
+                        # batched method calls, loop over them all and collect all results
+                        data = []
+                        for method, vargs, kwargs in vargs:
+                            method = util.getAttribute(obj, method)
+                            result = self.__batchedCall(method, vargs, kwargs)
                             data.append(result)    # note that we don't support streaming results in batch mode
+                            if isinstance(result, futures._ExceptionWrapper):
+                                break  # stop processing the rest of the batch
                     wasBatched = True
                 else:
                     # normal single method call
@@ -1438,18 +2924,20 @@ class Daemon(object):
             if request_flags & message.FLAGS_ONEWAY:
                 return  # oneway call, don't send a response
             else:
-                data, compressed = serializer.serializeData(data, compress=config.COMPRESSION)
+                compressor = _get_compressor(conn)
+                data, compressed = serializer.serializeData(data, compress=compressor)
                 response_flags = 0
                 if compressed:
                     response_flags |= message.FLAGS_COMPRESSED
                 if wasBatched:
                     response_flags |= message.FLAGS_BATCH
                 msg = message.Message(message.MSG_RESULT, data, serializer.serializer_id, response_flags, request_seq,
-                                      annotations=self.__annotations(), hmac_key=self._pyroHmacKey)
+                                      annotations=self.__annotations(), hmac_key=hmac_key, compressor=compressor,
+                                      hmac_digest=hmac_digest)
                 current_context.response_annotations = {}
                 if config.LOGWIRE:
                     _log_wiredata(log, "daemon wiredata sending", msg)
-                conn.send(msg.to_bytes())
+                msg.send(conn)
         except Exception:
             xt, xv = sys.exc_info()[0:2]
             msg = getattr(xv, "pyroMsg", None)
@@ -1581,11 +3069,12 @@ class Daemon(object):
             flags |= message.FLAGS_COMPRESSED
         annotations = dict(annotations or {})
         annotations.update(self.annotations())
+        hmac_key, hmac_digest = _get_hmac(connection, self._pyroHmacKey)
         msg = message.Message(message.MSG_RESULT, data, serializer.serializer_id, flags, seq,
-                              annotations=annotations, hmac_key=self._pyroHmacKey)
+                              annotations=annotations, hmac_key=hmac_key, hmac_digest=hmac_digest)
         if config.LOGWIRE:
             _log_wiredata(log, "daemon wiredata sending (error response)", msg)
-        connection.send(msg.to_bytes())
+        msg.send(connection)
 
     def register(self, obj_or_class, objectId=None, force=False):
         """
@@ -1625,6 +3114,7 @@ class Daemon(object):
                     ser.register_type_replacement(type(obj_or_class), pyroObjectToAutoProxy)
         # register the object/class in the mapping
         self.objectsById[obj_or_class._pyroId] = obj_or_class
+        self.__metadataGenerations[objectId] = next(self.__metadataGenerationCounter)
         return self.uriFor(objectId)
 
     def unregister(self, objectOrId):
@@ -1645,6 +3135,7 @@ class Daemon(object):
             return
         if objectId in self.objectsById:
             del self.objectsById[objectId]
+            self.__metadataGenerations.pop(objectId, None)
             if objectOrId is not None:
                 del objectOrId._pyroId
                 del objectOrId._pyroDaemon
@@ -1681,6 +3172,13 @@ class Daemon(object):
             # Clear cache regardless of how it is accessed
             util.reset_exposed_members(registered_object, config.REQUIRE_EXPOSE, as_lists=True)
             util.reset_exposed_members(registered_object, config.REQUIRE_EXPOSE, as_lists=False)
+            # new proxies must get the new metadata, instead of what's in their process-wide metadata cache
+            self.__metadataGenerations[uri.object] = next(self.__metadataGenerationCounter)
+
+    def __metadataTag(self, objectId):
+        # identifies the current metadata of the object, for the metadata caches of the proxies
+        generation = self.__metadataGenerations.get(objectId, 0)
+        return self._pyroInstanceId + struct.pack("!Q", generation)
 
     def proxyFor(self, objectOrId, nat=True):
         """
@@ -1703,6 +3201,10 @@ class Daemon(object):
         """Close down the server and release resources"""
         self.__mustshutdown.set()
         self.streaming_responses = {}
+        with self.__batchExecutorLock:
+            if self.__batchExecutor:
+                self.__batchExecutor.shutdown(wait=False)
+                self.__batchExecutor = None
         if self.transportServer:
             log.debug("daemon closing")
             self.transportServer.close()
@@ -1763,6 +3265,47 @@ class Daemon(object):
     else:
         __lazy_dict_iterator_types = (type({}.keys()), type({}.values()), type({}.items()))
 
+    def __batchedCall(self, method, vargs, kwargs):
+        # returns the result of a call from a batch, or the exception wrapped in an _ExceptionWrapper
+        try:
+            return method(*vargs, **kwargs)  # this is the actual method call to the Pyro object
+        except Exception:
+            xt, xv = sys.exc_info()[0:2]
+            log.debug("Exception occurred while handling batched request: %s", xv)
+            xv._pyroTraceback = util.formatTraceback(detailed=config.DETAILED_TRACEBACK)
+            if sys.platform == "cli":
+                util.fixIronPythonExceptionForPickle(xv, True)  # piggyback attributes
+            return futures._ExceptionWrapper(xv)
+
+    def __parallelBatch(self, calls):
+        # runs all calls of the batch on the batch executor, and returns their results in the original order
+        with self.__batchExecutorLock:
+            if self.__batchExecutor is None:
+                self.__batchExecutor = futures.BoundedExecutor(config.BATCH_WORKERS)
+            executor = self.__batchExecutor
+        results = [None] * len(calls)
+        remaining = [len(calls)]
+        finished = threading.Condition()
+        context = current_context.to_global()
+
+        def run(index, method, vargs, kwargs):
+            previous = current_context.to_global()
+            current_context.from_global(context)
+            try:
+                results[index] = self.__batchedCall(method, vargs, kwargs)
+            finally:
+                current_context.from_global(previous)   # don't leave the context of the batch on the worker thread
+                with finished:
+                    remaining[0] -= 1
+                    finished.notify()
+
+        for index, (method, vargs, kwargs) in enumerate(calls):
+            executor.submit(run, index, method, vargs, kwargs)
+        with finished:
+            while remaining[0]:
+                finished.wait()
+        return results
+
     def _streamResponse(self, data, client):
         if sys.version_info < (3, 4):
             from collections import Iterator
@@ -1823,6 +3366,483 @@ util.SerializerBase.register_class_to_dict(Daemon, serialize_core_object_to_dict
 util.SerializerBase.register_class_to_dict(futures._ExceptionWrapper, futures._ExceptionWrapper.__serialized_dict__, serpent_too=False)
 
 
+def _handshake_message(serializer, handshake, objectId, annotations, seq, hmac_key, ssl):
+    """creates the connect message that a proxy sends in the connection handshake"""
+    data = {"handshake": handshake}
+    if config.METADATA:
+        # the object id is only used/needed when piggybacking the metadata on the connection response
+        data["object"] = objectId
+        flags = message.FLAGS_META_ON_CONNECT
+    else:
+        flags = 0
+    data, compressed = serializer.serializeData(data, config.COMPRESSION)
+    if compressed:
+        flags |= message.FLAGS_COMPRESSED
+    # the handshake itself is compressed with zlib, and tells the daemon which compressors we support
+    annotations = dict(annotations)
+    annotations["CMPA"] = util.get_compressor_ids()
+    annotations["CMPD"] = util.get_zdict_id()
+    annotations["FRGA"] = b""
+    if hmac_key:
+        # tell the daemon which hmac digests we support, and if we want to skip the hmac on SSL
+        annotations["HMCA"] = message.get_hmac_digest_ids()
+        if config.SSL_SKIP_HMAC and ssl:
+            annotations["NOHM"] = b""
+    return message.Message(message.MSG_CONNECT, data, serializer.serializer_id, flags, seq,
+                           annotations=annotations, hmac_key=hmac_key)
+
+
+def _handshake_negotiate(connection, response, hmac_key, ssl):
+    """sets the connection options that were negotiated with the daemon, from the handshake response"""
+    connection.compressor = util.negotiate_compressor(response.annotations.get("CMPA"), response.annotations.get("CMPD"))
+    connection.fragments = "FRGA" in response.annotations
+    if hmac_key:
+        connection.hmac_digest = message.negotiate_hmac_digest(response.annotations.get("HMCA"))
+        connection.hmac_skip = "NOHM" in response.annotations and config.SSL_SKIP_HMAC and ssl
+
+
+def _parse_metadata(metadata):
+    """returns the sets of oneway methods, methods and attributes from the metadata of a remote object"""
+    oneway = set(metadata["oneway"])
+    methods = set(metadata["methods"])
+    attrs = set(metadata["attrs"])
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("from meta: methods=%s, oneway methods=%s, attributes=%s", sorted(methods), sorted(oneway), sorted(attrs))
+    if not methods and not attrs:
+        raise errors.PyroError("remote object doesn't expose any methods or attributes. Did you forget setting @expose on them?")
+    return oneway, methods, attrs
+
+
+class _MetadataRecord(collections.namedtuple("_MetadataRecord", ["oneway", "methods", "attrs", "cacheable", "idempotent"])):
+    """the metadata of a remote object, in an immutable form that can be shared by all proxies for the object"""
+    __slots__ = ()
+
+    @classmethod
+    def create(cls, metadata):
+        oneway, methods, attrs = _parse_metadata(metadata)
+        cacheable = dict((name, tuple(settings)) for name, settings in metadata.get("cacheable", {}).items())
+        idempotent = frozenset(metadata.get("idempotent", ()))
+        return cls(frozenset(oneway), frozenset(methods), frozenset(attrs), cacheable, idempotent)
+
+
+class _SharedSet(MutableSet):
+    """
+    Set of names from the metadata of a remote object. The frozenset from the metadata record is shared
+    (with other proxies) until the set is changed: only then it is copied (copy on write).
+    """
+    __slots__ = ("__items", "__shared")
+
+    def __init__(self, items=frozenset()):
+        if isinstance(items, _SharedSet) and items.__shared:
+            items = items.__items
+        self.__items = items if isinstance(items, frozenset) else frozenset(items)
+        self.__shared = True
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return set(iterable)    # the result of set operations is a normal set
+
+    def __contains__(self, item):
+        return item in self.__items
+
+    def __iter__(self):
+        return iter(self.__items)
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, set(self.__items))
+
+    def add(self, item):
+        if item not in self.__items:
+            self.__own().add(item)
+
+    def discard(self, item):
+        if item in self.__items:
+            self.__own().discard(item)
+
+    def __own(self):
+        if self.__shared:
+            self.__items = set(self.__items)
+            self.__shared = False
+        return self.__items
+
+
+class _MetadataCache(object):
+    """
+    Process-wide cache of the metadata of remote objects, keyed by location, object id and daemon instance id.
+    Every metadata record has a tag from the daemon: the daemon instance id and the generation of the object's
+    metadata, that changes when the daemon's metadata cache of the object is reset.
+    The proxy sends the tag of the metadata it has in the connection handshake, and the daemon then only sends
+    the metadata if it doesn't match the current one.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.locations = {}     # location -> (daemon instance id, {object id: (tag, metadata record)})
+
+    def tag(self, location, objectId):
+        """returns the tag of the cached metadata of the object, or an empty tag if there isn't any"""
+        with self.lock:
+            daemon_objects = self.locations.get(location)
+            if daemon_objects:
+                tag_record = daemon_objects[1].get(objectId)
+                if tag_record:
+                    return tag_record[0]
+        return b""
+
+    def from_handshake(self, uri, tag, metadata):
+        """returns the metadata record from the handshake response: from the cache if the daemon omitted it,
+        or a new one that is put in the cache if the daemon included it"""
+        if metadata is None:
+            if not tag:
+                return None
+            with self.lock:
+                daemon_objects = self.locations.get(uri.location)
+                if daemon_objects:
+                    tag_record = daemon_objects[1].get(uri.object)
+                    if tag_record and tag_record[0] == tag:
+                        return tag_record[1]
+            return None   # it's no longer in the cache; the proxy will ask for the metadata separately
+        record = _MetadataRecord.create(metadata)
+        if tag:
+            daemon_id = tag[:-8]
+            with self.lock:
+                daemon_objects = self.locations.get(uri.location)
+                if not daemon_objects or daemon_objects[0] != daemon_id:
+                    # a new daemon on this location, forget the metadata from the previous one
+                    daemon_objects = self.locations[uri.location] = (daemon_id, {})
+                daemon_objects[1][uri.object] = (tag, record)
+        return record
+
+    def clear(self):
+        with self.lock:
+            self.locations.clear()
+
+
+_metadata_cache = _MetadataCache()
+
+
+class _ResolveCache(object):
+    """
+    Process-wide cache of the PYRONAME and PYROMETA uri resolutions, shared by all proxies and threads.
+    Positive entries hold the candidate PYRO uris for NS_LOOKUP_CACHE_TTL seconds, negative entries hold
+    the naming error message for NS_LOOKUP_NEGATIVE_TTL seconds. An entry is dropped as soon as a proxy
+    fails to connect to one of its locations, so it will be resolved again via the name server.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}    # key -> (expiry time, list of candidate uris or None, error message or None)
+        self.hits = self.negative_hits = self.misses = self.invalidations = 0
+
+    def get(self, key):
+        """returns the cached candidate uris, None if not cached, or raises NamingError for a cached failure"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    if entry[1] is None:
+                        self.negative_hits += 1
+                        raise errors.NamingError(entry[2])
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[key]
+            self.misses += 1
+        return None
+
+    def put(self, key, candidates):
+        if config.NS_LOOKUP_CACHE_TTL > 0:
+            with self.lock:
+                self.entries[key] = (time.time() + config.NS_LOOKUP_CACHE_TTL, candidates, None)
+
+    def put_error(self, key, message):
+        if config.NS_LOOKUP_NEGATIVE_TTL > 0:
+            with self.lock:
+                self.entries[key] = (time.time() + config.NS_LOOKUP_NEGATIVE_TTL, None, message)
+
+    def invalidate(self, location):
+        """drop the cached resolutions that have a candidate on the given location"""
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                if entry[1] and any(candidate.location == location for candidate in entry[1]):
+                    del self.entries[key]
+                    self.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "size": len(self.entries)
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.negative_hits = self.misses = self.invalidations = 0
+
+
+_resolve_cache = _ResolveCache()
+
+
+def resolve_cache_stats():
+    """
+    Returns a dict with the statistics of the process-wide cache of PYRONAME and PYROMETA resolutions:
+    the number of hits, negative_hits, misses, invalidations, and the current size.
+    """
+    return _resolve_cache.stats()
+
+
+def clear_resolve_cache():
+    """Forgets all cached PYRONAME and PYROMETA resolutions, and resets the cache statistics."""
+    _resolve_cache.clear()
+
+
+class _Circuit(object):
+    """the state of the circuit breaker for one location"""
+    def __init__(self):
+        self.failures = 0       # consecutive failed connection attempts
+        self.open_until = None  # time until which connecting is refused, None if the circuit is closed
+        self.open_time = 0.0    # how long the circuit was opened the last time (doubles after every failed probe)
+        self.probing = False    # a probe connection is underway (half-open)
+        self.last_failure = 0.0
+
+
+class _CircuitBreakers(object):
+    """
+    Process-wide circuit breakers, one per daemon location, shared by all proxies and threads.
+    After CIRCUIT_BREAKER consecutive failed connection attempts to a location, the circuit opens: connecting to
+    that location fails right away with a CircuitOpenError, instead of waiting for the connection to time out.
+    After CIRCUIT_BREAKER_RESET seconds the circuit is half-open: a single connection attempt is let through as
+    a probe, that also has to answer a ping. If the probe succeeds the circuit closes, otherwise it opens again for
+    twice as long (at most max_open_time seconds). The open times get a random jitter so that many clients don't
+    all probe at the same moment.
+    The failures of a location whose circuit stays closed are forgotten after CIRCUIT_BREAKER_RESET seconds.
+    """
+    max_open_time = 60.0
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.circuits = {}  # location -> _Circuit
+        self.opened = self.rejected = self.probes = self.recovered = 0
+
+    def before_connect(self, location):
+        """returns True if the connection attempt is a probe, raises CircuitOpenError if connecting is refused"""
+        if location not in self.circuits:
+            return False
+        with self.lock:
+            circuit = self.circuits.get(location)
+            if circuit is None or circuit.open_until is None:
+                return False
+            wait = circuit.open_until - time.time()
+            if wait > 0 or circuit.probing:
+                self.rejected += 1
+                raise errors.CircuitOpenError("circuit breaker for %s is open, not connecting (for another %.1f seconds)"
+                                              % (location, max(0.0, wait)))
+            circuit.probing = True
+            self.probes += 1
+            return True
+
+    def succeeded(self, location):
+        if location not in self.circuits:
+            return
+        with self.lock:
+            circuit = self.circuits.pop(location, None)
+            if circuit is not None and circuit.open_until is not None:
+                self.recovered += 1
+                log.info("circuit breaker for %s closed again", location)
+
+    def probe_finished(self, location):
+        with self.lock:
+            circuit = self.circuits.get(location)
+            if circuit is not None:
+                circuit.probing = False
+
+    def failed(self, location):
+        if config.CIRCUIT_BREAKER <= 0:
+            return
+        now = time.time()
+        with self.lock:
+            circuit = self.circuits.get(location)
+            if circuit is None:
+                self.__prune(now)
+                circuit = self.circuits[location] = _Circuit()
+            elif circuit.open_until is None and circuit.last_failure < now - config.CIRCUIT_BREAKER_RESET:
+                circuit.failures = 0    # the earlier failures are too long ago
+            circuit.failures += 1
+            circuit.last_failure = now
+            if circuit.probing:
+                circuit.probing = False
+                circuit.open_time = min(self.max_open_time, circuit.open_time * 2)
+            elif circuit.open_until is None and circuit.failures >= config.CIRCUIT_BREAKER:
+                circuit.open_time = config.CIRCUIT_BREAKER_RESET
+                self.opened += 1
+                log.warning("circuit breaker for %s opened after %d failed connection attempts", location, circuit.failures)
+            else:
+                return
+            circuit.open_until = now + circuit.open_time * random.uniform(0.8, 1.2)
+
+    def __prune(self, now):
+        # forget the closed circuits of the locations that haven't failed recently (called with the lock held)
+        expired = now - config.CIRCUIT_BREAKER_RESET
+        for location, circuit in list(self.circuits.items()):
+            if circuit.open_until is None and circuit.last_failure < expired:
+                del self.circuits[location]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "probes": self.probes,
+                "recovered": self.recovered,
+                "open": sorted(location for location, circuit in self.circuits.items() if circuit.open_until is not None)
+            }
+
+    def clear(self):
+        with self.lock:
+            self.circuits.clear()
+            self.opened = self.rejected = self.probes = self.recovered = 0
+
+
+_circuit_breakers = _CircuitBreakers()
+
+
+def circuit_breaker_stats():
+    """
+    Returns a dict with the counters of the process-wide circuit breakers (see the CIRCUIT_BREAKER config item):
+    how many times a circuit opened, how many connection attempts were rejected because of an open circuit,
+    how many probes were done, and how many circuits recovered. 'open' is the list of locations with an open circuit.
+    """
+    return _circuit_breakers.stats()
+
+
+def reset_circuit_breakers():
+    """Closes all circuit breakers, and resets their counters."""
+    _circuit_breakers.clear()
+
+
+_call_stats = _CallStats()
+
+
+def call_stats():
+    """
+    Returns the statistics of the remote calls of all proxies in this process, recorded if the CALL_STATS config item
+    is enabled. The dict has a (object name, method name) key for every method that was called, with the number
+    of calls and a summary (count, min, mean, max and the 50th, 90th and 99th percentile) of the durations in seconds
+    of the phases of the calls: 'serialize' (creating the request message), 'send', 'wait' (until the response starts
+    to arrive, this is mostly network and server time), 'receive', 'deserialize' and the 'total', and of the sizes in bytes
+    of the messages: 'request_bytes' and 'response_bytes'. Oneway calls only have the first two phases.
+    """
+    return _call_stats.stats()
+
+
+def reset_call_stats():
+    """Forgets the statistics of the remote calls of all proxies in this process."""
+    _call_stats.clear()
+
+
+class _NameServerLocator(object):
+    """
+    Process-wide memory of where the name server was found, so that it doesn't have to be discovered
+    (via localhost, broadcast and direct connection) over and over again. It also remembers for
+    NS_LOCATE_NEGATIVE_TTL seconds that a broadcast lookup failed, so it can be skipped,
+    and it has the pools of connected name server proxies that are shared by all threads to resolve names.
+    It is only used if NS_LOCATE_CACHE is enabled.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.locations = {}         # locate arguments -> uri of the name server that was found
+        self.failed_broadcasts = {}     # (broadcast port, broadcast addresses) -> time until which broadcast is skipped
+        self.pools = {}             # (locate arguments, hmac key) -> ProxyPool of name server proxies
+
+    @staticmethod
+    def key(host, port, broadcast):
+        return host, port, broadcast, config.NS_HOST, config.NS_PORT, config.NS_BCPORT, config.BROADCAST_ADDRS, config.PREFER_IP_VERSION
+
+    def get(self, key):
+        with self.lock:
+            return self.locations.get(key)
+
+    def put(self, key, uri):
+        with self.lock:
+            self.locations[key] = uri
+
+    def forget(self, key):
+        with self.lock:
+            self.locations.pop(key, None)
+
+    def broadcast_failed(self, port):
+        if not config.NS_LOCATE_CACHE:
+            return False
+        with self.lock:
+            return self.failed_broadcasts.get((port, config.BROADCAST_ADDRS), 0) > time.time()
+
+    def set_broadcast_failed(self, port):
+        if config.NS_LOCATE_CACHE and config.NS_LOCATE_NEGATIVE_TTL > 0:
+            with self.lock:
+                self.failed_broadcasts[(port, config.BROADCAST_ADDRS)] = time.time() + config.NS_LOCATE_NEGATIVE_TTL
+
+    def shared(self, host, port, hmac_key):
+        """returns the pool of connected proxies for the name server, locating it if needed"""
+        key = self.key(host, port, True)
+        with self.lock:
+            pool = self.pools.get((key, hmac_key))
+        if pool is None:
+            with _locateNS(host, port, hmac_key=hmac_key) as nameserver:
+                pool = ProxyPool(nameserver, max_size=4)
+            with self.lock:
+                existing = self.pools.setdefault((key, hmac_key), pool)
+            if existing is not pool:
+                pool.close()    # another thread was quicker
+                pool = existing
+        return pool
+
+    def discard(self, pool):
+        """forget the name server pool (and the location of its name server) because it is no longer usable"""
+        with self.lock:
+            for key, value in list(self.pools.items()):
+                if value is pool:
+                    del self.pools[key]
+                    self.locations.pop(key[0], None)
+        pool.close()
+
+    def clear(self):
+        with self.lock:
+            pools = list(self.pools.values())
+            self.pools.clear()
+            self.locations.clear()
+            self.failed_broadcasts.clear()
+        for pool in pools:
+            pool.close()
+
+
+_ns_locator = _NameServerLocator()
+
+
+def _get_compressor(connection):
+    """
+    Returns the compressor to use for the message data on the given connection,
+    or None if compression is disabled. This is the compressor that was negotiated
+    in the connection handshake, or zlib if there wasn't a handshake.
+    """
+    if config.COMPRESSION:
+        return getattr(connection, "compressor", None) or util.get_compressor("zlib")
+    return None
+
+
+def _get_hmac(connection, hmac_key):
+    """
+    Returns the hmac key and the hmac digest algorithm to use for the messages on the given connection,
+    as negotiated in the connection handshake. The key is None if the hmac is skipped because the connection uses SSL.
+    """
+    if getattr(connection, "hmac_skip", False):
+        return None, None
+    return hmac_key, getattr(connection, "hmac_digest", None)
+
+
 def _log_wiredata(logger, text, msg):
     """logs all the given properties of the wire message in the given logger"""
     corr = str(uuid.UUID(bytes=msg.annotations["CORR"])) if "CORR" in msg.annotations else "?"
@@ -1830,7 +3850,33 @@ def _log_wiredata(logger, text, msg):
                  (text, msg.type, msg.flags, msg.serializer_id, msg.seq, corr, msg.annotations, msg.data))
 
 
+def _context_property(name, default):
+    # An attribute that is stored in a context variable, so it is local to the asyncio task.
+    # The value is tagged with the thread that set it: a thread that inherits or copies the context
+    # (as in Python versions where new threads inherit it) still starts with the default value,
+    # so in the daemon's worker threads the attribute keeps behaving exactly like a thread local.
+    variable = contextvars.ContextVar("Pyro4.current_context." + name)
+
+    def getter(self):
+        thread_id = threading.get_ident()
+        owner, value = variable.get((None, None))
+        if owner != thread_id:
+            value = default()
+            variable.set((thread_id, value))
+        return value
+
+    def setter(self, value):
+        variable.set((threading.get_ident(), value))
+    return property(getter, setter)
+
+
 class _CallContext(threading.local):
+    if contextvars:
+        # the attributes that proxies use, so that concurrent asyncio tasks don't interfere with each other
+        annotations = _context_property("annotations", dict)
+        response_annotations = _context_property("response_annotations", dict)
+        correlation_id = _context_property("correlation_id", lambda: None)
+
     def __init__(self):
         # per-thread initialization
         self.client = None
@@ -1844,7 +3890,10 @@ class _CallContext(threading.local):
 
     def to_global(self):
         if sys.platform != "cli":
-            return dict(self.__dict__)
+            values = dict(self.__dict__)
+            values.update(annotations=self.annotations, response_annotations=self.response_annotations,
+                          correlation_id=self.correlation_id)
+            return values
         # ironpython somehow has problems getting at the values, so do it manually:
         return {
             "client": self.client,
@@ -1909,25 +3958,82 @@ def _resolve(uri, hmac_key=None):
         raise TypeError("can only resolve Pyro URIs")
     if uri.protocol == "PYRO":
         return uri
-    log.debug("resolving %s", uri)
-    if uri.protocol == "PYRONAME":
-        with _locateNS(uri.host, uri.port, hmac_key=hmac_key) as nameserver:
-            return nameserver.lookup(uri.object)
-    elif uri.protocol == "PYROMETA":
-        with _locateNS(uri.host, uri.port, hmac_key=hmac_key) as nameserver:
-            candidates = nameserver.list(metadata_all=uri.object)
-            if candidates:
-                candidate = random.choice(list(candidates.values()))
-                log.debug("resolved to candidate %s", candidate)
-                return URI(candidate)
-            raise errors.NamingError("no registrations available with desired metadata properties %s" % uri.object)
-    else:
+    candidates = _lookupCandidates(uri, hmac_key)
+    if len(candidates) == 1:
+        return URI(candidates[0])
+    candidate = random.choice(candidates)
+    log.debug("resolved to candidate %s", candidate)
+    return URI(candidate)
+
+
+def _lookupCandidates(uri, hmac_key=None):
+    """
+    Looks up a PYRONAME or PYROMETA uri in the name server, and returns the list of PYRO uris it resolves to.
+    For a PYRONAME uri that is a single uri, for a PYROMETA uri it's all registrations with the desired metadata.
+    """
+    if uri.protocol not in ("PYRONAME", "PYROMETA"):
         raise errors.PyroError("invalid uri protocol")
+    caching = config.NS_LOOKUP_CACHE_TTL > 0 or config.NS_LOOKUP_NEGATIVE_TTL > 0
+    key = (str(uri), hmac_key)
+    candidates = _resolve_cache.get(key) if caching else None
+    if candidates is None:
+        log.debug("resolving %s", uri)
+
+        def lookup(nameserver):
+            try:
+                if uri.protocol == "PYRONAME":
+                    return [nameserver.lookup(uri.object)]
+                candidates = [URI(candidate) for candidate in nameserver.list(metadata_all=uri.object).values()]
+                if not candidates:
+                    raise errors.NamingError("no registrations available with desired metadata properties %s" % uri.object)
+                return candidates
+            except errors.NamingError as x:
+                if caching:
+                    _resolve_cache.put_error(key, str(x))
+                raise
+
+        if config.NS_LOCATE_CACHE:
+            nameserver = _ns_locator.shared(uri.host, uri.port, hmac_key)
+            try:
+                candidates = lookup(nameserver)
+            except errors.CommunicationError:
+                # the name server went away, locate it again
+                _ns_locator.discard(nameserver)
+                candidates = lookup(_ns_locator.shared(uri.host, uri.port, hmac_key))
+        else:
+            with _locateNS(uri.host, uri.port, hmac_key=hmac_key) as nameserver:
+                candidates = lookup(nameserver)
+        if caching:
+            _resolve_cache.put(key, candidates)
+    else:
+        log.debug("resolved %s from cache", uri)
+    return candidates
 
 
 # name server utility function, here to avoid cyclic dependencies
 def _locateNS(host=None, port=None, broadcast=True, hmac_key=None):
     """Get a proxy for a name server somewhere in the network."""
+    if not config.NS_LOCATE_CACHE:
+        return _discoverNS(host, port, broadcast, hmac_key)
+    key = _ns_locator.key(host, port, broadcast)
+    uri = _ns_locator.get(key)
+    if uri is not None:
+        log.debug("locating the NS at the previously found location: %s", uri)
+        proxy = Proxy(uri)
+        proxy._pyroHmacKey = hmac_key
+        try:
+            proxy._pyroBind()
+            log.debug("located NS")
+            return proxy
+        except errors.PyroError:
+            log.debug("NS is no longer at the previously found location")
+            _ns_locator.forget(key)
+    proxy = _discoverNS(host, port, broadcast, hmac_key)
+    _ns_locator.put(key, proxy._pyroUri)
+    return proxy
+
+
+def _discoverNS(host, port, broadcast, hmac_key):
     if host is None:
         # first try localhost if we have a good chance of finding it there
         if config.NS_HOST in ("localhost", "::1") or config.NS_HOST.startswith("127."):
@@ -1954,10 +4060,13 @@ def _locateNS(host=None, port=None, broadcast=True, hmac_key=None):
                     pass
         if config.PREFER_IP_VERSION == 6:
             broadcast = False   # ipv6 doesn't have broadcast. We should probably use multicast....
+        if not port:
+            port = config.NS_BCPORT
+        if broadcast and _ns_locator.broadcast_failed(port):
+            log.debug("broadcast locate failed recently")
+            broadcast = False
         if broadcast:
             # broadcast lookup
-            if not port:
-                port = config.NS_BCPORT
             log.debug("broadcast locate")
             sock = socketutil.createBroadcastSocket(reuseaddr=config.SOCK_REUSE, timeout=0.7)
             for _ in range(3):
@@ -1985,6 +4094,7 @@ def _locateNS(host=None, port=None, broadcast=True, hmac_key=None):
             except (OSError, socket.error):
                 pass
             sock.close()
+            _ns_locator.set_broadcast_failed(port)
             log.debug("broadcast locate failed, try direct connection on NS_HOST")
         else:
             log.debug("skipping broadcast lookup")
@@ -2038,7 +4148,7 @@ class SerializedBlob(object):
         if self._contains_blob:
             protocol_msg = self._data
             serializer = util.get_serializer_by_id(protocol_msg.serializer_id)
-            _, _, data, _ = serializer.deserializeData(protocol_msg.data, protocol_msg.flags & message.FLAGS_COMPRESSED)
+            _, _, data, _ = serializer.deserializeData(protocol_msg.data, protocol_msg.compressor)
             return data
         else:
             return self._data
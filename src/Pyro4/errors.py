@@ -28,6 +28,14 @@ class TimeoutError(CommunicationError):
     pass
 
 
+class CircuitOpenError(CommunicationError):
+    """
+    Connecting was refused without trying, because the connections to the location have failed too often recently.
+    The circuit breaker lets a new attempt through after a while.
+    """
+    pass
+
+
 class ProtocolError(CommunicationError):
     """Pyro received a message that didn't match the active Pyro network protocol, or there was a protocol related error."""
     pass
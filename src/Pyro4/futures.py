@@ -7,13 +7,21 @@ Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 """
 
 import sys
+import heapq
 import functools
+import itertools
 import logging
 import threading
 import time
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+from Pyro4.configuration import config
+from Pyro4 import errors
 
 
-__all__ = ["Future", "FutureResult", "_ExceptionWrapper"]
+__all__ = ["Future", "FutureResult", "BoundedExecutor", "get_executor", "_ExceptionWrapper"]
 
 log = logging.getLogger("Pyro4.futures")
 
@@ -25,15 +33,21 @@ class Future(object):
     This is a more general implementation than the AsyncRemoteMethod, which
     only works with Pyro proxies (and provides a bit different syntax).
     This class has a few extra features as well (delay, canceling).
+    The call is executed in a new thread of its own, or by the executor you provide, such as the
+    shared executor (see :func:`get_executor`). Any object with a ``submit(callable, *args)`` method
+    can be used, for instance a ``concurrent.futures.ThreadPoolExecutor``.
     """
 
-    def __init__(self, somecallable):
+    def __init__(self, somecallable, executor=None):
         self.callable = somecallable
+        self.executor = executor
         self.chain = []
         self.exceptionhandler = None
         self.call_delay = 0
         self.cancelled = False
         self.completed = False
+        self.__call = None          # (executor, result, chain, args, kwargs) once the future has been called
+        self.__scheduled = None     # the entry in the scheduler if the call is delayed
 
     def __call__(self, *args, **kwargs):
         """
@@ -47,16 +61,19 @@ class Future(object):
         chain = self.chain
         del self.chain  # make it impossible to add new calls to the chain once we started executing it
         result = FutureResult()  # notice that the call chain doesn't sit on the result object
-        thread = threading.Thread(target=self.__asynccall, args=(result, chain, args, kwargs))
-        thread.setDaemon(True)
-        thread.start()
+        self.__call = (self.executor or _thread_executor, result, chain, args, kwargs)
+        self.__start()
         return result
 
+    def __start(self):
+        executor = self.__call[0]
+        if self.call_delay > 0:
+            self.__scheduled = _scheduler.schedule_submit(self.call_delay, executor, self.__asynccall, *self.__call[1:])
+        else:
+            self.__scheduled = None
+            executor.submit(self.__asynccall, *self.__call[1:])
+
     def __asynccall(self, asyncresult, chain, args, kwargs):
-        while self.call_delay > 0 and not self.cancelled:
-            delay = min(self.call_delay, 2)
-            time.sleep(delay)
-            self.call_delay -= delay
         if self.cancelled:
             self.completed = True
             asyncresult.set_cancelled()
@@ -83,6 +100,8 @@ class Future(object):
         if self.completed:
             return False
         self.call_delay = seconds
+        if self.__scheduled is not None and _scheduler.cancel(self.__scheduled):
+            self.__start()      # reschedule the delayed call
         return True
 
     def cancel(self):
@@ -94,6 +113,9 @@ class Future(object):
         if self.completed:
             return False
         self.cancelled = True
+        if self.__scheduled is not None and _scheduler.cancel(self.__scheduled):
+            self.completed = True
+            self.__call[1].set_cancelled()
         return True
 
     def then(self, call, *args, **kwargs):
@@ -122,6 +144,7 @@ class FutureResult(object):
     The result object for asynchronous Pyro calls.
     Unfortunatley it should be similar to the more general Future class but
     it is still somewhat limited (no delay, no canceling).
+    The static methods gather, wait_all, wait_any and as_completed combine multiple result objects.
     """
 
     def __init__(self):
@@ -129,6 +152,7 @@ class FutureResult(object):
         self.callchain = []
         self.valueLock = threading.Lock()
         self.exceptionhandler = None
+        self.__callbacks = []
 
     def wait(self, timeout=None):
         """
@@ -168,6 +192,9 @@ class FutureResult(object):
                         break
             self.callchain = []
             self.__ready.set()
+            callbacks, self.__callbacks = self.__callbacks, []
+        for callback in callbacks:
+            self.__invoke_callback(callback)
 
     value = property(get_value, set_value, None, "The result value of the call. Reading it will block if not available yet.")
 
@@ -201,6 +228,379 @@ class FutureResult(object):
         self.exceptionhandler = exceptionhandler
         return self
 
+    def add_done_callback(self, callback):
+        """
+        Add a callable to be invoked (with this result object as only argument) when the result becomes available,
+        also when it is an exception. If it is already available, the callable is invoked immediately.
+        It is invoked after the call chain, in the thread that provides the result. Errors in it are logged.
+        """
+        with self.valueLock:
+            if not self.__ready.isSet():
+                self.__callbacks.append(callback)
+                return
+        self.__invoke_callback(callback)
+
+    def remove_done_callback(self, callback):
+        """Removes a callable that was added with add_done_callback, if it hasn't been invoked yet."""
+        with self.valueLock:
+            if callback in self.__callbacks:
+                self.__callbacks.remove(callback)
+
+    def __invoke_callback(self, callback):
+        try:
+            callback(self)
+        except Exception:
+            log.exception("error in done callback of future result")
+
+    def with_timeout(self, timeout):
+        """
+        Returns a new result object that gets the value of this one, or a :exc:`Pyro4.errors.TimeoutError`
+        if the value is not available within timeout seconds.
+        """
+        result = FutureResult()
+        error = _ExceptionWrapper(errors.TimeoutError("result not available within %s seconds" % timeout))
+        timer = _scheduler.schedule(timeout, result.set_value, error)
+
+        def done(source):
+            if _scheduler.cancel(timer):
+                result.set_value(source.__value)
+
+        self.add_done_callback(done)
+        return result
+
+    def to_concurrent_future(self):
+        """Returns a ``concurrent.futures.Future`` (Python 3.2+) that gets the value or exception of this result."""
+        import concurrent.futures
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+
+        def done(source):
+            if isinstance(source.__value, _ExceptionWrapper):
+                future.set_exception(source.__value.exception)
+            else:
+                future.set_result(source.__value)
+
+        self.add_done_callback(done)
+        return future
+
+    def to_asyncio_future(self, loop=None):
+        """
+        Returns an ``asyncio.Future`` that gets the value or exception of this result, so you can await it.
+        It belongs to the given event loop, or the current event loop if you don't provide one.
+        """
+        import asyncio
+        loop = loop or asyncio.get_event_loop()
+        future = loop.create_future()
+
+        def set_result(value):
+            if future.cancelled():
+                return
+            if isinstance(value, _ExceptionWrapper):
+                future.set_exception(value.exception)
+            else:
+                future.set_result(value)
+
+        def done(source):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(set_result, source.__value)
+
+        self.add_done_callback(done)
+        return future
+
+    @staticmethod
+    def gather(results, timeout=None):
+        """
+        Returns a new result object that gets the list of the values of all given results, in the same order.
+        If one of them is an exception, the new result gets that exception (the first one that arrives) instead.
+        If a timeout is given, it gets a :exc:`Pyro4.errors.TimeoutError` if the values are not all available in time.
+        """
+        results = list(results)
+        gathered = FutureResult()
+        remaining = [len(results)]
+        lock = threading.Lock()
+
+        def done(source):
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                if isinstance(source.__value, _ExceptionWrapper):
+                    remaining[0] = 0
+                    value = source.__value
+                else:
+                    remaining[0] -= 1
+                    if remaining[0] > 0:
+                        return
+                    value = [result.__value for result in results]
+            gathered.set_value(value)
+
+        if results:
+            for result in results:
+                result.add_done_callback(done)
+        else:
+            gathered.set_value([])
+        return gathered if timeout is None else gathered.with_timeout(timeout)
+
+    @staticmethod
+    def wait_all(results, timeout=None):
+        """
+        Waits until all given results are available, with optional timeout (in seconds).
+        Returns True if they are all available, or False if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        for result in results:
+            if not result.wait(None if deadline is None else max(0.0, deadline - time.time())):
+                return False
+        return True
+
+    @staticmethod
+    def wait_any(results, timeout=None):
+        """
+        Waits until at least one of the given results is available, with optional timeout (in seconds).
+        Returns the result object that became available first, or None if the timeout expired first.
+        """
+        results = list(results)
+        available = queue.Queue()
+        for result in results:
+            result.add_done_callback(available.put)
+        try:
+            return available.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        finally:
+            for result in results:
+                result.remove_done_callback(available.put)
+
+    @staticmethod
+    def as_completed(results, timeout=None):
+        """
+        Generator that yields the given result objects in the order they become available.
+        If a timeout (in seconds) is given, it raises a :exc:`Pyro4.errors.TimeoutError` if not all of them are available in time.
+        """
+        results = list(results)
+        deadline = None if timeout is None else time.time() + timeout
+        available = queue.Queue()
+        for result in results:
+            result.add_done_callback(available.put)
+        try:
+            for _ in range(len(results)):
+                try:
+                    yield available.get(timeout=None if deadline is None else max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    raise errors.TimeoutError("results not available within %s seconds" % timeout)
+        finally:
+            for result in results:
+                result.remove_done_callback(available.put)
+
+
+class _Scheduler(object):
+    """Invokes callables at a later time, from a single timer thread. The callables must not block."""
+    submit_retry_delay = 0.01
+
+    def __init__(self):
+        self.__queue = []   # heap of [time, sequence number, callable, args]
+        self.__sequence = itertools.count()
+        self.__condition = threading.Condition()
+        self.__thread = None
+
+    def schedule(self, delay, call, *args):
+        """Schedules the call to be invoked after delay seconds. Returns the entry that you can pass to cancel()"""
+        entry = [time.time() + delay, next(self.__sequence), call, args]
+        with self.__condition:
+            heapq.heappush(self.__queue, entry)
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name="Pyro4-scheduler")
+                self.__thread.setDaemon(True)
+                self.__thread.start()
+            self.__condition.notify()
+        return entry
+
+    def schedule_submit(self, delay, executor, call, *args):
+        """
+        Schedules the call to be submitted to the executor after delay seconds. Returns the entry for cancel().
+        The timer thread never blocks on a full executor queue: the submit is retried a little later instead.
+        """
+        return self.schedule(delay, self.__submit, executor, call, args)
+
+    def __submit(self, executor, call, args):
+        if not hasattr(executor, "try_submit"):
+            executor.submit(call, *args)
+        elif not executor.try_submit(call, *args):
+            self.schedule(self.submit_retry_delay, self.__submit, executor, call, args)
+
+    def cancel(self, entry):
+        """Cancels a scheduled call. Returns False if it was invoked (or cancelled) already."""
+        with self.__condition:
+            if entry[2] is None:
+                return False
+            entry[2] = None     # it is removed from the heap when it comes up
+            return True
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while True:
+                    while self.__queue and self.__queue[0][2] is None:
+                        heapq.heappop(self.__queue)
+                    now = time.time()
+                    if self.__queue and self.__queue[0][0] <= now:
+                        entry = heapq.heappop(self.__queue)
+                        call, args = entry[2], entry[3]
+                        entry[2] = None
+                        break
+                    self.__condition.wait(self.__queue[0][0] - now if self.__queue else None)
+            try:
+                call(*args)
+            except Exception:
+                log.exception("error in scheduled call")
+
+
+_scheduler = _Scheduler()
+
+
+class BoundedExecutor(object):
+    """
+    Executes callables in at most max_workers worker threads, that are started when they are needed.
+    Submitted calls wait in a queue of at most max_queue entries (0=no limit) until a worker is available.
+    If the queue is full, submit() blocks until there is room again.
+    A call that is submitted by a call that this executor is executing itself never waits: if no worker is idle,
+    it gets an extra thread of its own. Otherwise workers that wait for the results of the calls they submitted
+    could use up all workers (or block on the full queue), and the executor would deadlock.
+    """
+
+    def __init__(self, max_workers, max_queue=0):
+        self.max_workers = max(1, max_workers)
+        self.__queue = queue.Queue(max(0, max_queue))
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        self.__workers = 0
+        self.__idle = 0         # number of workers that are waiting for a call (or that just got one)
+        self.__unclaimed = 0    # number of calls that are waiting for a worker (or that were just picked up)
+        self.__shutdown = False
+
+    def submit(self, call, *args, **kwargs):
+        """Queues the call to be executed by one of the worker threads. Exceptions from the call are logged."""
+        self.__submit((call, args, kwargs), True)
+
+    def try_submit(self, call, *args, **kwargs):
+        """Like submit(), but doesn't block when the queue is full: it then returns False and the call is not queued."""
+        return self.__submit((call, args, kwargs), False)
+
+    def __submit(self, task, block):
+        if self.__shutdown:
+            raise RuntimeError("executor has been shut down")
+        if getattr(self.__local, "worker", False):
+            with self.__lock:
+                # every queued call is counted as unclaimed before it is put in the queue,
+                # so if there are more idle workers than unclaimed calls, one of them will pick up this call
+                if self.__idle > self.__unclaimed:
+                    try:
+                        self.__queue.put(task, False)
+                        self.__unclaimed += 1
+                        return True
+                    except queue.Full:
+                        pass
+            self.__start_thread(self.__run_extra, task)
+            return True
+        with self.__lock:
+            self.__unclaimed += 1
+        try:
+            self.__queue.put(task, block)
+        except queue.Full:
+            with self.__lock:
+                self.__unclaimed -= 1
+            return False
+        with self.__lock:
+            if self.__unclaimed > self.__idle and self.__workers < self.max_workers:
+                self.__workers += 1
+                self.__start_thread(self.__work)
+        return True
+
+    def __start_thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args, name="Pyro4-executor-%d" % self.__workers)
+        thread.setDaemon(True)
+        thread.start()
+
+    def shutdown(self, wait=True):
+        """Stops the worker threads after they've executed the calls that are still in the queue."""
+        self.__shutdown = True
+        with self.__lock:
+            workers = self.__workers
+        for _ in range(workers):
+            self.__queue.put(None)
+        if wait:
+            self.__queue.join()
+
+    @property
+    def workers(self):
+        """number of worker threads"""
+        return self.__workers
+
+    def __work(self):
+        self.__local.worker = True
+        while True:
+            with self.__lock:
+                self.__idle += 1
+            task = self.__queue.get()
+            with self.__lock:
+                self.__idle -= 1
+                if task is None:
+                    self.__workers -= 1
+                else:
+                    self.__unclaimed -= 1
+            try:
+                if task is None:
+                    return
+                self.__execute(task)
+            finally:
+                self.__queue.task_done()
+
+    def __run_extra(self, task):
+        self.__local.worker = True
+        self.__execute(task)
+
+    def __execute(self, task):
+        call, args, kwargs = task
+        try:
+            call(*args, **kwargs)
+        except Exception:
+            log.exception("error in call executed by the executor")
+
+
+class _ThreadExecutor(object):
+    """Executes every submitted callable in a new thread of its own. Futures use this unless they get an executor."""
+
+    def submit(self, call, *args, **kwargs):
+        thread = threading.Thread(target=self.__execute, args=(call, args, kwargs), name="Pyro4-future")
+        thread.setDaemon(True)
+        thread.start()
+
+    def try_submit(self, call, *args, **kwargs):
+        self.submit(call, *args, **kwargs)
+        return True
+
+    def __execute(self, call, args, kwargs):
+        try:
+            call(*args, **kwargs)
+        except Exception:
+            log.exception("error in call executed by the executor")
+
+
+_thread_executor = _ThreadExecutor()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the executor that is shared by the asynchronous calls of all proxies in this process.
+    It is created when it is first needed, with the ASYNC_WORKERS and ASYNC_QUEUE_SIZE config items.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = BoundedExecutor(config.ASYNC_WORKERS, config.ASYNC_QUEUE_SIZE)
+        return _executor
+
 
 class _ExceptionWrapper(object):
     """Class that wraps a remote exception. If this is returned, Pyro will
@@ -9,12 +9,11 @@ import hmac
 import struct
 import logging
 import sys
-import zlib
-from Pyro4 import errors, constants
+from Pyro4 import errors, constants, util
 from Pyro4.configuration import config
 
 
-__all__ = ["Message", "secure_compare"]
+__all__ = ["Message", "secure_compare", "get_hmac_digest_ids", "negotiate_hmac_digest"]
 
 log = logging.getLogger("Pyro4.message")
 
@@ -31,6 +30,15 @@ FLAGS_BATCH = 1 << 3
 FLAGS_META_ON_CONNECT = 1 << 4
 FLAGS_ITEMSTREAMRESULT = 1 << 5
 FLAGS_KEEPSERIALIZED = 1 << 6
+FLAGS_FRAGMENT = 1 << 7
+FLAGS_BATCH_PARALLEL = 1 << 8
+
+# The digest algorithms for the message hmac, by id (never change these ids).
+# The hmac chunk of a sha1 hmac only contains the digest, for compatibility with older Pyro versions.
+# For the other algorithms, the digest is preceded by a byte with the id of the algorithm.
+_hmac_digests = {1: "sha1", 2: "sha256", 3: "sha512", 4: "blake2b", 5: "blake2s"}
+_hmac_digests = dict((i, name) for i, name in _hmac_digests.items() if hasattr(hashlib, name))
+_hmac_digest_ids = dict((name, i) for i, name in _hmac_digests.items())
 
 
 class Message(object):
@@ -50,10 +58,10 @@ class Message(object):
        2   message type
        2   message flags
        2   sequence number
-       4   data length   (i.e. 2 Gb data size limitation)
+       4   data length   (i.e. 2 Gb data size limitation, per fragment)
        2   data serialization format (serializer id)
        2   annotations length (total of all chunks, 0 if no annotation chunks present)
-       2   (reserved)
+       2   fragment number (for fragmented messages, otherwise 0)
        2   checksum
 
     After the header, zero or more annotation chunks may follow, of the format::
@@ -70,6 +78,12 @@ class Message(object):
     This could happen for instance if the socket data stream gets out of sync, perhaps due To
     some form of signal that interrupts I/O.
 
+    Large messages can be sent as a series of fragments, if the other side supports it.
+    Every fragment is a frame with its own header, that has the FLAGS_FRAGMENT flag set, and the same
+    message type and sequence number. The first fragment carries the annotations (including a 'FRAG' chunk
+    with the total data size), the others have none, and a fragment number that is counting up.
+    The receiver reassembles the data in a single buffer, and validates the HMAC over the whole message.
+
     The header checksum is a simple sum of the header fields to make reasonably sure
     that we are dealing with an actual correct PYRO protocol header and not some random
     data that happens to start with the 'PYRO' protocol identifier.
@@ -78,15 +92,23 @@ class Message(object):
     'HMAC'  contains the hmac digest of the message data bytes and
     all of the annotation chunk data bytes (except those of the HMAC chunk itself).
     'CORR'  contains the correlation id (guid bytes)
+    'CMPR'  contains the id of the compressor of the (compressed) message data, if it isn't zlib
+    'CMPA'  contains the ids of the compressors that are supported (only in the connection handshake)
+    'CMPD'  contains the id of the preset compression dictionary (only in the connection handshake)
+    'HMCA'  contains the ids of the hmac digest algorithms that are supported (only in the connection handshake)
+    'NOHM'  signals that the hmac may be skipped because the connection uses SSL (only in the connection handshake)
+    'FRAG'  contains the total data size of a fragmented message (only in the first fragment)
+    'FRGA'  signals that fragmented messages are supported (only in the connection handshake)
     Other chunk names are free to use for custom purposes, but Pyro has the right
     to reserve more of them for internal use in the future.
     """
-    __slots__ = ["type", "flags", "seq", "data", "data_size", "serializer_id", "annotations", "annotations_size", "hmac_key"]
+    __slots__ = ["type", "flags", "seq", "data", "data_size", "serializer_id", "annotations", "annotations_size", "hmac_key", "hmac_digest"]
     header_format = '!4sHHHHiHHHH'
     header_size = struct.calcsize(header_format)
     checksum_magic = 0x34E9
+    small_data_size = 0x10000   # data up to this size is received together with the annotations (copying it is cheap)
 
-    def __init__(self, msgType, databytes, serializer_id, flags, seq, annotations=None, hmac_key=None):
+    def __init__(self, msgType, databytes, serializer_id, flags, seq, annotations=None, hmac_key=None, compressor=None, hmac_digest=None):
         self.type = msgType
         self.flags = flags
         self.seq = seq
@@ -94,7 +116,12 @@ class Message(object):
         self.data_size = len(self.data)
         self.serializer_id = serializer_id
         self.annotations = dict(annotations or {})
+        if flags & FLAGS_COMPRESSED and compressor and compressor.compressor_id != util.ZlibCompressor.compressor_id:
+            self.annotations["CMPR"] = struct.pack("!B", compressor.compressor_id)
+        else:
+            self.annotations.pop("CMPR", None)   # no annotation means zlib, for compatibility with older Pyro versions
         self.hmac_key = hmac_key
+        self.hmac_digest = hmac_digest or "sha1"
         if self.hmac_key:
             self.annotations["HMAC"] = self.hmac()   # should be done last because it calculates hmac over other annotations
         self.annotations_size = sum([6 + len(v) for v in self.annotations.values()])
@@ -110,18 +137,22 @@ class Message(object):
         """creates a byte stream containing the header followed by annotations (if any) followed by the data"""
         return self.__header_bytes() + self.__annotations_bytes() + self.data
 
-    def __header_bytes(self):
-        if not (0 <= self.data_size <= 0x7fffffff):
+    def __header_bytes(self, flags=None, data_size=None, annotations_size=None, fragment=0):
+        flags = self.flags if flags is None else flags
+        data_size = self.data_size if data_size is None else data_size
+        annotations_size = self.annotations_size if annotations_size is None else annotations_size
+        if not (0 <= data_size <= 0x7fffffff):
             raise ValueError("invalid message size (outside range 0..2Gb)")
-        checksum = (self.type + constants.PROTOCOL_VERSION + self.data_size + self.annotations_size +
-                    self.serializer_id + self.flags + self.seq + self.checksum_magic) & 0xffff
-        return struct.pack(self.header_format, b"PYRO", constants.PROTOCOL_VERSION, self.type, self.flags,
-                           self.seq, self.data_size, self.serializer_id, self.annotations_size, 0, checksum)
+        checksum = (self.type + constants.PROTOCOL_VERSION + data_size + annotations_size +
+                    self.serializer_id + flags + self.seq + self.checksum_magic) & 0xffff
+        return struct.pack(self.header_format, b"PYRO", constants.PROTOCOL_VERSION, self.type, flags,
+                           self.seq, data_size, self.serializer_id, annotations_size, fragment, checksum)
 
-    def __annotations_bytes(self):
-        if self.annotations:
+    def __annotations_bytes(self, annotations=None):
+        annotations = self.annotations if annotations is None else annotations
+        if annotations:
             a = []
-            for k, v in self.annotations.items():
+            for k, v in annotations.items():
                 if len(k) != 4:
                     raise errors.ProtocolError("annotation key must be of length 4")
                 if sys.version_info >= (3, 0):
@@ -131,16 +162,51 @@ class Message(object):
             return b"".join(a)
         return b""
 
-    # Note: this 'chunked' way of sending is not used because it triggers Nagle's algorithm
+    # Note: sending the header, annotations and data with separate send calls triggers Nagle's algorithm
     # on some systems (linux). This causes big delays, unless you change the socket option
     # TCP_NODELAY to disable the algorithm. What also works, is sending all the message bytes
-    # in one go: connection.send(message.to_bytes()). This is what Pyro does.
+    # in one go: connection.send(message.to_bytes()). But that copies all of the payload data.
+    # So if the connection supports it, Pyro passes the parts to a single vectored send (sendmsg) instead.
     def send(self, connection):
         """send the message as bytes over the connection"""
-        connection.send(self.__header_bytes())
-        if self.annotations:
-            connection.send(self.__annotations_bytes())
-        connection.send(self.data)
+        if config.WIRECAPTURE:
+            from Pyro4.utils import wirecapture
+            wirecapture.capture(connection, wirecapture.SENT, self)
+        if getattr(connection, "fragments", False):
+            fragment_size = min(config.FRAGMENT_SIZE or 0x7fffffff, 0x7fffffff)
+            if self.data_size > fragment_size:
+                self.__send_fragments(connection, fragment_size)
+                return
+        sendmsg = getattr(connection, "sendmsg", None)
+        if sendmsg is None:
+            connection.send(self.to_bytes())
+        else:
+            parts = [self.__header_bytes()]
+            if self.annotations:
+                parts.append(self.__annotations_bytes())
+            if self.data:
+                parts.append(self.data)
+            sendmsg(parts)
+
+    def __send_fragments(self, connection, fragment_size):
+        # The hmac (if any) has already been calculated over the whole data, the 'FRAG' chunk is not part of it.
+        # Without sendmsg the fragments are joined one by one, so that never copies more than a fragment.
+        sendmsg = getattr(connection, "sendmsg", None)
+        flags = self.flags | FLAGS_FRAGMENT
+        annotations = dict(self.annotations)
+        annotations["FRAG"] = struct.pack("!Q", self.data_size)
+        annotations_data = self.__annotations_bytes(annotations)
+        data = memoryview(self.data)
+        for number, offset in enumerate(range(0, self.data_size, fragment_size)):
+            fragment = data[offset:offset + fragment_size]
+            if number == 0:
+                parts = [self.__header_bytes(flags, len(fragment), len(annotations_data)), annotations_data, fragment]
+            else:
+                parts = [self.__header_bytes(flags, len(fragment), 0, number & 0xffff), fragment]
+            if sendmsg is None:
+                connection.send(b"".join(parts))
+            else:
+                sendmsg(parts)
 
     @classmethod
     def from_header(cls, headerData):
@@ -158,14 +224,15 @@ class Message(object):
         return msg
 
     @classmethod
-    def recv(cls, connection, requiredMsgTypes=None, hmac_key=None):
+    def recv(cls, connection, requiredMsgTypes=None, hmac_key=None, header=None):
         """
         Receives a pyro message from a given connection.
         Accepts the given message types (None=any, or pass a sequence).
         Also reads annotation chunks and the actual payload data.
         Validates a HMAC chunk if present.
+        If the header bytes of the message have already been received, pass them in as header.
         """
-        msg = cls.from_header(connection.recv(cls.header_size))
+        msg = cls.from_header(header if header is not None else connection.recv(cls.header_size))
         msg.hmac_key = hmac_key
         if 0 < config.MAX_MESSAGE_SIZE < (msg.data_size + msg.annotations_size):
             errorMsg = "max message size exceeded (%d where max=%d)" % (msg.data_size + msg.annotations_size, config.MAX_MESSAGE_SIZE)
@@ -180,9 +247,15 @@ class Message(object):
             exc = errors.ProtocolError(err)
             exc.pyroMsg = msg
             raise exc
+        data = None
         if msg.annotations_size:
             # read annotation chunks
-            annotations_data = connection.recv(msg.annotations_size)
+            if msg.data_size <= cls.small_data_size and not msg.flags & FLAGS_FRAGMENT:
+                # a small message: receive the annotations and the data at once, saves a system call
+                annotations_data = connection.recv(msg.annotations_size + msg.data_size)
+                data = annotations_data[msg.annotations_size:]
+            else:
+                annotations_data = connection.recv(msg.annotations_size)
             msg.annotations = {}
             i = 0
             while i < msg.annotations_size:
@@ -194,9 +267,22 @@ class Message(object):
                     msg.annotations[anno] = bytes(msg.annotations[anno])
                 i += 6 + length
         # read data
-        msg.data = connection.recv(msg.data_size)
+        if data is not None:
+            msg.data = data
+        elif msg.flags & FLAGS_FRAGMENT:
+            msg.data = cls.__recv_fragments(connection, msg)
+        else:
+            msg.data = connection.recv(msg.data_size)
         if "HMAC" in msg.annotations and hmac_key:
-            if not secure_compare(msg.annotations["HMAC"], msg.hmac()):
+            mac = msg.annotations["HMAC"]
+            if len(mac) != 20:
+                # not a sha1 digest, the first byte is the id of the digest algorithm
+                msg.hmac_digest = _hmac_digests.get(bytearray(mac[:1] or b"\0")[0])
+                if not msg.hmac_digest:
+                    exc = errors.SecurityError("unsupported hmac digest algorithm")
+                    exc.pyroMsg = msg
+                    raise exc
+            if not secure_compare(mac, msg.hmac()):
                 exc = errors.SecurityError("message hmac mismatch")
                 exc.pyroMsg = msg
                 raise exc
@@ -207,32 +293,120 @@ class Message(object):
             exc = errors.SecurityError(err)
             exc.pyroMsg = msg
             raise exc
+        if config.WIRECAPTURE:
+            from Pyro4.utils import wirecapture
+            wirecapture.capture(connection, wirecapture.RECEIVED, msg)
+        if msg.flags & FLAGS_COMPRESSED and "CMPR" in msg.annotations:
+            compressor = msg.compressor
+            if compressor.stateful:
+                # streaming compression: the decompression context of the connection must see every message, in order
+                decompressor = getattr(connection, "decompressor", None)
+                if decompressor is None:
+                    decompressor = connection.decompressor = compressor.for_connection()
+                msg.data = decompressor.decompress(msg.data)
+                msg.flags &= ~FLAGS_COMPRESSED
+                msg.data_size = len(msg.data)
         return msg
 
+    @classmethod
+    def __recv_fragments(cls, connection, msg):
+        if "FRAG" not in msg.annotations:
+            raise errors.ProtocolError("fragmented message without total size")
+        total_size = struct.unpack("!Q", msg.annotations.pop("FRAG"))[0]
+        msg.annotations_size -= 6 + 8
+        if 0 < config.MAX_MESSAGE_SIZE < total_size:
+            errorMsg = "max message size exceeded (%d where max=%d)" % (total_size, config.MAX_MESSAGE_SIZE)
+            log.error("connection " + str(connection) + ": " + errorMsg)
+            connection.close()
+            exc = errors.MessageTooLargeError(errorMsg)
+            exc.pyroMsg = msg
+            raise exc
+        recv_into = getattr(connection, "recv_into", None)
+        # The total size can't be trusted (it's not part of the hmac and it is only verified when all data has
+        # arrived), so the buffer is not allocated at once: it grows with the fragments as they arrive.
+        data = bytearray()
+        received = 0
+        number = 0
+        fragment_size = msg.data_size
+        while True:
+            if received + fragment_size > total_size:
+                raise errors.ProtocolError("message fragment exceeds total message size")
+            if received + fragment_size > len(data):
+                # at least double the buffer, so the data isn't copied over and over again
+                size = min(total_size, max(received + fragment_size, 2 * len(data)))
+                data.extend(bytearray(size - len(data)))
+            if recv_into:
+                recv_into(memoryview(data)[received:received + fragment_size])
+            else:
+                memoryview(data)[received:received + fragment_size] = connection.recv(fragment_size)
+            received += fragment_size
+            if received >= total_size:
+                break
+            number += 1
+            header = connection.recv(cls.header_size)
+            fragment = cls.from_header(header)
+            if fragment.type != msg.type or fragment.seq != msg.seq or not fragment.flags & FLAGS_FRAGMENT \
+                    or fragment.annotations_size or struct.unpack("!H", header[20:22])[0] != number & 0xffff:
+                raise errors.ProtocolError("invalid message fragment")
+            fragment_size = fragment.data_size
+        msg.flags &= ~FLAGS_FRAGMENT
+        msg.data_size = total_size
+        return data
+
     def hmac(self):
         """returns the hmac of the data and the annotation chunk values (except HMAC chunk itself)"""
-        mac = hmac.new(self.hmac_key, self.data, digestmod=hashlib.sha1)
+        mac = hmac.new(self.hmac_key, self.data, digestmod=getattr(hashlib, self.hmac_digest))
         for k, v in sorted(self.annotations.items()):    # note: sorted because we need fixed order to get the same hmac
             if k != "HMAC":
                 mac.update(v)
-        return mac.digest() if sys.platform != "cli" else bytes(mac.digest())
+        digest = mac.digest() if sys.platform != "cli" else bytes(mac.digest())
+        if self.hmac_digest != "sha1":
+            digest = struct.pack("!B", _hmac_digest_ids[self.hmac_digest]) + digest
+        return digest
 
     @staticmethod
     def ping(pyroConnection, hmac_key=None):
         """Convenience method to send a 'ping' message and wait for the 'pong' response"""
         ping = Message(MSG_PING, b"ping", 42, 0, 0, hmac_key=hmac_key)
-        pyroConnection.send(ping.to_bytes())
-        Message.recv(pyroConnection, [MSG_PING])
+        ping.send(pyroConnection)
+        Message.recv(pyroConnection, [MSG_PING], hmac_key=hmac_key)
+
+    @property
+    def compressor(self):
+        """The compressor that was used for the message data, or None if the data is not compressed."""
+        if not self.flags & FLAGS_COMPRESSED:
+            return None
+        if "CMPR" in self.annotations:
+            return util.get_compressor_by_id(bytearray(self.annotations["CMPR"])[0])
+        return util.get_compressor("zlib")
 
     def decompress_if_needed(self):
         """Decompress the message data if it is compressed."""
         if self.flags & FLAGS_COMPRESSED:
-            self.data = zlib.decompress(self.data)
+            self.data = self.compressor.decompress(self.data)
             self.flags &= ~FLAGS_COMPRESSED
             self.data_size = len(self.data)
         return self
 
 
+def get_hmac_digest_ids():
+    """Returns the ids of the available hmac digest algorithms, as bytes. This is sent to the other side in the connection handshake."""
+    return bytes(bytearray(sorted(_hmac_digests)))
+
+
+def negotiate_hmac_digest(peer_digest_ids):
+    """
+    Selects the hmac digest algorithm to use on a connection, given the ids of the algorithms that the other side
+    supports (as sent in its connection handshake, None if it didn't send them; older Pyro versions only know sha1).
+    This is the configured HMAC_DIGEST if the other side supports it, otherwise sha1.
+    """
+    if config.HMAC_DIGEST not in _hmac_digest_ids:
+        raise errors.SecurityError("hmac digest '%s' is unknown or not available" % config.HMAC_DIGEST)
+    if peer_digest_ids and _hmac_digest_ids[config.HMAC_DIGEST] in bytearray(peer_digest_ids):
+        return config.HMAC_DIGEST
+    return "sha1"
+
+
 try:
     from hmac import compare_digest as secure_compare
 except ImportError:
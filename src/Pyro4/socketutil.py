@@ -193,6 +193,63 @@ def receiveData(sock, size):
         raise TimeoutError("receiving: timeout")
 
 
+def receiveDataInto(sock, buffer):
+    """Receive bytes from a socket directly into the given (preallocated) writable buffer,
+    such as a bytearray, until it is completely filled. This avoids the intermediate chunk
+    copies that :func:`receiveData` has to make for large messages.
+    It is expected the socket is able to supply that number of bytes.
+    If it isn't, an exception is raised. The number of bytes that were received into
+    the buffer until then is stored in the 'partialSize' attribute of the exception object."""
+    view = memoryview(buffer)
+    if view.itemsize != 1:
+        view = view.cast("B")
+    size = len(view)
+    msglen = 0
+    retrydelay = 0.0
+    try:
+        if config.USE_MSG_WAITALL and not hasattr(sock, "getpeercert"):
+            # see the comments in receiveData about using MSG_WAITALL
+            while True:
+                try:
+                    msglen = sock.recv_into(view, size, socket.MSG_WAITALL)
+                    if msglen == size:
+                        return size
+                    break   # less data than asked, drop down into normal receive loop to finish
+                except socket.timeout:
+                    raise TimeoutError("receiving: timeout")
+                except socket.error as x:
+                    err = getattr(x, "errno", x.args[0])
+                    if err not in ERRNO_RETRIES:
+                        raise ConnectionClosedError("receiving: connection lost: " + str(x))
+                    time.sleep(0.00001 + retrydelay)  # a slight delay to wait before retrying
+                    retrydelay = __nextRetrydelay(retrydelay)
+        # old fashioned recv loop, we fill the buffer until the message is complete
+        while True:
+            try:
+                while msglen < size:
+                    # 60k buffer limit avoids problems on certain OSes like VMS, Windows
+                    received = sock.recv_into(view[msglen:], min(60000, size - msglen))
+                    if not received:
+                        break
+                    msglen += received
+                if msglen != size:
+                    err = ConnectionClosedError("receiving: not enough data")
+                    err.partialSize = msglen  # store the number of bytes that were received until now
+                    raise err
+                return size  # yay, complete
+            except socket.timeout:
+                raise TimeoutError("receiving: timeout")
+            except socket.error:
+                x = sys.exc_info()[1]
+                err = getattr(x, "errno", x.args[0])
+                if err not in ERRNO_RETRIES:
+                    raise ConnectionClosedError("receiving: connection lost: " + str(x))
+                time.sleep(0.00001 + retrydelay)  # a slight delay to wait before retrying
+                retrydelay = __nextRetrydelay(retrydelay)
+    except socket.timeout:
+        raise TimeoutError("receiving: timeout")
+
+
 def sendData(sock, data):
     """
     Send some data over a socket.
@@ -226,6 +283,45 @@ def sendData(sock, data):
                 retrydelay = __nextRetrydelay(retrydelay)
 
 
+def sendDataVectored(sock, buffers):
+    """
+    Send a sequence of data buffers over a socket as one contiguous stream of bytes,
+    using a vectored send (``sendmsg``, a single system call for all buffers).
+    This avoids having to concatenate the buffers into a new bytes object first,
+    which would copy all the data. The socket must support ``sendmsg`` (not available on
+    SSL sockets, on Windows, or on Python 2.x): use :func:`sendData` on the joined buffers in that case.
+    """
+    views = []
+    for buf in buffers:
+        view = memoryview(buf)
+        if view.itemsize != 1:
+            view = view.cast("B")
+        if len(view):
+            views.append(view)
+    retrydelay = 0.0
+    while views:
+        try:
+            sent = sock.sendmsg(views)
+        except socket.timeout:
+            raise TimeoutError("sending: timeout")
+        except socket.error as x:
+            err = getattr(x, "errno", x.args[0])
+            if err not in ERRNO_RETRIES:
+                raise ConnectionClosedError("sending: connection lost: " + str(x))
+            time.sleep(0.00001 + retrydelay)  # a slight delay to wait before retrying
+            retrydelay = __nextRetrydelay(retrydelay)
+            continue
+        # drop the buffers that have been sent completely, and continue with the rest
+        while sent and views:
+            size = len(views[0])
+            if sent >= size:
+                sent -= size
+                del views[0]
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+
+
 _GLOBAL_DEFAULT_TIMEOUT = object()
 
 
@@ -446,6 +542,12 @@ class SocketConnection(object):
         self.pyroInstances = {}    # pyro objects for instance_mode=session
         self.tracked_resources = weakref.WeakSet()      # weakrefs to resources for this connection
         self.keep_open = keep_open
+        self.compressor = None    # compressor negotiated in the connection handshake (None=zlib)
+        self.decompressor = None  # decompression context for a stateful compressor used by the other side
+        self.hmac_digest = None   # hmac digest algorithm negotiated in the connection handshake (None=sha1)
+        self.hmac_skip = False    # skip the message hmac because the connection uses SSL (negotiated in the handshake)
+        self.fragments = False    # the other side supports fragmented messages (negotiated in the handshake)
+        self.bytes_received = 0
 
     def __del__(self):
         self.close()
@@ -460,8 +562,27 @@ class SocketConnection(object):
         sendData(self.sock, data)
 
     def recv(self, size):
+        self.bytes_received += size
+        if size > 60000 and not (config.USE_MSG_WAITALL and not hasattr(self.sock, "getpeercert")):
+            # Without MSG_WAITALL, receiveData has to gather and join a lot of chunks for large sizes.
+            # Receiving directly into a single preallocated buffer avoids those copies and halves
+            # the peak memory use. The bytearray can be consumed by the deserializers as-is.
+            buffer = bytearray(size)
+            receiveDataInto(self.sock, buffer)
+            return buffer
         return receiveData(self.sock, size)
 
+    def recv_into(self, buffer):
+        self.bytes_received += len(buffer)
+        return receiveDataInto(self.sock, buffer)
+
+    def sendmsg(self, buffers):
+        if hasattr(self.sock, "sendmsg") and not hasattr(self.sock, "getpeercert"):
+            sendDataVectored(self.sock, buffers)
+        else:
+            # no vectored send available (ssl socket, windows, python 2.x), send the buffers in one go
+            sendData(self.sock, b"".join(buffers))
+
     def close(self):
         if self.keep_open:
             return
@@ -16,6 +16,8 @@ import struct
 import datetime
 import decimal
 import numbers
+import threading
+import collections
 from Pyro4 import errors
 from Pyro4.configuration import config
 
@@ -158,31 +160,30 @@ class SerializerBase(object):
 
     def serializeData(self, data, compress=False):
         """Serialize the given data object, try to compress if told so.
+        Compress can be a bool (True means zlib) or the compressor object to use.
         Returns a tuple of the serialized data (bytes) and a bool indicating if it is compressed or not."""
         data = self.dumps(data)
         return self.__compressdata(data, compress)
 
     def deserializeData(self, data, compressed=False):
-        """Deserializes the given data (bytes). Set compressed to True to decompress the data first."""
+        """Deserializes the given data (bytes). Set compressed to True (zlib) or
+        to the compressor object that was used, to decompress the data first."""
         if compressed:
-            if sys.version_info < (3, 0):
-                data = self._convertToBytes(data)
-            data = zlib.decompress(data)
+            data = self.__decompressdata(data, compressed)
         return self.loads(data)
 
     def serializeCall(self, obj, method, vargs, kwargs, compress=False):
         """Serialize the given method call parameters, try to compress if told so.
+        Compress can be a bool (True means zlib) or the compressor object to use.
         Returns a tuple of the serialized data and a bool indicating if it is compressed or not."""
         data = self.dumpsCall(obj, method, vargs, kwargs)
         return self.__compressdata(data, compress)
 
     def deserializeCall(self, data, compressed=False):
         """Deserializes the given call data back to (object, method, vargs, kwargs) tuple.
-        Set compressed to True to decompress the data first."""
+        Set compressed to True (zlib) or to the compressor object that was used, to decompress the data first."""
         if compressed:
-            if sys.version_info < (3, 0):
-                data = self._convertToBytes(data)
-            data = zlib.decompress(data)
+            data = self.__decompressdata(data, compressed)
         return self.loadsCall(data)
 
     def loads(self, data):
@@ -206,14 +207,36 @@ class SerializerBase(object):
                 return data.tobytes()
         return data
 
+    if sys.version_info >= (3, 0):
+        def _convertToBuffer(self, data):
+            # the deserializers accept any bytes-like object, so no need to copy a received bytearray or memoryview
+            return data
+    else:
+        def _convertToBuffer(self, data):
+            return self._convertToBytes(data)
+
     def __compressdata(self, data, compress):
-        if not compress or len(data) < 200:
+        if not compress:
+            return data, False
+        if not isinstance(compress, CompressorBase):
+            compress = _compressors["zlib"]
+        if compress.stateful:
+            # the other side's decompression context must see every message, so always use the output
+            return compress.compress(data), True
+        if len(data) < 200:
             return data, False  # don't waste time compressing small messages
-        compressed = zlib.compress(data)
+        compressed = compress.compress(data)
         if len(compressed) < len(data):
             return compressed, True
         return data, False
 
+    def __decompressdata(self, data, compressor):
+        if not isinstance(compressor, CompressorBase):
+            compressor = _compressors["zlib"]
+        if sys.version_info < (3, 0):
+            data = self._convertToBytes(data)
+        return compressor.decompress(data)
+
     @classmethod
     def register_type_replacement(cls, object_type, replacement_function):
         raise NotImplementedError("implement in subclass")
@@ -444,11 +467,11 @@ class PickleSerializer(SerializerBase):
         return pickle.dumps(data, config.PICKLE_PROTOCOL_VERSION)
 
     def loadsCall(self, data):
-        data = self._convertToBytes(data)
+        data = self._convertToBuffer(data)
         return pickle.loads(data)
 
     def loads(self, data):
-        data = self._convertToBytes(data)
+        data = self._convertToBuffer(data)
         return pickle.loads(data)
 
     @classmethod
@@ -557,14 +580,14 @@ class MarshalSerializer(SerializerBase):
             return self.recreate_classes(marshal.loads(data))
     else:
         def loadsCall(self, data):
-            data = self._convertToBytes(data)
+            data = self._convertToBuffer(data)
             obj, method, vargs, kwargs = marshal.loads(data)
             vargs = self.recreate_classes(vargs)
             kwargs = self.recreate_classes(kwargs)
             return obj, method, vargs, kwargs
 
         def loads(self, data):
-            data = self._convertToBytes(data)
+            data = self._convertToBuffer(data)
             return self.recreate_classes(marshal.loads(data))
 
     marshalable_types = (str, int, float, type(None), bool, complex, bytes, bytearray,
@@ -649,14 +672,18 @@ class JsonSerializer(SerializerBase):
         return data.encode("utf-8")
 
     def loadsCall(self, data):
-        data = self._convertToBytes(data).decode("utf-8")
+        if type(data) is not bytearray:
+            data = self._convertToBytes(data)
+        data = data.decode("utf-8")
         data = json.loads(data)
         vargs = self.recreate_classes(data["params"])
         kwargs = self.recreate_classes(data["kwargs"])
         return data["object"], data["method"], vargs, kwargs
 
     def loads(self, data):
-        data = self._convertToBytes(data).decode("utf-8")
+        if type(data) is not bytearray:
+            data = self._convertToBytes(data)
+        data = data.decode("utf-8")
         return self.recreate_classes(json.loads(data))
 
     def default(self, obj):
@@ -699,12 +726,12 @@ class MsgpackSerializer(SerializerBase):
         return msgpack.packb(data, use_bin_type=True, default=self.default)
 
     def loadsCall(self, data):
-        data = self._convertToBytes(data)
+        data = self._convertToBuffer(data)
         obj, method, vargs, kwargs = msgpack.unpackb(data, raw=False, object_hook=self.object_hook)
         return obj, method, vargs, kwargs
 
     def loads(self, data):
-        data = self._convertToBytes(data)
+        data = self._convertToBuffer(data)
         return msgpack.unpackb(data, raw=False, object_hook=self.object_hook, ext_hook=self.ext_hook)
 
     def default(self, obj):
@@ -761,6 +788,137 @@ class MsgpackSerializer(SerializerBase):
         cls.__type_replacements[object_type] = replacement_function
 
 
+class CompressorBase(object):
+    """Base class for the compression codecs of the message data (which must be thread safe)"""
+    default_level = -1
+    min_level, max_level = 0, 9   # the range of levels that the codec accepts
+    stateful = False    # stateful compressors keep a compression context per connection
+
+    def compress(self, data):
+        raise NotImplementedError("implement in subclass")
+
+    def decompress(self, data):
+        raise NotImplementedError("implement in subclass")
+
+    def for_connection(self):
+        """Returns the compressor object to use for a single connection. Only stateful compressors create a new one."""
+        return self
+
+    def level(self):
+        """
+        the compression level to use: config.COMPRESSION_LEVEL limited to the range of the codec,
+        or the codec's default level if that is negative
+        """
+        if config.COMPRESSION_LEVEL < 0:
+            return self.default_level
+        return max(self.min_level, min(self.max_level, config.COMPRESSION_LEVEL))
+
+
+class ZlibCompressor(CompressorBase):
+    """zlib (deflate) compression. This is the codec every Pyro version understands."""
+    compressor_id = 1  # never change this
+    default_level = -1
+
+    def compress(self, data):
+        return zlib.compress(data, self.level())
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class Bz2Compressor(CompressorBase):
+    """bzip2 compression. Slow, but compresses text-like data well."""
+    compressor_id = 2  # never change this
+    default_level = 9
+    min_level = 1
+
+    def compress(self, data):
+        return bz2.compress(data, self.level())
+
+    def decompress(self, data):
+        return bz2.decompress(data)
+
+
+class LzmaCompressor(CompressorBase):
+    """lzma (xz) compression. Best compression ratio, but expensive in cpu time."""
+    compressor_id = 3  # never change this
+    default_level = 6
+
+    def compress(self, data):
+        return lzma.compress(data, preset=self.level())
+
+    def decompress(self, data):
+        return lzma.decompress(data)
+
+
+class Lz4Compressor(CompressorBase):
+    """lz4 frame compression (requires the lz4 library). Very fast, moderate compression ratio."""
+    compressor_id = 4  # never change this
+    default_level = 0
+    max_level = 16
+
+    def compress(self, data):
+        return lz4.frame.compress(data, compression_level=self.level())
+
+    def decompress(self, data):
+        return lz4.frame.decompress(data)
+
+
+class ZstdCompressor(CompressorBase):
+    """Zstandard compression (requires the zstandard library). Fast, with a good compression ratio."""
+    compressor_id = 5  # never change this
+    default_level = 3
+    min_level, max_level = 1, 22
+
+    def compress(self, data):
+        # zstandard's (de)compressor objects are not thread safe, so create new ones every time
+        return zstandard.ZstdCompressor(level=self.level()).compress(data)
+
+    def decompress(self, data):
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+class ZlibStreamCompressor(CompressorBase):
+    """
+    zlib compression that keeps its compression context for the whole connection, instead of starting
+    from scratch for every message. Every message is flushed with Z_SYNC_FLUSH so it can be decompressed
+    on its own, but repetitive small messages (such as dicts with the same keys) compress a lot better.
+    The context can be primed with a preset dictionary (see COMPRESSION_ZDICT and :func:`build_zdict`).
+    Because of the shared context, messages must be decompressed in the order they were compressed.
+    """
+    compressor_id = 6  # never change this
+    default_level = -1
+    stateful = True
+
+    def __init__(self, zdict=b""):
+        self.zdict = zdict
+        self.__compressobj = None
+        self.__decompressobj = None
+        self.__lock = threading.Lock()
+
+    def for_connection(self):
+        return ZlibStreamCompressor(get_zdict())
+
+    def compress(self, data):
+        with self.__lock:
+            if self.__compressobj is None:
+                if self.zdict:
+                    self.__compressobj = zlib.compressobj(self.level(), zlib.DEFLATED, zlib.MAX_WBITS,
+                                                          zlib.DEF_MEM_LEVEL, zlib.Z_DEFAULT_STRATEGY, self.zdict)
+                else:
+                    self.__compressobj = zlib.compressobj(self.level())
+            return self.__compressobj.compress(data) + self.__compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    def decompress(self, data):
+        with self.__lock:
+            if self.__decompressobj is None:
+                self.__decompressobj = zlib.decompressobj(zdict=self.zdict) if self.zdict else zlib.decompressobj()
+            try:
+                return self.__decompressobj.decompress(data)
+            except zlib.error as x:
+                raise errors.ProtocolError("compression stream out of sync: %s" % x)
+
+
 """The various serializers that are supported"""
 _serializers = {}
 _serializers_by_id = {}
@@ -835,6 +993,119 @@ except ImportError:
 del _ser
 
 
+"""The various compressors that are supported"""
+_compressors = {}
+_compressors_by_id = {}
+
+
+def get_compressor(name):
+    try:
+        return _compressors[name]
+    except KeyError:
+        raise errors.SerializeError("compressor '%s' is unknown or not available" % name)
+
+
+def get_compressor_by_id(cid):
+    try:
+        return _compressors_by_id[cid]
+    except KeyError:
+        raise errors.SerializeError("no compressor available for id %d" % cid)
+
+
+def get_compressor_ids():
+    """Returns the ids of all available compressors, as bytes. This is sent to the other side in the connection handshake."""
+    return bytes(bytearray(sorted(_compressors_by_id)))
+
+
+def negotiate_compressor(peer_compressor_ids, peer_zdict_id=None):
+    """
+    Selects the compressor to use on a connection, given the compressor ids that the other side supports
+    (as sent in its connection handshake, None if it didn't send them; older Pyro versions only know zlib)
+    and the id of the other side's preset compression dictionary (see :func:`get_zdict_id`).
+    This is the configured COMPRESSION_CODEC if the other side supports it, otherwise zlib.
+    Stateful compressors get a new instance for the connection.
+    Returns None if COMPRESSION is disabled, because then nothing is compressed.
+    """
+    if not config.COMPRESSION:
+        return None
+    compressor = get_compressor(config.COMPRESSION_CODEC)
+    if peer_compressor_ids and compressor.compressor_id in bytearray(peer_compressor_ids):
+        if compressor.stateful and peer_zdict_id != get_zdict_id():
+            log.warning("not using %s compression because the other side uses a different COMPRESSION_ZDICT", config.COMPRESSION_CODEC)
+        else:
+            return compressor.for_connection()
+    return _compressors["zlib"]
+
+
+_zdicts = {}
+
+
+def get_zdict():
+    """Returns the preset compression dictionary from the file configured in COMPRESSION_ZDICT (empty bytes if not set)."""
+    filename = config.COMPRESSION_ZDICT
+    if not filename:
+        return b""
+    if filename not in _zdicts:
+        with open(filename, "rb") as f:
+            _zdicts[filename] = f.read()
+    return _zdicts[filename]
+
+
+def get_zdict_id():
+    """Returns the id of the preset compression dictionary, as bytes. This is its adler32 checksum, like zlib uses itself."""
+    return struct.pack("!I", zlib.adler32(get_zdict()) & 0xffffffff)
+
+
+def build_zdict(samples, size=32768):
+    """
+    Builds a preset compression dictionary for the zlib-stream compressor from sample message payloads,
+    for instance the serialized data of typical calls and responses. Save the result in a file and point
+    COMPRESSION_ZDICT to it, on both sides. zlib encodes matches near the end of the dictionary most
+    efficiently, so the samples that occur most often are placed last. Returns at most size bytes.
+    """
+    counts = collections.Counter(bytes(sample) for sample in samples)
+    zdict = b"".join(sample for sample, _ in reversed(counts.most_common()))
+    return zdict[-size:]
+
+
+# determine the compressors that are supported
+_comp = ZlibCompressor()
+_compressors["zlib"] = _comp
+_compressors_by_id[_comp.compressor_id] = _comp
+_comp = ZlibStreamCompressor()
+_compressors["zlib-stream"] = _comp
+_compressors_by_id[_comp.compressor_id] = _comp
+try:
+    import bz2
+    _comp = Bz2Compressor()
+    _compressors["bz2"] = _comp
+    _compressors_by_id[_comp.compressor_id] = _comp
+except ImportError:
+    pass
+try:
+    import lzma
+    _comp = LzmaCompressor()
+    _compressors["lzma"] = _comp
+    _compressors_by_id[_comp.compressor_id] = _comp
+except ImportError:
+    pass
+try:
+    import lz4.frame
+    _comp = Lz4Compressor()
+    _compressors["lz4"] = _comp
+    _compressors_by_id[_comp.compressor_id] = _comp
+except ImportError:
+    pass
+try:
+    import zstandard
+    _comp = ZstdCompressor()
+    _compressors["zstd"] = _comp
+    _compressors_by_id[_comp.compressor_id] = _comp
+except ImportError:
+    pass
+del _comp
+
+
 def getAttribute(obj, attr):
     """
     Resolves an attribute name to an object.  Raises
@@ -900,7 +1171,9 @@ def get_exposed_members(obj, only_exposed=True, as_lists=False, use_cache=True):
     If only_exposed is True, only members tagged with the @expose decorator are
     returned. If it is False, all public members are returned.
     The return value consists of the exposed methods, exposed attributes, and methods
-    tagged as @oneway.
+    tagged as @oneway. If there are methods tagged as @cacheable, it also contains
+    a dict with the (ttl, maxsize) of each of them, and if there are methods tagged
+    as @idempotent, the names of those.
     (All this is used as meta data that Pyro sends to the proxy if it asks for it)
     as_lists is meant for python 2 compatibility.
     """
@@ -913,6 +1186,8 @@ def get_exposed_members(obj, only_exposed=True, as_lists=False, use_cache=True):
 
     methods = set()  # all methods
     oneway = set()  # oneway methods
+    cacheable = {}  # cacheable methods, with their (ttl, maxsize)
+    idempotent = set()  # idempotent methods
     attrs = set()  # attributes
     for m in dir(obj):      # also lists names inherited from super classes
         if is_private_attribute(m):
@@ -924,6 +1199,12 @@ def get_exposed_members(obj, only_exposed=True, as_lists=False, use_cache=True):
                 # check if the method is marked with the 'oneway' decorator:
                 if getattr(v, "_pyroOneway", False):
                     oneway.add(m)
+                # check if the method is marked with the 'cacheable' decorator:
+                if getattr(v, "_pyroCacheable", None):
+                    cacheable[m] = list(v._pyroCacheable) if as_lists else v._pyroCacheable
+                # check if the method is marked with the 'idempotent' decorator:
+                if getattr(v, "_pyroIdempotent", False):
+                    idempotent.add(m)
         elif inspect.isdatadescriptor(v):
             func = getattr(v, "fget", None) or getattr(v, "fset", None) or getattr(v, "fdel", None)
             if func is not None and getattr(func, "_pyroExposed", not only_exposed):
@@ -944,6 +1225,10 @@ def get_exposed_members(obj, only_exposed=True, as_lists=False, use_cache=True):
         "oneway": oneway,
         "attrs": attrs
     }
+    if cacheable:
+        result["cacheable"] = cacheable
+    if idempotent:
+        result["idempotent"] = list(idempotent) if as_lists else idempotent
     __exposed_member_cache[cache_key] = result
     return result
 
@@ -0,0 +1,210 @@
+"""
+Capturing of the Pyro wire protocol messages to a binary file, and replaying
+the captured requests against a daemon to reproduce a load pattern.
+
+Set the WIRECAPTURE config item to a file name to capture all messages that
+are sent and received by the current process. Every message is written with a
+timestamp, the id of the connection it went over, and whether it was sent or received.
+Use a different capture file for every process.
+
+You can start this module as a script from the command line, to replay a
+capture file against a running daemon and get the latency percentiles:
+
+  :command:`python -m Pyro4.utils.wirecapture capturefile location`
+  or simply: :command:`pyro4-replay capturefile location`
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+import struct
+import logging
+import itertools
+import threading
+import collections
+from Pyro4.configuration import config
+from Pyro4 import constants, errors, message, socketutil, core
+
+
+__all__ = ["capture", "read_capture", "replay", "CapturedMessage", "SENT", "RECEIVED"]
+
+log = logging.getLogger("Pyro4.wirecapture")
+
+SENT = 1
+RECEIVED = 2
+
+file_header_format = "!8sHH"     # magic, capture format version, protocol version
+record_header_format = "!dIBI"   # timestamp, connection id, direction, message length
+file_magic = b"PYROWCAP"
+capture_format_version = 1
+
+CapturedMessage = collections.namedtuple("CapturedMessage", ["timestamp", "connection_id", "direction", "message", "frame"])
+CapturedMessage.__doc__ = """A captured message. The message is the parsed header, the frame is the message as raw bytes."""
+
+
+class _CaptureFile(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.file = None
+        self.filename = None
+        self.connection_ids = itertools.count(1)
+
+    def write(self, connection, direction, msg):
+        try:
+            frame = msg.to_bytes()
+        except ValueError:
+            log.warning("message too large to capture: %r", msg)
+            return
+        with self.lock:
+            if self.filename != config.WIRECAPTURE:
+                self.open(config.WIRECAPTURE)
+            connection_id = getattr(connection, "_pyroCaptureId", None)
+            if connection_id is None:
+                connection_id = connection._pyroCaptureId = next(self.connection_ids)
+            record = struct.pack(record_header_format, time.time(), connection_id, direction, len(frame))
+            self.file.write(record + frame)
+            self.file.flush()
+
+    def open(self, filename):
+        if self.file:
+            self.file.close()
+        self.file = open(filename, "ab")
+        if self.file.tell() == 0:
+            self.file.write(struct.pack(file_header_format, file_magic, capture_format_version, constants.PROTOCOL_VERSION))
+        self.filename = filename
+
+
+_capture_file = _CaptureFile()
+
+
+def capture(connection, direction, msg):
+    """Writes the message that was sent or received over the connection, to the capture file (config.WIRECAPTURE)."""
+    _capture_file.write(connection, direction, msg)
+
+
+def read_capture(filename):
+    """Reads a capture file. Yields a :class:`CapturedMessage` for every message in it, in the order they were captured."""
+    with open(filename, "rb") as f:
+        header = f.read(struct.calcsize(file_header_format))
+        magic, version, protocol_version = struct.unpack(file_header_format, header)
+        if magic != file_magic or version != capture_format_version:
+            raise errors.ProtocolError("not a Pyro wire capture file, or unsupported version")
+        if protocol_version != constants.PROTOCOL_VERSION:
+            raise errors.ProtocolError("capture file is from another Pyro protocol version (%d)" % protocol_version)
+        record_size = struct.calcsize(record_header_format)
+        while True:
+            record = f.read(record_size)
+            if len(record) < record_size:
+                return
+            timestamp, connection_id, direction, length = struct.unpack(record_header_format, record)
+            frame = f.read(length)
+            if len(frame) < length:
+                return   # incomplete last record
+            msg = message.Message.from_header(frame[:message.Message.header_size])
+            yield CapturedMessage(timestamp, connection_id, direction, msg, frame)
+
+
+def percentile(sorted_values, percent):
+    """nearest-rank percentile of an already sorted list of values"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, int(round(percent / 100.0 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def replay(filename, location, speed=1.0, hmac_key=None, direction=None):
+    """
+    Replays the requests in a capture file against the daemon at the given location ("host:port" or "./u:socketpath").
+    Every captured connection is replayed over its own new connection, concurrently with the others.
+    The requests (connect, invoke and ping messages) are sent as-is, with the original timing divided by speed.
+    A speed of 0 sends them as fast as possible. The direction selects the requests that were captured on
+    the client side (SENT) or on the daemon side (RECEIVED); None means: the client side ones, if there are any.
+    Returns a dict with the number of requests, the number of errors, the total duration and a sorted list
+    of the response latencies in seconds (oneway calls have no response, and are not included).
+    """
+    uri = core.URI("PYRO:replay@" + location)
+    requests = {SENT: collections.OrderedDict(), RECEIVED: collections.OrderedDict()}
+    for captured in read_capture(filename):
+        if captured.message.type in (message.MSG_CONNECT, message.MSG_INVOKE, message.MSG_PING):
+            requests[captured.direction].setdefault(captured.connection_id, []).append(captured)
+    if direction is None:
+        direction = SENT if requests[SENT] else RECEIVED
+    requests = requests[direction]
+    start_timestamp = min([captured[0].timestamp for captured in requests.values()] or [0.0])
+    results = {"requests": 0, "errors": 0, "latencies": []}
+    results_lock = threading.Lock()
+
+    def replay_connection(captured_requests):
+        latencies = []
+        errorcount = 0
+        try:
+            sock = socketutil.createSocket(connect=uri.sockname or (uri.host, uri.port), timeout=config.COMMTIMEOUT or None)
+            conn = socketutil.SocketConnection(sock)
+        except Exception as x:
+            log.warning("replay: cannot connect: %s", x)
+            with results_lock:
+                results["requests"] += len(captured_requests)
+                results["errors"] += len(captured_requests)
+            return
+        with conn:
+            for captured in captured_requests:
+                if speed > 0:
+                    delay = (captured.timestamp - start_timestamp) / speed - (time.time() - replay_start)
+                    if delay > 0:
+                        time.sleep(delay)
+                request_start = time.time()
+                try:
+                    conn.send(captured.frame)
+                    if captured.message.flags & message.FLAGS_ONEWAY:
+                        continue
+                    response = message.Message.recv(conn, hmac_key=hmac_key)
+                    latencies.append(time.time() - request_start)
+                    if response.type == message.MSG_CONNECTFAIL or response.flags & message.FLAGS_EXCEPTION:
+                        errorcount += 1
+                except errors.CommunicationError as x:
+                    log.warning("replay: communication error: %s", x)
+                    errorcount += len(captured_requests) - captured_requests.index(captured)
+                    break
+        with results_lock:
+            results["requests"] += len(captured_requests)
+            results["errors"] += errorcount
+            results["latencies"].extend(latencies)
+
+    threads = [threading.Thread(target=replay_connection, args=(captured_requests,)) for captured_requests in requests.values()]
+    replay_start = time.time()
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results["duration"] = time.time() - replay_start
+    results["latencies"].sort()
+    return results
+
+
+def main(args=None):
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="usage: %prog [options] capturefile location\n"
+                                "  location is host:port, or ./u:socketpath for a Unix domain socket")
+    parser.add_option("-s", "--speed", type="float", default=1.0,
+                      help="replay speed compared to the original timing, 0=as fast as possible (default=%default)")
+    options, args = parser.parse_args(args)
+    if len(args) != 2:
+        parser.error("capture file and location required")
+    hmac_key = os.environ.get("PYRO_HMAC_KEY", "").encode("utf-8") or None
+    print("Replaying %s against %s, speed %s" % (args[0], args[1], options.speed or "unlimited"))
+    results = replay(args[0], args[1], options.speed, hmac_key)
+    latencies = results["latencies"]
+    print("requests: %d   errors: %d   duration: %.2f sec   throughput: %.1f req/sec" %
+          (results["requests"], results["errors"], results["duration"], results["requests"] / (results["duration"] or 1.0)))
+    print("latency (msec):  p50 %.3f   p90 %.3f   p95 %.3f   p99 %.3f   max %.3f" %
+          tuple(1000.0 * percentile(latencies, p) for p in (50, 90, 95, 99, 100)))
+    return 1 if results["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
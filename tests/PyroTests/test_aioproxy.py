@@ -0,0 +1,183 @@
+"""
+Tests for the asyncio proxy.
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+import sys
+import time
+import threading
+import unittest
+import Pyro4.core
+import Pyro4.errors
+from Pyro4.configuration import config
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    import Pyro4.aioproxy
+
+
+@Pyro4.core.expose
+class AsyncTestObject(object):
+    def __init__(self):
+        self.value = 42
+
+    def multiply(self, x, y):
+        return x * y
+
+    def delay(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+    def divide(self, x, y):
+        return x // y
+
+    def correlation(self):
+        return str(Pyro4.core.current_context.correlation_id)
+
+    def generator(self):
+        for i in range(5):
+            yield i
+
+    @Pyro4.core.oneway
+    def oneway_store(self, value):
+        self.value = value
+
+    @property
+    def prop(self):
+        return self.value
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio proxy requires python 3.5+")
+class AsyncProxyTests(unittest.TestCase):
+    def setUp(self):
+        self.daemon = Pyro4.core.Daemon(port=0)
+        self.uri = self.daemon.register(AsyncTestObject(), "async")
+        self.daemonthread = threading.Thread(target=self.daemon.requestLoop)
+        self.daemonthread.daemon = True
+        self.daemonthread.start()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.daemon.shutdown()
+        self.daemonthread.join()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def testCalls(self):
+        async def calls():
+            async with Pyro4.aioproxy.AsyncProxy(self.uri) as p:
+                self.assertEqual(55, await p.multiply(5, 11))
+                self.assertEqual({"multiply", "delay", "divide", "correlation", "generator", "oneway_store"}, p._pyroMethods)
+                with self.assertRaises(ZeroDivisionError):
+                    await p.divide(1, 0)
+                self.assertIsNone(await p.oneway_store(99))
+                self.assertEqual(99, await p.prop)
+                with self.assertRaises(AttributeError):
+                    p.nonexisting()
+            self.assertIsNone(p._pyroConnection)
+        self.run_async(calls())
+
+    def testConcurrentCalls(self):
+        async def calls():
+            async with Pyro4.aioproxy.AsyncProxy(self.uri) as p:
+                await p._pyroBind()
+                connection = p._pyroConnection
+                start = time.time()
+                results = await asyncio.gather(*[p.multiply(i, 2) for i in range(100)])
+                self.assertEqual([i * 2 for i in range(100)], results)
+                self.assertIs(connection, p._pyroConnection, "calls must share the connection")
+                results = await asyncio.gather(p.delay(0.2), p.multiply(3, 4))
+                self.assertEqual([0.2, 12], results)
+                self.assertLess(time.time() - start, 2.0)
+        self.run_async(calls())
+
+    def testMaxInflight(self):
+        async def calls():
+            async with Pyro4.aioproxy.AsyncProxy(self.uri, max_inflight=1) as p:
+                results = await asyncio.gather(*[p.multiply(i, 2) for i in range(20)])
+                self.assertEqual([i * 2 for i in range(20)], results)
+        self.run_async(calls())
+
+    def testTimeout(self):
+        async def calls():
+            async with Pyro4.aioproxy.AsyncProxy(self.uri) as p:
+                p._pyroTimeout = 0.1
+                p._pyroMaxRetries = 0
+                with self.assertRaises(Pyro4.errors.TimeoutError):
+                    await p.delay(0.3)
+                p._pyroTimeout = None
+                self.assertEqual(6, await p.multiply(2, 3), "late response must be discarded")
+        self.run_async(calls())
+
+    def testReconnect(self):
+        async def calls():
+            async with Pyro4.aioproxy.AsyncProxy(self.uri) as p:
+                self.assertEqual(6, await p.multiply(2, 3))
+                p._pyroRelease()
+                self.assertEqual(6, await p.multiply(2, 3))
+        self.run_async(calls())
+
+    def testGenerator(self):
+        async def calls():
+            async with Pyro4.aioproxy.AsyncProxy(self.uri) as p:
+                items = []
+                async for item in await p.generator():
+                    items.append(item)
+                self.assertEqual([0, 1, 2, 3, 4], items)
+                iterator = await p.generator()
+                self.assertEqual(0, await iterator.__anext__())
+                await iterator.aclose()
+                with self.assertRaises(StopAsyncIteration):
+                    await iterator.__anext__()
+        self.run_async(calls())
+
+    def testContextPerTask(self):
+        import uuid
+
+        async def call(p, correlation_id):
+            Pyro4.core.current_context.correlation_id = correlation_id
+            await asyncio.sleep(0.01)
+            return await p.correlation()
+
+        async def calls():
+            async with Pyro4.aioproxy.AsyncProxy(self.uri) as p:
+                ids = [uuid.uuid4() for _ in range(10)]
+                results = await asyncio.gather(*[call(p, i) for i in ids])
+                self.assertEqual([str(i) for i in ids], results)
+        if sys.version_info < (3, 7):
+            self.skipTest("context variables require python 3.7+")
+        self.run_async(calls())
+
+    def testStreamCompressionAndFragments(self):
+        async def calls():
+            async with Pyro4.aioproxy.AsyncProxy(self.uri) as p:
+                self.assertEqual("*" * 100000, await p.multiply("*", 100000))
+                self.assertEqual("*" * 1000, await p.multiply("*", 1000))
+                self.assertTrue(p._pyroConnection.fragments)
+        try:
+            config.COMPRESSION = True
+            config.COMPRESSION_CODEC = "zlib-stream"
+            config.FRAGMENT_SIZE = 1000
+            self.run_async(calls())
+        finally:
+            config.COMPRESSION = False
+            config.COMPRESSION_CODEC = "zlib"
+            config.FRAGMENT_SIZE = 64 * 1024 * 1024
+
+    def testHmac(self):
+        async def calls():
+            async with Pyro4.aioproxy.AsyncProxy(self.uri) as p:
+                p._pyroHmacKey = "secret"
+                self.assertEqual(6, await p.multiply(2, 3))
+            async with Pyro4.aioproxy.AsyncProxy(self.uri) as p:
+                with self.assertRaises(Pyro4.errors.CommunicationError):
+                    await p.multiply(2, 3)
+        self.daemon._pyroHmacKey = "secret"
+        self.run_async(calls())
+
+
+if __name__ == "__main__":
+    unittest.main()
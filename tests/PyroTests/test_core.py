@@ -6,11 +6,15 @@ Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 
 from __future__ import print_function
 import copy
+import gc
 import logging
 import os
 import sys
 import time
+import random
+import threading
 import uuid
+import weakref
 import socket
 import unittest
 import warnings
@@ -501,6 +505,79 @@ class CoreTests(unittest.TestCase):
             self.assertIn('prop', dir(p))
             self.assertIn('ping', dir(p))
 
+    def testProxyRemoteMethodsChecked(self):
+        with Pyro4.core.Proxy("PYRO:9999@localhost:15555") as p:
+            p._pyroMethods = {"ping"}
+            self.assertIsInstance(p.ping, Pyro4.core._RemoteMethod)
+            self.assertEqual({"ping"}, p._Proxy__pyroCheckedMethods)
+            with self.assertRaises(AttributeError):
+                _ = p.pong
+            p._pyroMaxRetries = 3
+            self.assertEqual(3, p.ping._RemoteMethod__max_retries)
+            p._pyroAsync()
+            self.assertIsInstance(p.ping, Pyro4.core._AsyncRemoteMethod)
+            p._pyroAsync(False)
+            p._Proxy__processMetadata({"methods": ["pong"], "oneway": [], "attrs": []})
+            with self.assertRaises(AttributeError):
+                _ = p.ping
+            self.assertIsInstance(p.pong, Pyro4.core._RemoteMethod)
+
+    def testProxyFreedAfterMethodAccess(self):
+        p = Pyro4.core.Proxy("PYRO:9999@localhost:15555")
+        p._pyroMethods = {"ping"}
+        self.assertIsInstance(p.ping, Pyro4.core._RemoteMethod)
+        self.assertIsInstance(p.ping, Pyro4.core._RemoteMethod)
+        proxyref = weakref.ref(p)
+        gc.disable()
+        try:
+            del p
+            self.assertIsNone(proxyref(), "proxy must not be kept alive by a reference cycle")
+        finally:
+            gc.enable()
+
+    def testProxySerializerPerConnection(self):
+        serializer = config.SERIALIZER
+        with Pyro4.core.Proxy("PYRO:9999@localhost:15555") as p:
+            try:
+                resolved = p._Proxy__pyroGetSerializer()
+                self.assertIs(Pyro4.util.get_serializer(serializer), resolved)
+                p._pyroConnection = Pyro4.socketutil.SocketConnection(socket.socket())
+                config.SERIALIZER = "marshal"
+                self.assertIs(resolved, p._Proxy__pyroGetSerializer(), "the connection keeps its serializer")
+                p._pyroSerializer = "json"
+                self.assertIs(Pyro4.util.get_serializer("json"), p._Proxy__pyroGetSerializer())
+                p._pyroSerializer = None
+                self.assertIs(Pyro4.util.get_serializer("marshal"), p._Proxy__pyroGetSerializer())
+                config.SERIALIZER = serializer
+                self.assertIs(Pyro4.util.get_serializer("marshal"), p._Proxy__pyroGetSerializer())
+                p._pyroRelease()
+                self.assertIs(resolved, p._Proxy__pyroGetSerializer(), "a new connection uses the configured serializer")
+            finally:
+                config.SERIALIZER = serializer
+
+    def testHistogram(self):
+        histogram = Pyro4.core._Histogram()
+        values = list(range(1, 100001, 7))
+        random.shuffle(values)
+        for value in values:
+            histogram.record(value)
+        values.sort()
+        self.assertEqual(len(values), histogram.count)
+        self.assertEqual(1, histogram.min)
+        self.assertEqual(values[-1], histogram.max)
+        for percentile in [1, 50, 90, 99, 100]:
+            exact = values[int(percentile / 100.0 * len(values)) - 1]
+            self.assertAlmostEqual(exact, histogram.percentile(percentile), delta=exact * 0.035)
+        summary = histogram.summary(1000)
+        self.assertEqual(len(values), summary["count"])
+        self.assertAlmostEqual(sum(values) / 1000.0 / len(values), summary["mean"])
+        self.assertEqual(values[-1] / 1000.0, summary["max"])
+        histogram = Pyro4.core._Histogram()
+        for value in range(20):
+            histogram.record(value)
+        self.assertEqual(9, histogram.percentile(50), "small values are exact")
+        self.assertIsNone(Pyro4.core._Histogram().percentile(50))
+
     def testProxySettings(self):
         p1 = Pyro4.core.Proxy("PYRO:9999@localhost:15555")
         p2 = Pyro4.core.Proxy("PYRO:9999@localhost:15555")
@@ -671,6 +748,33 @@ class CoreTests(unittest.TestCase):
         self.assertEqual(corr_id2, Pyro4.core.current_context.correlation_id)
         Pyro4.core.current_context.correlation_id = None
 
+    def testCallContextThreadLocal(self):
+        corr_id = uuid.uuid4()
+        Pyro4.core.current_context.correlation_id = corr_id
+        Pyro4.core.current_context.annotations = {"XYZZ": b"main thread"}
+        seen = []
+
+        def other_thread():
+            seen.append((Pyro4.core.current_context.correlation_id, Pyro4.core.current_context.annotations))
+        try:
+            t = threading.Thread(target=other_thread)
+            t.start()
+            t.join()
+            if sys.version_info >= (3, 7):
+                # a thread running in a copy of this context must still start out with fresh values
+                import contextvars
+                context = contextvars.copy_context()
+                t = threading.Thread(target=context.run, args=(other_thread,))
+                t.start()
+                t.join()
+            for values in seen:
+                self.assertEqual((None, {}), values)
+            self.assertEqual(corr_id, Pyro4.core.current_context.correlation_id)
+            self.assertEqual({"XYZZ": b"main thread"}, Pyro4.core.current_context.annotations)
+        finally:
+            Pyro4.core.current_context.correlation_id = None
+            Pyro4.core.current_context.annotations = {}
+
 
 class ExposeDecoratorTests(unittest.TestCase):
     # note: the bulk of the tests for the @expose decorator are found in the test_util module
@@ -780,7 +884,10 @@ class RemoteMethodTests(unittest.TestCase):
         def _pyroBatch(self):
             return Pyro4.core._BatchProxyAdapter(self)
 
-        def _pyroInvokeBatch(self, calls, oneway=False):
+        def _pyroAsyncCheckout(self):
+            return self
+
+        def _pyroInvokeBatch(self, calls, oneway=False, parallel=False):
             self.result = []
             for methodname, args, kwargs in calls:
                 if methodname == "error":
@@ -807,6 +914,9 @@ class RemoteMethodTests(unittest.TestCase):
         def _pyroAsync(self, asynchronous=True):
             return self
 
+        def _pyroAsyncCheckout(self):
+            return self
+
         def __getattr__(self, item):
             return Pyro4.core._AsyncRemoteMethod(self, item, 5)
 
@@ -1158,6 +1268,224 @@ class TestFutures(unittest.TestCase):
         b = f.cancel()
         self.assertFalse(b)
 
+    def testFutureExecutor(self):
+        class Executor(object):
+            def __init__(self):
+                self.count = 0
+
+            def submit(self, call, *args):
+                self.count += 1
+                call(*args)
+
+        executor = Executor()
+        f = Pyro4.futures.Future(futurestestfunc, executor=executor)
+        result = f(4, 5)
+        self.assertTrue(result.ready)
+        self.assertEqual(9, result.value)
+        self.assertEqual(1, executor.count)
+        f = Pyro4.futures.Future(futurestestfunc, executor=executor)
+        f.delay(0.01)   # the scheduler submits it, also without a try_submit method on the executor
+        self.assertEqual(9, f(4, 5).value)
+        self.assertEqual(2, executor.count)
+
+    def testFutureWaitsForFuture(self):
+        workers, shared = config.ASYNC_WORKERS, Pyro4.futures._executor
+        config.ASYNC_WORKERS = 1
+        Pyro4.futures._executor = None
+        try:
+            other = []
+            gate = threading.Event()
+
+            def waiter():
+                gate.wait(2)
+                return other[0].value + 1
+
+            result = Pyro4.futures.Future(waiter)()
+            other.append(Pyro4.futures.Future(lambda: 41)())
+            gate.set()
+            self.assertTrue(result.wait(2), "futures must not wait for each other's thread")
+            self.assertEqual(42, result.value)
+            self.assertIsNone(Pyro4.futures._executor, "futures don't use the shared executor by default")
+        finally:
+            config.ASYNC_WORKERS = workers
+            Pyro4.futures._executor = shared
+
+    def testFutureDelayChanged(self):
+        f = Pyro4.futures.Future(futurestestfunc)
+        f.delay(10)
+        begin = time.time()
+        result = f(4, 5)
+        self.assertTrue(f.delay(0.1))   # reschedules the call
+        self.assertEqual(9, result.value)
+        self.assertLess(time.time() - begin, 1.0)
+
+    def testFutureResultDoneCallback(self):
+        called = []
+        result = Pyro4.futures.FutureResult()
+        result.add_done_callback(called.append)
+        self.assertEqual([], called)
+        result.value = 42
+        self.assertEqual([result], called)
+        result.add_done_callback(called.append)
+        self.assertEqual([result, result], called)
+
+    def testGather(self):
+        results = [Pyro4.futures.Future(futurestestfunc)(i, 1) for i in range(10)]
+        gathered = Pyro4.futures.FutureResult.gather(results)
+        self.assertEqual(list(range(1, 11)), gathered.value)
+        results = [Pyro4.futures.Future(futurestestfunc)(1, 1), Pyro4.futures.Future(crashingfuturestestfunc)(1)]
+        gathered = Pyro4.futures.FutureResult.gather(results)
+        self.assertRaises(ZeroDivisionError, lambda: gathered.value)
+        self.assertEqual([], Pyro4.futures.FutureResult.gather([]).value)
+        never = Pyro4.futures.FutureResult()
+        gathered = Pyro4.futures.FutureResult.gather([never], timeout=0.1)
+        self.assertRaises(Pyro4.errors.TimeoutError, lambda: gathered.value)
+        never.value = 42    # too late
+
+    def testWithTimeout(self):
+        result = Pyro4.futures.FutureResult()
+        self.assertRaises(Pyro4.errors.TimeoutError, lambda: result.with_timeout(0.1).value)
+        result = Pyro4.futures.FutureResult()
+        timed = result.with_timeout(1.0)
+        result.value = 42
+        self.assertEqual(42, timed.value)
+
+    def testWaitAnyAll(self):
+        slow = Pyro4.futures.Future(futurestestfunc)
+        slow.delay(0.5)
+        slow = slow(1, 1)
+        fast = Pyro4.futures.Future(futurestestfunc)(2, 2)
+        self.assertIs(fast, Pyro4.futures.FutureResult.wait_any([slow, fast]))
+        self.assertFalse(Pyro4.futures.FutureResult.wait_all([slow, fast], timeout=0.1))
+        self.assertTrue(Pyro4.futures.FutureResult.wait_all([slow, fast], timeout=2))
+        self.assertIsNone(Pyro4.futures.FutureResult.wait_any([Pyro4.futures.FutureResult()], timeout=0.1))
+        # the results that didn't win don't keep the callback of wait_any
+        never = Pyro4.futures.FutureResult()
+        self.assertIsNone(Pyro4.futures.FutureResult.wait_any([never], timeout=0.01))
+        self.assertEqual([], never._FutureResult__callbacks)
+        self.assertIs(fast, Pyro4.futures.FutureResult.wait_any([never, fast]))
+        self.assertEqual([], never._FutureResult__callbacks)
+        callback = lambda result: None
+        never.add_done_callback(callback)
+        never.remove_done_callback(callback)
+        never.remove_done_callback(callback)
+        self.assertEqual([], never._FutureResult__callbacks)
+
+    def testAsCompleted(self):
+        futures = [Pyro4.futures.Future(futurestestfunc) for _ in range(3)]
+        for delay, future in zip([0.4, 0, 0.2], futures):
+            future.delay(delay)
+        results = [future(i, 0) for i, future in enumerate(futures)]
+        self.assertEqual([1, 2, 0], [result.value for result in Pyro4.futures.FutureResult.as_completed(results)])
+        never = Pyro4.futures.FutureResult()
+        completed = Pyro4.futures.FutureResult.as_completed([results[0], never], timeout=0.2)
+        self.assertIs(results[0], next(completed))
+        self.assertRaises(Pyro4.errors.TimeoutError, next, completed)
+
+    @unittest.skipIf(sys.version_info < (3, 2), "concurrent.futures requires python 3.2+")
+    def testConcurrentFutureAdapter(self):
+        import concurrent.futures
+        future = Pyro4.futures.Future(futurestestfunc)(4, 5).to_concurrent_future()
+        self.assertIsInstance(future, concurrent.futures.Future)
+        self.assertEqual(9, future.result(timeout=2))
+        future = Pyro4.futures.Future(crashingfuturestestfunc)(1).to_concurrent_future()
+        self.assertIsInstance(future.exception(timeout=2), ZeroDivisionError)
+
+    @unittest.skipIf(sys.version_info < (3, 5), "asyncio adapter requires python 3.5+")
+    def testAsyncioFutureAdapter(self):
+        import asyncio
+        loop = asyncio.new_event_loop()
+        try:
+            future = Pyro4.futures.Future(futurestestfunc)(4, 5).to_asyncio_future(loop)
+            self.assertEqual(9, loop.run_until_complete(asyncio.wait_for(future, 2)))
+            future = Pyro4.futures.Future(crashingfuturestestfunc)(1).to_asyncio_future(loop)
+            self.assertRaises(ZeroDivisionError, loop.run_until_complete, future)
+        finally:
+            loop.close()
+
+    def testBoundedExecutor(self):
+        executor = Pyro4.futures.BoundedExecutor(max_workers=3, max_queue=2)
+        results = []
+        lock = threading.Lock()
+        release = threading.Event()
+
+        def task(value):
+            release.wait()
+            with lock:
+                results.append(value)
+
+        for i in range(5):
+            executor.submit(task, i)    # 3 workers busy, 2 calls in the queue
+        self.assertEqual(3, executor.workers)
+        queued = threading.Thread(target=executor.submit, args=(task, 5))
+        queued.start()
+        queued.join(0.2)
+        self.assertTrue(queued.is_alive(), "submit must block when the queue is full")
+        release.set()
+        queued.join()
+        executor.submit(lambda: 1 // 0)     # errors are logged, the worker continues
+        executor.shutdown()
+        self.assertEqual(list(range(6)), sorted(results))
+        self.assertEqual(0, executor.workers)
+        self.assertRaises(RuntimeError, executor.submit, task, 6)
+
+    def testBoundedExecutorNestedSubmit(self):
+        executor = Pyro4.futures.BoundedExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+        results = []
+
+        def inner(value):
+            results.append(value)
+
+        def outer():
+            # the only worker is busy with this call and the queue is full,
+            # the calls submitted from here must still run (and not block) while it waits for them
+            executor.submit(release.wait)
+            executor.submit(inner, 1)
+            self.assertTrue(executor.try_submit(inner, 2))
+            done = threading.Event()
+            executor.submit(done.set)
+            done.wait(2)
+            results.append("done" if done.is_set() else "not done")
+            release.wait()
+
+        executor.submit(outer)
+        executor.submit(release.wait)
+        self.assertFalse(executor.try_submit(inner, 3))
+        try:
+            for _ in range(200):
+                if len(results) == 3:
+                    break
+                time.sleep(0.01)
+            self.assertEqual({1, 2, "done"}, set(results))
+            self.assertEqual(1, executor.workers)
+        finally:
+            release.set()
+            executor.shutdown()
+
+    def testScheduledSubmitDoesntBlock(self):
+        executor = Pyro4.futures.BoundedExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+        done = threading.Event()
+        executor.submit(release.wait)
+        time.sleep(0.05)
+        executor.submit(release.wait)       # the worker is busy and the queue is full now
+        self.assertFalse(executor.try_submit(done.set))
+        Pyro4.futures._scheduler.schedule_submit(0, executor, done.set)
+        # the timer thread must still run other scheduled calls
+        timer_ran = threading.Event()
+        Pyro4.futures._scheduler.schedule(0.05, timer_ran.set)
+        self.assertTrue(timer_ran.wait(1), "timer thread must not block on a full executor queue")
+        self.assertFalse(done.is_set())
+        release.set()
+        self.assertTrue(done.wait(2), "overflowed submit must be retried")
+        executor.shutdown()
+
+    def testSharedExecutor(self):
+        executor = Pyro4.futures.get_executor()
+        self.assertIs(executor, Pyro4.futures.get_executor())
+        self.assertEqual(config.ASYNC_WORKERS, executor.max_workers)
+
 
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
@@ -413,6 +413,31 @@ class DaemonTests(unittest.TestCase):
             self.assertEqual(Pyro4.message.MSG_CONNECTOK, msg.type)
             self.assertEqual(99, msg.seq)
 
+    def testHandshakeHmacNegotiation(self):
+        conn = ConnectionMock()
+        with Pyro4.core.Daemon(port=0) as d:
+            d._pyroHmacKey = b"secret"
+            try:
+                config.HMAC_DIGEST = "sha256"
+                config.SSL_SKIP_HMAC = True
+                ser = Pyro4.util.get_serializer_by_id(Pyro4.util.MarshalSerializer.serializer_id)
+                data, _ = ser.serializeData({"handshake": "hello", "object": Pyro4.constants.DAEMON_NAME}, False)
+                annotations = {"HMCA": Pyro4.message.get_hmac_digest_ids(), "NOHM": b""}
+                msg = Pyro4.message.Message(Pyro4.message.MSG_CONNECT, data, ser.serializer_id, 0, 99,
+                                            annotations=annotations, hmac_key=b"secret")
+                msg.send(conn)
+                self.assertTrue(d._handshake(conn))
+                msg = Pyro4.message.Message.recv(conn, hmac_key=b"secret")
+                self.assertEqual(Pyro4.message.MSG_CONNECTOK, msg.type)
+                self.assertEqual("sha1", msg.hmac_digest)   # the handshake itself always uses sha1
+                self.assertEqual(Pyro4.message.get_hmac_digest_ids(), msg.annotations["HMCA"])
+                self.assertNotIn("NOHM", msg.annotations)   # not an SSL connection, so hmac can't be skipped
+                self.assertEqual("sha256", conn.hmac_digest)
+                self.assertFalse(conn.hmac_skip)
+            finally:
+                config.HMAC_DIGEST = "sha1"
+                config.SSL_SKIP_HMAC = False
+
     def testHandshakeDenied(self):
         class HandshakeFailDaemon(Pyro4.core.Daemon):
             def validateHandshake(self, conn, data):
@@ -659,8 +684,8 @@ class MetaInfoTests(unittest.TestCase):
             daemon_obj = d.objectsById[Pyro4.constants.DAEMON_NAME]
             self.assertTrue(len(daemon_obj.info()) > 10)
             meta = daemon_obj.get_metadata(Pyro4.constants.DAEMON_NAME)
-            self.assertEqual({"get_metadata", "get_next_stream_item", "close_stream",
-                              "info", "ping", "registered"}, meta["methods"])
+            self.assertEqual({"get_metadata", "get_next_stream_item", "get_next_stream_items", "close_stream",
+                              "push_stream", "info", "ping", "registered"}, meta["methods"])
 
     def testMetaSerialization(self):
         with Pyro4.core.Daemon() as d:
@@ -706,6 +731,22 @@ class MetaInfoTests(unittest.TestCase):
             meta = daemon_obj.get_metadata(uri.object)
             self.assertIn("newly_added_method_two", meta["methods"])
 
+    def testParallelBatchContext(self):
+        config.BATCH_WORKERS = 1
+        try:
+            with Pyro4.core.Daemon(port=0) as d:
+                current_context.correlation_id = corr_id = uuid.uuid4()
+                try:
+                    calls = [(lambda: current_context.correlation_id, (), {})] * 3
+                    self.assertEqual([corr_id] * 3, d._Daemon__parallelBatch(calls))
+                finally:
+                    current_context.correlation_id = None
+                # the worker thread must not keep the context of the batch
+                calls = [(lambda: current_context.correlation_id, (), {})]
+                self.assertEqual([None], d._Daemon__parallelBatch(calls))
+        finally:
+            config.BATCH_WORKERS = 16
+
 
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
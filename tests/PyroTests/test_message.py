@@ -6,6 +6,7 @@ Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 
 import hashlib
 import hmac
+import struct
 import unittest
 import zlib
 import Pyro4.message
@@ -110,6 +111,26 @@ class MessageTestsHmac(unittest.TestCase):
         except Pyro4.errors.ProtocolError:
             pass
 
+    def testSendVectored(self):
+        class SendmsgConnectionMock(ConnectionMock):
+            def sendmsg(self, buffers):
+                self.parts = list(buffers)
+                self.received += b"".join(buffers)
+        msg = Message(Pyro4.message.MSG_INVOKE, b"hello", self.ser.serializer_id, 0, 0, {"TEST": b"abcde"}, b"secret")
+        c = SendmsgConnectionMock()
+        msg.send(c)
+        self.assertEqual(3, len(c.parts))
+        self.assertEqual(msg.to_bytes(), c.received)
+        msg = Message.recv(c, hmac_key=b"secret")
+        self.assertEqual(b"hello", msg.data)
+        self.assertEqual(b"abcde", msg.annotations["TEST"])
+        msg = Message(Pyro4.message.MSG_INVOKE, b"", self.ser.serializer_id, 0, 0)
+        msg.send(c)
+        self.assertEqual(1, len(c.parts), "no annotations and no data so only the header should be sent")
+        c = ConnectionMock()
+        msg.send(c)
+        self.assertEqual(msg.to_bytes(), c.received, "connection without sendmsg should get all bytes at once")
+
     def testRecvAnnotations(self):
         annotations = {"TEST": b"abcde"}
         msg = Message(Pyro4.message.MSG_CONNECT, b"hello", self.ser.serializer_id, 0, 0, annotations, b"secret")
@@ -122,6 +143,58 @@ class MessageTestsHmac(unittest.TestCase):
         self.assertEqual(b"abcde", msg.annotations["TEST"])
         self.assertIn("HMAC", msg.annotations)
 
+    def testRecvAnnotationsAndData(self):
+        class RecvCountingConnectionMock(ConnectionMock):
+            recv_calls = 0
+
+            def recv(self, datasize):
+                self.recv_calls += 1
+                return super(RecvCountingConnectionMock, self).recv(datasize)
+        for data, recv_calls in [(b"x" * 100, 2), (b"x" * (Message.small_data_size + 1), 3)]:
+            c = RecvCountingConnectionMock()
+            Message(Pyro4.message.MSG_RESULT, data, self.ser.serializer_id, 0, 0, {"TEST": b"abcde"}).send(c)
+            msg = Message.recv(c)
+            self.assertEqual(recv_calls, c.recv_calls, "small data should be received together with the annotations")
+            self.assertEqual(data, msg.data)
+            self.assertEqual({"TEST": b"abcde"}, msg.annotations)
+            self.assertEqual(0, len(c.received))
+
+    def testHmacDigests(self):
+        c = ConnectionMock()
+        for digest in ["sha1", "sha256", "sha512", "blake2b", "blake2s"]:
+            if not hasattr(hashlib, digest):
+                continue
+            msg = Message(Pyro4.message.MSG_RESULT, b"test", 42, 0, 1, {"TEST": b"abcde"}, hmac_key=b"secret", hmac_digest=digest)
+            expected = hmac.new(b"secret", b"test" + b"abcde", digestmod=getattr(hashlib, digest)).digest()
+            if digest == "sha1":
+                self.assertEqual(expected, msg.annotations["HMAC"])
+            else:
+                self.assertEqual(expected, msg.annotations["HMAC"][1:])
+                self.assertNotEqual(20, len(msg.annotations["HMAC"]))
+            msg.send(c)
+            msg = Message.recv(c, hmac_key=b"secret")
+            self.assertEqual(digest, msg.hmac_digest)
+            self.assertEqual(b"test", msg.data)
+            msg = Message(Pyro4.message.MSG_RESULT, b"test", 42, 0, 1, hmac_key=b"secret", hmac_digest=digest)
+            msg.send(c)
+            self.assertRaises(Pyro4.errors.SecurityError, Message.recv, c, hmac_key=b"wrong key")
+        msg = Message(Pyro4.message.MSG_RESULT, b"test", 42, 0, 1, {"HMAC": b"\xffunknown digest algorithm"})
+        msg.send(c)
+        self.assertRaises(Pyro4.errors.SecurityError, Message.recv, c, hmac_key=b"secret")
+
+    def testNegotiateHmacDigest(self):
+        ids = Pyro4.message.get_hmac_digest_ids()
+        self.assertIn(b"\x01", ids)
+        try:
+            config.HMAC_DIGEST = "sha256"
+            self.assertEqual("sha256", Pyro4.message.negotiate_hmac_digest(ids))
+            self.assertEqual("sha1", Pyro4.message.negotiate_hmac_digest(b"\x01"))
+            self.assertEqual("sha1", Pyro4.message.negotiate_hmac_digest(None))
+            config.HMAC_DIGEST = "foobar"
+            self.assertRaises(Pyro4.errors.SecurityError, Pyro4.message.negotiate_hmac_digest, ids)
+        finally:
+            config.HMAC_DIGEST = "sha1"
+
     def testProtocolVersion(self):
         version = Pyro4.constants.PROTOCOL_VERSION
         Pyro4.constants.PROTOCOL_VERSION = 0  # fake invalid protocol version number
@@ -192,6 +265,41 @@ class MessageTestsHmac(unittest.TestCase):
         self.assertEqual(0, msg.flags)
         self.assertGreater(msg.data_size, data_size)
 
+    def testCompressorAnnotation(self):
+        data = b"The quick brown fox jumps over the lazy dog."*10
+        zlib_compressor = Pyro4.util.get_compressor("zlib")
+        bz2_compressor = Pyro4.util.get_compressor("bz2")
+        flags = Pyro4.message.FLAGS_COMPRESSED
+        msg = Message(Pyro4.message.MSG_INVOKE, zlib_compressor.compress(data), 42, flags, 1, compressor=zlib_compressor)
+        self.assertNotIn("CMPR", msg.annotations)   # zlib is the default, no annotation needed
+        self.assertIs(zlib_compressor, msg.compressor)
+        msg = Message(Pyro4.message.MSG_INVOKE, bz2_compressor.compress(data), 42, flags, 1, hmac_key=b"secret", compressor=bz2_compressor)
+        self.assertEqual(b"\x02", msg.annotations["CMPR"])
+        c = ConnectionMock()
+        msg.send(c)
+        msg = Message.recv(c, hmac_key=b"secret")
+        self.assertIs(bz2_compressor, msg.compressor)
+        msg.decompress_if_needed()
+        self.assertEqual(data, msg.data)
+        self.assertIsNone(msg.compressor)
+        # a stale compressor annotation is removed when the data isn't compressed
+        msg = Message(Pyro4.message.MSG_INVOKE, data, 42, 0, 1, annotations={"CMPR": b"\x02"}, compressor=bz2_compressor)
+        self.assertNotIn("CMPR", msg.annotations)
+
+    def testStreamCompression(self):
+        compressor = Pyro4.util.get_compressor("zlib-stream").for_connection()
+        flags = Pyro4.message.FLAGS_COMPRESSED
+        c = ConnectionMock()
+        for i in range(3):
+            data = b"The quick brown fox jumps over the lazy dog #%d" % i
+            Message(Pyro4.message.MSG_INVOKE, compressor.compress(data), 42, flags, i, compressor=compressor).send(c)
+        for i in range(3):
+            msg = Message.recv(c)   # stream compressed data must be decompressed right away, in order
+            self.assertEqual(b"The quick brown fox jumps over the lazy dog #%d" % i, msg.data)
+            self.assertEqual(0, msg.flags)
+            self.assertIsNone(msg.compressor)
+        self.assertIsInstance(c.decompressor, Pyro4.util.ZlibStreamCompressor)
+
 
 class MessageTestsNoHmac(unittest.TestCase):
     def testRecvNoAnnotations(self):
@@ -218,7 +326,75 @@ class MessageTestsNoHmac(unittest.TestCase):
             msg.to_bytes()
         self.assertEqual("invalid message size (outside range 0..2Gb)", str(ex.exception))
 
+    def testFragments(self):
+        class FragmentsConnectionMock(ConnectionMock):
+            fragments = True
+            frames = 0
+            def send(self, data):
+                self.frames += 1
+                self.received += data
+        data = bytes(bytearray(range(256))) * 40
+        try:
+            config.FRAGMENT_SIZE = 1000
+            msg = Message(Pyro4.message.MSG_RESULT, data, 42, 0, 99, {"TEST": b"abcde"}, hmac_key=b"secret")
+            c = FragmentsConnectionMock()
+            msg.send(c)
+            self.assertEqual(11, c.frames)
+            self.assertGreater(len(c.received), len(msg.to_bytes()))
+            msg = Message.recv(c, hmac_key=b"secret")
+            self.assertEqual(0, len(c.received))
+            self.assertEqual(data, msg.data)
+            self.assertEqual(len(data), msg.data_size)
+            self.assertEqual(0, msg.flags)
+            self.assertEqual(99, msg.seq)
+            self.assertEqual(b"abcde", msg.annotations["TEST"])
+            self.assertNotIn("FRAG", msg.annotations)
+            # a connection that doesn't support fragments gets the message in one frame
+            c = ConnectionMock()
+            Message(Pyro4.message.MSG_RESULT, data, 42, 0, 99).send(c)
+            self.assertEqual(Message(Pyro4.message.MSG_RESULT, data, 42, 0, 99).to_bytes(), c.received)
+            # total size is checked against the max message size
+            c = FragmentsConnectionMock()
+            c.close = lambda: None
+            Message(Pyro4.message.MSG_RESULT, data, 42, 0, 99).send(c)
+            config.MAX_MESSAGE_SIZE = 5000
+            self.assertRaises(Pyro4.errors.MessageTooLargeError, Message.recv, c)
+        finally:
+            config.FRAGMENT_SIZE = 64 * 1024 * 1024
+            config.MAX_MESSAGE_SIZE = 0
+
+    def testFragmentsOutOfSequence(self):
+        class FragmentsConnectionMock(ConnectionMock):
+            fragments = True
+        try:
+            config.FRAGMENT_SIZE = 1000
+            c = FragmentsConnectionMock()
+            Message(Pyro4.message.MSG_RESULT, b"x" * 2500, 42, 0, 99).send(c)
+            Message(Pyro4.message.MSG_RESULT, b"x" * 2500, 42, 0, 100).send(c)
+            received = c.received
+            c.received = received[:24 + 14 + 1000] + received[24 * 3 + 14 + 2500:]   # first fragment, then the next message
+            self.assertRaises(Pyro4.errors.ProtocolError, Message.recv, c)
+        finally:
+            config.FRAGMENT_SIZE = 64 * 1024 * 1024
+
 
+    def testFragmentsForgedTotalSize(self):
+        class FragmentsConnectionMock(ConnectionMock):
+            fragments = True
+        try:
+            config.FRAGMENT_SIZE = 1000
+            c = FragmentsConnectionMock()
+            Message(Pyro4.message.MSG_RESULT, b"x" * 2500, 42, 0, 99).send(c)
+            frag = c.received.index(b"FRAG") + 6
+            # the announced total size must not be allocated before the data has arrived
+            c.received = c.received[:frag] + struct.pack("!Q", 2 ** 62) + c.received[frag + 8:]
+            self.assertRaises(Pyro4.errors.ConnectionClosedError, Message.recv, c)
+            c = FragmentsConnectionMock()
+            Message(Pyro4.message.MSG_RESULT, b"x" * 2500, 42, 0, 99).send(c)
+            c.received = c.received[:frag] + struct.pack("!Q", 1500) + c.received[frag + 8:]
+            self.assertRaises(Pyro4.errors.ProtocolError, Message.recv, c)
+        finally:
+            config.FRAGMENT_SIZE = 64 * 1024 * 1024
 
 if __name__ == "__main__":
     unittest.main()
@@ -5,9 +5,12 @@ Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 """
 
 import time
+import socket
 import threading
+import uuid
 import unittest
 import Pyro4.core
+import Pyro4.futures
 import Pyro4.naming
 import Pyro4.socketutil
 import Pyro4.constants
@@ -45,6 +48,45 @@ class BCSetupTests(unittest.TestCase):
         bcserver.close()
 
 
+@Pyro4.core.expose
+class Replica(object):
+    def __init__(self, name):
+        self.name = name
+        self.stall = 0
+
+    def whoami(self):
+        return self.name
+
+    @Pyro4.core.idempotent
+    def answer(self):
+        if self.stall:
+            time.sleep(self.stall)
+            self.stall = 0
+        return self.name
+
+    def set_stall(self, seconds):
+        self.stall = seconds
+
+
+class ReplicaDaemon(Pyro4.core.Daemon):
+    """Daemon that can be killed: it also drops the connections of its clients, like a process that died."""
+    def __init__(self):
+        super(ReplicaDaemon, self).__init__()
+        self.connections = []
+
+    def validateHandshake(self, conn, data):
+        self.connections.append(conn)
+        return super(ReplicaDaemon, self).validateHandshake(conn, data)
+
+    def kill(self):
+        self.shutdown()
+        for conn in self.connections:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except (socket.error, OSError):
+                pass
+
+
 class NameServerTests(unittest.TestCase):
     def setUp(self):
         config.POLLTIMEOUT = 0.1
@@ -187,6 +229,181 @@ class NameServerTests(unittest.TestCase):
         self.assertRaises(NamingError, Pyro4.naming.resolve, "PYRONAME:unknown_object@" + host)
         self.assertRaises(TypeError, Pyro4.naming.resolve, 999)  # wrong arg type
 
+    def testResolveCache(self):
+        host = "[" + self.nsUri.host + "]" if ":" in self.nsUri.host else self.nsUri.host
+        with Pyro4.naming.locateNS(self.nsUri.host, self.nsUri.port) as ns:
+            ns.register("unittest.cached", "PYRO:dead@localhost:1", metadata={"unittest.meta"})
+            try:
+                Pyro4.core.clear_resolve_cache()
+                config.NS_LOOKUP_CACHE_TTL = 10
+                config.NS_LOOKUP_NEGATIVE_TTL = 10
+                self.assertEqual("PYRO:dead@localhost:1", str(Pyro4.naming.resolve("PYRONAME:unittest.cached@" + host)))
+                self.assertEqual("PYRO:dead@localhost:1", str(Pyro4.naming.resolve("PYROMETA:unittest.meta@" + host)))
+                ns.register("unittest.cached", "PYRO:alive@localhost:2", safe=False)
+                self.assertEqual("PYRO:dead@localhost:1", str(Pyro4.naming.resolve("PYRONAME:unittest.cached@" + host)))
+                self.assertEqual({"hits": 1, "negative_hits": 0, "misses": 2, "invalidations": 0, "size": 2},
+                                 Pyro4.core.resolve_cache_stats())
+                # failing to connect to the cached location drops it from the cache
+                with Pyro4.core.Proxy("PYRONAME:unittest.cached@" + host) as p:
+                    self.assertRaises(CommunicationError, p._pyroBind)
+                stats = Pyro4.core.resolve_cache_stats()
+                self.assertEqual(2, stats["invalidations"])
+                self.assertEqual(0, stats["size"])
+                self.assertEqual("PYRO:alive@localhost:2", str(Pyro4.naming.resolve("PYRONAME:unittest.cached@" + host)))
+                # failed lookups are cached too
+                self.assertRaises(NamingError, Pyro4.naming.resolve, "PYRONAME:unittest.unknown@" + host)
+                ns.register("unittest.unknown", "PYRO:unknown@localhost:3")
+                self.assertRaises(NamingError, Pyro4.naming.resolve, "PYRONAME:unittest.unknown@" + host)
+                self.assertEqual(1, Pyro4.core.resolve_cache_stats()["negative_hits"])
+                Pyro4.core.clear_resolve_cache()
+                self.assertEqual("PYRO:unknown@localhost:3", str(Pyro4.naming.resolve("PYRONAME:unittest.unknown@" + host)))
+            finally:
+                config.NS_LOOKUP_CACHE_TTL = 0.0
+                config.NS_LOOKUP_NEGATIVE_TTL = 0.0
+                Pyro4.core.clear_resolve_cache()
+                ns.remove(prefix="unittest.")
+
+    def testLocateCache(self):
+        Pyro4.core._ns_locator.clear()
+        config.NS_LOCATE_CACHE = True
+        try:
+            with Pyro4.naming.locateNS() as ns:
+                uri = ns._pyroUri
+            shared = Pyro4.core._ns_locator.shared(None, None, None)
+            self.assertIs(shared, Pyro4.core._ns_locator.shared(None, None, None))
+            self.assertEqual(uri, Pyro4.naming.resolve("PYRONAME:" + Pyro4.constants.NAMESERVER_NAME))
+            # without broadcast responder, the name server is still found at the remembered location
+            self.bcserver.close()
+            start = time.time()
+            with Pyro4.naming.locateNS() as ns:
+                self.assertEqual(uri, ns._pyroUri)
+            self.assertLess(time.time() - start, 0.5)
+            # a failed broadcast is remembered, and skipped the next time
+            Pyro4.core._ns_locator.forget(Pyro4.core._ns_locator.key(None, None, True))
+            with Pyro4.naming.locateNS() as ns:
+                self.assertEqual(uri, ns._pyroUri)
+            self.assertTrue(Pyro4.core._ns_locator.broadcast_failed(config.NS_BCPORT))
+            Pyro4.core._ns_locator.forget(Pyro4.core._ns_locator.key(None, None, True))
+            start = time.time()
+            with Pyro4.naming.locateNS() as ns:
+                self.assertEqual(uri, ns._pyroUri)
+            self.assertLess(time.time() - start, 0.5)
+            # when the name server has gone away, the shared proxies are discarded and it is located again
+            Pyro4.core._ns_locator.discard(shared)
+            self.assertIsNot(shared, Pyro4.core._ns_locator.shared(None, None, None))
+        finally:
+            config.NS_LOCATE_CACHE = False
+            Pyro4.core._ns_locator.clear()
+
+    def testLocateBroadcastAfterFailure(self):
+        # with the default config, a failed broadcast is not remembered: the next locate broadcasts again
+        Pyro4.core._ns_locator.clear()
+        bcport = self.bcserver.getPort()
+        self.bcserver.close()
+        config.NS_PORT = Pyro4.socketutil.findProbablyUnusedPort()     # only the broadcast can find the name server
+        self.assertRaises(NamingError, Pyro4.naming.locateNS)
+        self.assertFalse(Pyro4.core._ns_locator.broadcast_failed(bcport))
+        fakeUri = Pyro4.core.URI("PYRO:%s@localhost:%d" % (Pyro4.constants.NAMESERVER_NAME, config.NS_PORT))
+        self.bcserver = Pyro4.naming.BroadcastServer(fakeUri, bcport=bcport)
+        self.bcserver.runInThread()
+        with Pyro4.naming.locateNS() as ns:
+            self.assertEqual(fakeUri, ns._pyroUri, "must have been found by a broadcast")
+
+    def testLoadBalancedProxy(self):
+        host = "[" + self.nsUri.host + "]" if ":" in self.nsUri.host else self.nsUri.host
+        daemons = {}
+
+        def start_replica(name):
+            daemon = ReplicaDaemon()
+            uri = daemon.register(Replica(name))
+            thread = threading.Thread(target=daemon.requestLoop)
+            thread.daemon = True
+            thread.start()
+            daemons[name] = (daemon, thread)
+            ns.register("unittest.replica." + name, uri, metadata={"unittest.replicated"})
+
+        with Pyro4.naming.locateNS(self.nsUri.host, self.nsUri.port) as ns:
+            try:
+                start_replica("one")
+                start_replica("two")
+                with Pyro4.core.LoadBalancedProxy("PYROMETA:unittest.replicated@" + host) as lb:
+                    self.assertEqual({"one", "two"}, set(lb.whoami() for _ in range(10)))
+                    self.assertEqual(2, len(lb.replicas))
+                    self.assertEqual(10, sum(replica["calls"] for replica in lb.replicas))
+                    # calls fail over to the remaining replica
+                    daemon, thread = daemons.pop("one")
+                    daemon.kill()
+                    thread.join()
+                    self.assertEqual(["two"] * 5, [lb.whoami() for _ in range(5)])
+                    # membership changes are picked up when the replicas are looked up again
+                    ns.remove("unittest.replica.one")
+                    start_replica("three")
+                    lb.refresh()
+                    self.assertEqual({"two", "three"}, set(lb.whoami() for _ in range(10)))
+                    self.assertEqual(2, len(lb.replicas))
+                    self.assertEqual(0, sum(replica["outstanding"] for replica in lb.replicas))
+                self.assertRaises(Pyro4.errors.PyroError, lb.whoami)
+            finally:
+                for daemon, thread in daemons.values():
+                    daemon.shutdown()
+                    thread.join()
+                ns.remove(prefix="unittest.")
+
+    def testHedgedCalls(self):
+        host = "[" + self.nsUri.host + "]" if ":" in self.nsUri.host else self.nsUri.host
+        daemons = []
+        with Pyro4.naming.locateNS(self.nsUri.host, self.nsUri.port) as ns:
+            try:
+                for name in ("one", "two"):
+                    daemon = Pyro4.core.Daemon()
+                    uri = daemon.register(Replica(name))
+                    thread = threading.Thread(target=daemon.requestLoop)
+                    thread.daemon = True
+                    thread.start()
+                    daemons.append((daemon, thread))
+                    ns.register("unittest.replica." + name, uri, metadata={"unittest.replicated"})
+                with Pyro4.core.LoadBalancedProxy("PYROMETA:unittest.replicated@" + host, hedge=90) as lb:
+                    for _ in range(30):
+                        lb.answer()
+                        lb.whoami()
+                    stats = lb.hedge_stats
+                    # stall the replica that gets the next call: the call is answered by the other one
+                    replica = min(lb.replicas, key=lambda replica: replica["latency"])
+                    with Pyro4.core.Proxy(replica["uri"]) as p:
+                        stalled = p.whoami()
+                        p.set_stall(2)
+                    start = time.time()
+                    self.assertNotEqual(stalled, lb.answer())
+                    self.assertLess(time.time() - start, 1)
+                    self.assertEqual({"hedged": stats["hedged"] + 1, "won": stats["won"] + 1}, lb.hedge_stats)
+                    # the backup call runs on the executor, the worker thread doesn't keep its call context
+                    executor = Pyro4.futures.BoundedExecutor(max_workers=1)
+                    original_executor, Pyro4.futures._executor = Pyro4.futures._executor, executor
+                    try:
+                        for replica in lb.replicas:
+                            with Pyro4.core.Proxy(replica["uri"]) as p:
+                                p.set_stall(0.5)
+                        Pyro4.core.current_context.correlation_id = uuid.uuid4()
+                        try:
+                            lb.answer()
+                        finally:
+                            Pyro4.core.current_context.correlation_id = None
+                        self.assertEqual(1, executor.workers)
+                        result = Pyro4.futures.Future(lambda: Pyro4.core.current_context.correlation_id, executor)()
+                        self.assertIsNone(result.value)
+                        # a hedged call done by the only worker of the executor must not wait for that executor
+                        result = Pyro4.futures.Future(lb.answer, executor)()
+                        self.assertTrue(result.wait(3))
+                        self.assertIn(result.value, ("one", "two"))
+                    finally:
+                        Pyro4.futures._executor = original_executor
+                        executor.shutdown()
+            finally:
+                for daemon, thread in daemons:
+                    daemon.shutdown()
+                    thread.join()
+                ns.remove(prefix="unittest.")
+
     def testRefuseDottedNames(self):
         old_metadata = config.METADATA
         config.METADATA = False
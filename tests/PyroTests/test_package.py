@@ -42,9 +42,13 @@ class TestPackage(unittest.TestCase):
     def testPyro4(self):
         self.assertIs(Pyro4.core.Daemon, Pyro4.Daemon)
         self.assertIs(Pyro4.core.Proxy, Pyro4.Proxy)
+        self.assertIs(Pyro4.core.ProxyPool, Pyro4.ProxyPool)
+        self.assertIs(Pyro4.core.LoadBalancedProxy, Pyro4.LoadBalancedProxy)
         self.assertIs(Pyro4.core.URI, Pyro4.URI)
         self.assertIs(Pyro4.core.callback, Pyro4.callback)
         self.assertIs(Pyro4.core.oneway, Pyro4.oneway)
+        self.assertIs(Pyro4.core.cacheable, Pyro4.cacheable)
+        self.assertIs(Pyro4.core.idempotent, Pyro4.idempotent)
         self.assertIs(Pyro4.core.asyncproxy, Pyro4.asyncproxy)
         self.assertIs(Pyro4.core.batch, Pyro4.batch)
         self.assertIs(Pyro4.core.expose, Pyro4.expose)
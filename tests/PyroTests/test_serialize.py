@@ -841,6 +841,103 @@ class GenericTests(unittest.TestCase):
         self.assertRaises(Pyro4.errors.SerializeError, lambda: Pyro4.util.get_serializer_by_id(0))
         self.assertRaises(Pyro4.errors.SerializeError, lambda: Pyro4.util.get_serializer_by_id(8))
 
+    def testAssignedCompressorIds(self):
+        self.assertEqual(1, Pyro4.util.ZlibCompressor.compressor_id)
+        self.assertEqual(2, Pyro4.util.Bz2Compressor.compressor_id)
+        self.assertEqual(3, Pyro4.util.LzmaCompressor.compressor_id)
+        self.assertEqual(4, Pyro4.util.Lz4Compressor.compressor_id)
+        self.assertEqual(5, Pyro4.util.ZstdCompressor.compressor_id)
+        self.assertIs(Pyro4.util.get_compressor("zlib"), Pyro4.util.get_compressor_by_id(1))
+        self.assertRaises(Pyro4.errors.SerializeError, lambda: Pyro4.util.get_compressor("foobar"))
+        self.assertRaises(Pyro4.errors.SerializeError, lambda: Pyro4.util.get_compressor_by_id(0))
+        self.assertIn(b"\x01", Pyro4.util.get_compressor_ids())
+
+    def testCompressors(self):
+        ser = Pyro4.util.get_serializer("marshal")
+        bigdata = "the quick brown fox jumps over the lazy dog. " * 100
+        for name, compressor in Pyro4.util._compressors.items():
+            compressor = compressor.for_connection()
+            if compressor.stateful:
+                continue
+            data, compressed = ser.serializeData(bigdata, compress=compressor)
+            self.assertTrue(compressed, name)
+            self.assertLess(len(data), len(bigdata), name)
+            self.assertEqual(compressor.compress(ser.dumps(bigdata)), data, name)
+            self.assertEqual(bigdata, ser.deserializeData(data, compressed=compressor), name)
+            self.assertEqual(bigdata, ser.deserializeData(bytearray(data), compressed=compressor), name)
+        try:
+            config.COMPRESSION_LEVEL = 1
+            fast = Pyro4.util.get_compressor("zlib").compress(ser.dumps(bigdata))
+            config.COMPRESSION_LEVEL = 9
+            best = Pyro4.util.get_compressor("zlib").compress(ser.dumps(bigdata))
+            self.assertLess(len(best), len(fast))
+            config.COMPRESSION_LEVEL = 19   # a zstd level, too high for the others
+            self.assertEqual(9, Pyro4.util.get_compressor("zlib").level())
+            self.assertEqual(best, Pyro4.util.get_compressor("zlib").compress(ser.dumps(bigdata)))
+            self.assertEqual(9, Pyro4.util.get_compressor("bz2").level())
+            self.assertEqual(19, Pyro4.util.ZstdCompressor().level())
+            self.assertEqual(16, Pyro4.util.Lz4Compressor().level())
+            config.COMPRESSION_LEVEL = 0
+            self.assertEqual(1, Pyro4.util.get_compressor("bz2").level())
+            self.assertEqual(1, Pyro4.util.ZstdCompressor().level())
+        finally:
+            config.COMPRESSION_LEVEL = -1
+
+    def testZlibStreamCompressor(self):
+        ser = Pyro4.util.get_serializer("serpent")
+        sender = Pyro4.util.get_compressor("zlib-stream").for_connection()
+        receiver = Pyro4.util.get_compressor("zlib-stream").for_connection()
+        self.assertIsNot(sender, Pyro4.util.get_compressor("zlib-stream"))
+        sizes = []
+        for i in range(10):
+            call = {"name": "thing%d" % i, "temperature": 21.5, "status": "active", "tags": ["alpha", "beta"]}
+            data, compressed = ser.serializeCall("obj", "update", (call,), {}, compress=sender)
+            self.assertTrue(compressed)   # even small messages are compressed
+            sizes.append(len(data))
+            obj, method, vargs, kwargs = ser.deserializeCall(data, compressed=receiver)
+            self.assertEqual(call, vargs[0])
+        self.assertLess(sizes[-1], sizes[0] / 2)   # later messages reuse the compression context
+        self.assertRaises(Pyro4.errors.ProtocolError, receiver.decompress, b"garbage")
+
+    @unittest.skipIf(sys.version_info < (3, 3), "zdict requires python 3.3+")
+    def testZlibStreamCompressorZdict(self):
+        samples = [b'{"name":"thing","temperature":21.5,"status":"active"}'] * 3 + [b"rare"]
+        zdict = Pyro4.util.build_zdict(samples, size=100)
+        self.assertTrue(zdict.endswith(samples[0]))
+        self.assertLessEqual(len(zdict), 100)
+        sender = Pyro4.util.ZlibStreamCompressor(zdict)
+        receiver = Pyro4.util.ZlibStreamCompressor(zdict)
+        plain = Pyro4.util.ZlibStreamCompressor()
+        data = samples[0]
+        compressed = sender.compress(data)
+        self.assertLess(len(compressed), len(plain.compress(data)))
+        self.assertEqual(data, receiver.decompress(compressed))
+
+    def testNegotiateCompressor(self):
+        zlib = Pyro4.util.get_compressor("zlib")
+        bz2 = Pyro4.util.get_compressor("bz2")
+        try:
+            config.COMPRESSION_CODEC = "foobar"
+            self.assertIsNone(Pyro4.util.negotiate_compressor(b"\x01\x02"), "no negotiation if compression is disabled")
+            config.COMPRESSION = True
+            config.COMPRESSION_CODEC = "bz2"
+            self.assertIs(bz2, Pyro4.util.negotiate_compressor(b"\x01\x02"))
+            self.assertIs(zlib, Pyro4.util.negotiate_compressor(b"\x01\x03"))
+            self.assertIs(zlib, Pyro4.util.negotiate_compressor(None))
+            config.COMPRESSION_CODEC = "zlib"
+            self.assertIs(zlib, Pyro4.util.negotiate_compressor(b"\x01\x02"))
+            config.COMPRESSION_CODEC = "zlib-stream"
+            zdict_id = Pyro4.util.get_zdict_id()
+            stream = Pyro4.util.negotiate_compressor(b"\x01\x06", zdict_id)
+            self.assertIsInstance(stream, Pyro4.util.ZlibStreamCompressor)
+            self.assertIsNot(stream, Pyro4.util.negotiate_compressor(b"\x01\x06", zdict_id))
+            self.assertIs(zlib, Pyro4.util.negotiate_compressor(b"\x01\x06", b"\x00\x00\x00\x00"))
+            config.COMPRESSION_CODEC = "foobar"
+            self.assertRaises(Pyro4.errors.SerializeError, lambda: Pyro4.util.negotiate_compressor(b"\x01\x02"))
+        finally:
+            config.COMPRESSION_CODEC = "zlib"
+            config.COMPRESSION = False
+
     def testDictClassFail(self):
         o = pprint.PrettyPrinter(stream="dummy", width=42)
         d = Pyro4.util.SerializerBase.class_to_dict(o)
@@ -5,8 +5,10 @@ Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 """
 
 from __future__ import print_function
+import copy
 import time
 import sys
+import socket
 import threading
 import uuid
 import unittest
@@ -107,6 +109,16 @@ class ServerTestObject(object):
     def new_test_object(self):
         return ServerTestObject()
 
+    def contextValues(self, delay):
+        # part of the call context tests: the values must not be influenced by other concurrent calls
+        corr_id = Pyro4.core.current_context.correlation_id
+        annotation = Pyro4.core.current_context.annotations.get("XYZZ")
+        time.sleep(delay)
+        if annotation is not None:
+            Pyro4.core.current_context.response_annotations["ANN2"] = annotation
+        return [str(corr_id), annotation == Pyro4.core.current_context.annotations.get("XYZZ"),
+                corr_id == Pyro4.core.current_context.correlation_id]
+
 
 class NotEverythingExposedClass(object):
     def __init__(self, name):
@@ -120,6 +132,52 @@ class NotEverythingExposedClass(object):
         return "you should not see this"    # .... only when REQUIRE_EXPOSE is set to True is this valid
 
 
+@Pyro4.core.expose
+class CacheTestObject(object):
+    def __init__(self):
+        self.count = 0
+
+    @Pyro4.core.cacheable(ttl=0.5, maxsize=2)
+    def lookup(self, key, suffix=""):
+        self.count += 1
+        return [key + suffix, self.count]
+
+    @Pyro4.core.cacheable
+    def failing(self):
+        self.count += 1
+        raise ValueError("not cached")
+
+    @Pyro4.core.cacheable
+    def point(self, x):
+        self.count += 1
+        return {"__class__": "cachetest.Point", "x": x}
+
+    def calls(self):
+        return self.count
+
+
+@Pyro4.core.expose
+class StreamTestObject(object):
+    def rows(self, count):
+        for i in range(count):
+            yield [i, "row %d" % i]
+
+    def failing(self, count):
+        for i in range(count):
+            yield i
+        raise ValueError("stream failed")
+
+    def feed(self):
+        self.produced = 0
+        self.feed_closed = False
+        try:
+            while True:
+                self.produced += 1
+                yield self.produced
+        finally:
+            self.feed_closed = True
+
+
 class DaemonLoopThread(threading.Thread):
     def __init__(self, pyrodaemon):
         super(DaemonLoopThread, self).__init__()
@@ -215,6 +273,123 @@ class ServerTestsOnce(unittest.TestCase):
             self.assertEqual(b"pong", msg.data)
             Pyro4.message.Message.ping(p._pyroConnection)  # the convenience method that does the above
 
+    def testCircuitBreaker(self):
+        port = Pyro4.socketutil.findProbablyUnusedPort()
+        daemon = None
+        try:
+            config.CIRCUIT_BREAKER = 2
+            config.CIRCUIT_BREAKER_RESET = 0.2
+            Pyro4.core.reset_circuit_breakers()
+            with Pyro4.core.Proxy("PYRO:breaker@localhost:%d" % port) as p:
+                for _ in range(2):
+                    with self.assertRaises(Pyro4.errors.CommunicationError) as x:
+                        p._pyroBind()
+                    self.assertNotIsInstance(x.exception, Pyro4.errors.CircuitOpenError)
+                self.assertRaises(Pyro4.errors.CircuitOpenError, p._pyroBind)
+                stats = Pyro4.core.circuit_breaker_stats()
+                self.assertEqual({"opened": 1, "rejected": 1, "probes": 0, "recovered": 0, "open": ["localhost:%d" % port]}, stats)
+                # after the reset time a probe is let through, which closes the circuit again if the daemon is back
+                daemon = Pyro4.core.Daemon(port=port)
+                daemon.register(ServerTestObject(), "breaker")
+                thread = DaemonLoopThread(daemon)
+                thread.start()
+                thread.running.wait()
+                time.sleep(0.3)
+                p._pyroBind()
+                self.assertEqual(42, p.multiply(6, 7))
+                stats = Pyro4.core.circuit_breaker_stats()
+                self.assertEqual({"opened": 1, "rejected": 1, "probes": 1, "recovered": 1, "open": []}, stats)
+        finally:
+            config.CIRCUIT_BREAKER = 0
+            config.CIRCUIT_BREAKER_RESET = 5.0
+            Pyro4.core.reset_circuit_breakers()
+            if daemon is not None:
+                daemon.shutdown()
+                thread.join()
+
+    def testCircuitBreakerBookkeeping(self):
+        breakers = Pyro4.core._circuit_breakers
+        try:
+            config.CIRCUIT_BREAKER = 2
+            config.CIRCUIT_BREAKER_RESET = 0.2
+            Pyro4.core.reset_circuit_breakers()
+            # a probe that ends with an exception other than a connection error must not stay underway
+            breakers.failed("localhost:1")
+            breakers.failed("localhost:1")
+            time.sleep(0.3)
+            def interrupted(*args, **kwargs):
+                raise KeyboardInterrupt
+            createSocket, Pyro4.socketutil.createSocket = Pyro4.socketutil.createSocket, interrupted
+            try:
+                with Pyro4.core.Proxy("PYRO:breaker@localhost:1") as p:
+                    self.assertRaises(KeyboardInterrupt, p._pyroBind)
+            finally:
+                Pyro4.socketutil.createSocket = createSocket
+            self.assertFalse(breakers.circuits["localhost:1"].probing)
+            self.assertTrue(breakers.before_connect("localhost:1"), "a new probe must be let through")
+            breakers.probe_finished("localhost:1")
+            # closed circuits of locations that didn't fail again recently are forgotten
+            breakers.failed("localhost:2")
+            self.assertIn("localhost:2", breakers.circuits)
+            time.sleep(0.3)
+            breakers.failed("localhost:3")
+            self.assertNotIn("localhost:2", breakers.circuits)
+            self.assertIn("localhost:1", breakers.circuits, "open circuits must be kept")
+            breakers.failed("localhost:3")
+            self.assertEqual(["localhost:1", "localhost:3"], Pyro4.core.circuit_breaker_stats()["open"])
+        finally:
+            config.CIRCUIT_BREAKER = 0
+            config.CIRCUIT_BREAKER_RESET = 5.0
+            Pyro4.core.reset_circuit_breakers()
+
+    def testCallStats(self):
+        Pyro4.core.reset_call_stats()
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p.multiply(6, 7)
+            self.assertEqual({}, p._pyroCallStats(), "not recorded if CALL_STATS is disabled")
+            try:
+                config.CALL_STATS = True
+                for _ in range(10):
+                    self.assertEqual(42, p.multiply(6, 7))
+                p.oneway_multiply(6, 7)
+            finally:
+                config.CALL_STATS = False
+            stats = p._pyroCallStats()
+            self.assertEqual({"multiply", "oneway_multiply"}, set(stats))
+            multiply = stats["multiply"]
+            self.assertEqual(10, multiply["calls"])
+            self.assertEqual({"calls", "serialize", "send", "wait", "receive", "deserialize", "total",
+                              "request_bytes", "response_bytes"}, set(multiply))
+            for phase in ["serialize", "send", "wait", "receive", "deserialize"]:
+                self.assertEqual(10, multiply[phase]["count"])
+                self.assertLessEqual(multiply[phase]["max"], multiply["total"]["max"])
+            total = multiply["total"]
+            self.assertTrue(0 < total["min"] <= total["p50"] <= total["p90"] <= total["p99"] <= total["max"] < 5)
+            self.assertGreater(multiply["request_bytes"]["min"], Pyro4.message.Message.header_size)
+            self.assertGreater(multiply["response_bytes"]["min"], Pyro4.message.Message.header_size)
+            oneway = stats["oneway_multiply"]
+            self.assertEqual({"calls", "serialize", "send", "total", "request_bytes"}, set(oneway))
+            self.assertEqual(stats, dict((method, value) for (obj, method), value in Pyro4.core.call_stats().items()
+                                         if obj == "something"))
+            p._pyroCallStatsClear()
+            self.assertEqual({}, p._pyroCallStats())
+        self.assertIn(("something", "multiply"), Pyro4.core.call_stats())
+        Pyro4.core.reset_call_stats()
+        self.assertEqual({}, Pyro4.core.call_stats())
+
+    def testHmacDigestNegotiation(self):
+        self.daemon._pyroHmacKey = b"secret"
+        try:
+            config.HMAC_DIGEST = "sha256"
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                p._pyroHmacKey = b"secret"
+                self.assertEqual(55, p.multiply(5, 11))
+                self.assertEqual("sha256", p._pyroConnection.hmac_digest)
+                self.assertFalse(p._pyroConnection.hmac_skip)
+        finally:
+            config.HMAC_DIGEST = "sha1"
+            self.daemon._pyroHmacKey = None
+
     def testSequence(self):
         with Pyro4.core.Proxy(self.objectUri) as p:
             p.echo(1)
@@ -305,7 +480,7 @@ class ServerTestsOnce(unittest.TestCase):
             p._pyroBind()
             self.assertEqual({'value', 'dictionary'}, p._pyroAttrs)
             self.assertEqual({'echo', 'getDict', 'divide', 'nonserializableException', 'ping', 'oneway_delay', 'delayAndId', 'delay', 'testargs',
-                                  'multiply', 'oneway_multiply', 'getDictAttr', 'iterator', 'generator', 'response_annotation', 'blob', 'new_test_object'}, p._pyroMethods)
+                                  'contextValues', 'multiply', 'oneway_multiply', 'getDictAttr', 'iterator', 'generator', 'response_annotation', 'blob', 'new_test_object'}, p._pyroMethods)
             self.assertEqual({'oneway_multiply', 'oneway_delay'}, p._pyroOneway)
             p._pyroAttrs = None
             p._pyroGetMetadata()
@@ -528,6 +703,41 @@ class ServerTestsOnce(unittest.TestCase):
             self.assertRaises(ZeroDivisionError, next, results)  # 999//0 should raise this error
             self.assertRaises(StopIteration, next, results)  # no more results should be available after the error
 
+    def testBatchParallel(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            batch = Pyro4.core.batch(p, parallel=True)
+            for i in range(5):
+                batch.delayAndId(0.5, i)
+            start = time.time()
+            results = list(batch())
+            self.assertLess(time.time() - start, 2.0, "calls must run concurrently")
+            self.assertEqual(["slept for %d" % i for i in range(5)], results)
+            results = p._pyroInvokeBatch([("multiply", (7, 6), {}), ("divide", (999, 0), {}), ("multiply", (3, 4), {})], parallel=True)
+            self.assertEqual(3, len(results), "calls after an error must still be performed")
+            self.assertEqual(42, results[0])
+            self.assertIsInstance(results[1], Pyro4.futures._ExceptionWrapper)
+            self.assertIsInstance(results[1].exception, ZeroDivisionError)
+            self.assertEqual(12, results[2])
+            batch.multiply(7, 6)
+            batch.divide(999, 0)
+            batch.multiply(3, 4)
+            results = batch()
+            self.assertEqual(42, next(results))
+            self.assertRaises(ZeroDivisionError, next, results)
+            self.assertEqual(12, next(results), "the results after an error must still be available")
+            self.assertRaises(StopIteration, next, results)
+
+    def testPipelineTimeout(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p._pyroTimeout = 0.2
+            with p._pyroPipeline() as pipeline:
+                slow = pipeline.delay(1)
+                other = pipeline.multiply(2, 3)
+                self.assertRaises(Pyro4.errors.TimeoutError, lambda: slow.value)
+                self.assertRaises(Pyro4.errors.TimeoutError, lambda: other.value)
+                time.sleep(1)
+                self.assertEqual(6, pipeline.multiply(2, 3).value, "pipeline must reconnect after an error")
+
     def testAsyncProxy(self):
         with Pyro4.core.Proxy(self.objectUri) as p:
             Pyro4.core.asyncproxy(p)
@@ -566,6 +776,118 @@ class ServerTestsOnce(unittest.TestCase):
             self.assertEqual(22, value)
             self.assertEqual(3, holder.count.value)
 
+    def testMetadataCache(self):
+        Pyro4.core._metadata_cache.clear()
+        with Pyro4.core.Proxy(self.objectUri) as p1, Pyro4.core.Proxy(self.objectUri) as p2:
+            p1._pyroBind()
+            self.assertTrue(Pyro4.core._metadata_cache.tag(self.objectUri.location, self.objectUri.object))
+            p2._pyroBind()
+            self.assertEqual(p1._pyroMethods, p2._pyroMethods)
+            self.assertIs(p1._pyroMethods._SharedSet__items, p2._pyroMethods._SharedSet__items, "the metadata must be shared")
+            p1copy = copy.copy(p1)
+            self.assertIs(p1._pyroOneway._SharedSet__items, p1copy._pyroOneway._SharedSet__items)
+            # a proxy can change its metadata sets, they're copied when that happens
+            p1._pyroOneway.add("multiply")
+            self.assertIn("multiply", p1._pyroOneway)
+            self.assertNotIn("multiply", p2._pyroOneway)
+            self.assertNotIn("multiply", p1copy._pyroOneway)
+            p1copy = copy.copy(p1)
+            self.assertEqual(p1._pyroOneway, p1copy._pyroOneway)
+            p1copy._pyroOneway.discard("multiply")
+            self.assertIn("multiply", p1._pyroOneway)
+            self.assertEqual(set(p2._pyroOneway), p1copy._pyroOneway)
+            self.assertIsInstance(p1._pyroMethods | p1._pyroAttrs, set)
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                p._pyroBind()
+                self.assertNotIn("multiply", p._pyroOneway)
+        ServerTestObject.newly_added_method = Pyro4.core.expose(lambda self: None)
+        try:
+            with Pyro4.core.Proxy(self.objectUri) as p3:
+                p3._pyroBind()
+                self.assertEqual(p2._pyroMethods, p3._pyroMethods)
+                self.assertNotIn("newly_added_method", p3._pyroMethods)
+            self.daemon.resetMetadataCache(self.objectUri.object)
+            with Pyro4.core.Proxy(self.objectUri) as p4:
+                p4._pyroBind()
+                self.assertIn("newly_added_method", p4._pyroMethods)
+        finally:
+            del ServerTestObject.newly_added_method
+            self.daemon.resetMetadataCache(self.objectUri.object)
+        Pyro4.core._metadata_cache.clear()
+        with Pyro4.core.Proxy(self.objectUri) as p5:
+            p5._pyroBind()
+            self.assertEqual(p2._pyroMethods, p5._pyroMethods)
+            self.assertNotIn("newly_added_method", p5._pyroMethods)
+
+    def testResultCache(self):
+        uri = self.daemon.register(CacheTestObject())
+        with Pyro4.core.Proxy(uri) as p:
+            result = p.lookup("a")
+            self.assertEqual(["a", 1], result)
+            self.assertEqual({"lookup": (0.5, 2), "failing": (60.0, 128), "point": (60.0, 128)}, p._pyroCacheable)
+            result.append("changed by the caller")
+            result = p.lookup("a")
+            self.assertEqual(["a", 1], result, "changes to a returned result must not affect the cache")
+            result[0] = "changed by the caller"
+            self.assertEqual(["a", 1], p.lookup("a"))
+            self.assertEqual(["a!", 2], p.lookup("a", suffix="!"))
+            self.assertEqual(["a!", 2], p.lookup("a", suffix="!"))
+            self.assertEqual({"hits": 3, "misses": 2, "size": 2}, p._pyroCacheStats())
+            self.assertEqual(["b", 3], p.lookup("b"))   # evicts the least recently used one
+            self.assertEqual(["a!", 2], p.lookup("a", suffix="!"))
+            self.assertEqual(["a", 4], p.lookup("a"))
+            self.assertRaises(ValueError, p.failing)
+            self.assertRaises(ValueError, p.failing)
+            self.assertEqual(6, p.calls())
+            with p._pyroCacheBypass():
+                self.assertEqual(["a", 7], p.lookup("a"))
+            self.assertEqual(["a", 7], p.lookup("a"), "the bypassed call must refresh the cache")
+            time.sleep(0.6)
+            self.assertEqual(["a", 8], p.lookup("a"), "the cached result must expire")
+            p._pyroCacheResults = False
+            self.assertEqual(["a", 9], p.lookup("a"))
+            p._pyroCacheResults = True
+            p._pyroCacheClear()
+            self.assertEqual(0, p._pyroCacheStats()["size"])
+            self.assertEqual(["a", 10], p.lookup("a"))
+
+    def testResultCacheDeserializes(self):
+        class Point(object):
+            def __init__(self, x):
+                self.x = x
+
+        Pyro4.util.SerializerBase.register_dict_to_class("cachetest.Point", lambda classname, d: Point(d["x"]))
+        try:
+            uri = self.daemon.register(CacheTestObject())
+            with Pyro4.core.Proxy(uri) as p:
+                first = p.point(42)
+                cached = p.point(42)
+                self.assertEqual(1, p._pyroCacheStats()["hits"])
+                self.assertIsInstance(first, Point)
+                self.assertIsInstance(cached, Point, "a cache hit must return what a real call returns")
+                self.assertEqual(42, cached.x)
+                self.assertIsNot(first, cached)
+        finally:
+            Pyro4.util.SerializerBase.unregister_dict_to_class("cachetest.Point")
+
+    def testAsyncProxyReusesConnections(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            Pyro4.core.asyncproxy(p)
+            results = [p.multiply(i, 2) for i in range(50)]
+            self.assertEqual([i * 2 for i in range(50)], [r.value for r in results])
+            pool = p._Proxy__pyroAsyncPool
+            self.assertLessEqual(pool.size, config.ASYNC_WORKERS)
+            self.assertEqual(pool.size, pool.idle)
+            results = [p.multiply(i, 3) for i in range(50)]
+            self.assertEqual([i * 3 for i in range(50)], [r.value for r in results])
+            self.assertIs(pool, p._Proxy__pyroAsyncPool)
+            batch = Pyro4.core.batch(p)
+            batch.multiply(7, 6)
+            self.assertEqual([42], list(batch(asynchronous=True).value))
+            self.assertLessEqual(pool.size, config.ASYNC_WORKERS)
+        self.assertIsNone(p._Proxy__pyroAsyncPool)
+        self.assertEqual(0, pool.size)
+
     def testBatchOneway(self):
         with Pyro4.core.Proxy(self.objectUri) as p:
             batch = Pyro4.core.batch(p)
@@ -877,9 +1199,170 @@ class ServerTestsThreadNoTimeout(unittest.TestCase):
                 config.COMPRESSION = True
                 self.assertEqual(55, p.multiply(5, 11))
                 self.assertEqual("*" * 1000, p.multiply("*" * 500, 2))
+                self.assertIs(Pyro4.util.get_compressor("zlib"), p._pyroConnection.compressor)
         finally:
             config.COMPRESSION = False
 
+    def testStreamCompression(self):
+        try:
+            config.COMPRESSION = True
+            config.COMPRESSION_CODEC = "zlib-stream"
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                for i in range(5):
+                    self.assertEqual(5 * i, p.multiply(5, i))
+                    self.assertEqual("*" * 1000, p.multiply("*" * 500, 2))
+                self.assertIsInstance(p._pyroConnection.compressor, Pyro4.util.ZlibStreamCompressor)
+        finally:
+            config.COMPRESSION = False
+            config.COMPRESSION_CODEC = "zlib"
+
+    def testFragmentedMessages(self):
+        try:
+            config.FRAGMENT_SIZE = 1000
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                data = "x" * 50000
+                self.assertEqual(data, p.echo(data))
+                self.assertTrue(p._pyroConnection.fragments)
+        finally:
+            config.FRAGMENT_SIZE = 64 * 1024 * 1024
+
+    def testNegotiatedCompression(self):
+        try:
+            config.COMPRESSION = True
+            config.COMPRESSION_CODEC = "bz2"
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                self.assertEqual("*" * 1000, p.multiply("*" * 500, 2))
+                self.assertIs(Pyro4.util.get_compressor("bz2"), p._pyroConnection.compressor)
+        finally:
+            config.COMPRESSION = False
+            config.COMPRESSION_CODEC = "zlib"
+
+    def testPipelinedCalls(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            with p._pyroPipeline(max_inflight=10) as pipeline:
+                results = [pipeline.multiply(i, 3) for i in range(50)]
+                error = pipeline.divide(1, 0)
+                self.assertIsNone(pipeline.oneway_delay(0))
+                last = pipeline.echo("last")
+                self.assertEqual([i * 3 for i in range(50)], [r.value for r in results])
+                self.assertRaises(ZeroDivisionError, lambda: error.value)
+                self.assertEqual("last", last.value)
+            self.assertIsNone(p._pyroConnection, "the pipeline must use a connection of its own")
+            self.assertEqual(55, p.multiply(5, 11))
+
+    def testPipelinedCallsCallchain(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            with p._pyroPipeline() as pipeline:
+                result = pipeline.multiply(2, 3).then(lambda x: x * 10)
+                self.assertEqual(60, result.value)
+
+    def testAutoBatch(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            with p._pyroAutoBatch(max_calls=10, max_delay=0.5) as batch:
+                results = [batch.multiply(i, 3) for i in range(25)]
+                error = batch.divide(1, 0)
+                last = batch.echo("last")
+                self.assertEqual([i * 3 for i in range(20)], [r.value for r in results[:20]])
+                batch.flush()
+                self.assertEqual([i * 3 for i in range(25)], [r.value for r in results])
+                self.assertRaises(ZeroDivisionError, lambda: error.value)
+                self.assertEqual("last", last.value, "calls after a failing call must still be executed")
+                self.assertEqual({"calls": 28, "batches": 4}, batch.stats())
+                oneways = [batch.oneway_multiply(i, 2) for i in range(5)]
+                result = batch.multiply(2, 2)
+                self.assertEqual(4, result.value)
+                self.assertEqual([None] * 5, [r.value for r in oneways])
+                self.assertEqual({"calls": 34, "batches": 6}, batch.stats())
+            self.assertRaises(Pyro4.errors.PyroError, batch.multiply, 1, 1)
+            self.assertIsNone(p._pyroConnection, "the auto batch proxy must use a connection of its own")
+
+    def testAutoBatchThreads(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            with p._pyroAutoBatch(max_calls=1000, max_delay=0.05) as batch:
+                results = []
+
+                def producer(n):
+                    for i in range(20):
+                        results.append((n * i, batch.multiply(n, i)))
+                threads = [threading.Thread(target=producer, args=(n,)) for n in range(5)]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+            self.assertEqual(100, len(results))
+            for expected, result in results:
+                self.assertEqual(expected, result.value)
+            self.assertLess(batch.stats()["batches"], 10)
+
+    def testAutoBatchFullExecutor(self):
+        # all batches of an adapter are sent by a single task, so a full executor queue doesn't block the callers
+        executor = Pyro4.futures.BoundedExecutor(max_workers=1, max_queue=1)
+        original_executor, Pyro4.futures._executor = Pyro4.futures._executor, executor
+        release = threading.Event()
+        try:
+            executor.submit(release.wait)
+            time.sleep(0.05)    # the worker is busy now, and the queue has room for one more call
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                with p._pyroAutoBatch(max_calls=1, max_delay=10) as batch:
+                    results = []
+                    producer = threading.Thread(target=lambda: results.extend(batch.multiply(i, 2) for i in range(5)))
+                    producer.daemon = True
+                    producer.start()
+                    producer.join(1.0)
+                    self.assertFalse(producer.is_alive(), "sealing a batch must not wait for room in the executor")
+                    release.set()
+                    self.assertEqual([i * 2 for i in range(5)], [r.value for r in results])
+        finally:
+            release.set()
+            Pyro4.futures._executor = original_executor
+            executor.shutdown()
+
+    def testProxyPool(self):
+        with Pyro4.core.ProxyPool(self.objectUri, max_size=3) as pool:
+            self.assertEqual(55, pool.multiply(5, 11))
+            self.assertEqual(1, pool.size)
+            self.assertEqual(1, pool.idle)
+            results = []
+
+            def worker():
+                for i in range(10):
+                    results.append(pool.multiply(i, 2))
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(80, len(results))
+            self.assertLessEqual(pool.size, 3)
+            self.assertEqual(pool.size, pool.idle)
+            with pool.checkout() as proxy:
+                self.assertIsInstance(proxy, Pyro4.core.Proxy)
+                self.assertEqual("PYRO", proxy._pyroUri.protocol)
+                self.assertRaises(ZeroDivisionError, proxy.divide, 1, 0)
+            self.assertRaises(ZeroDivisionError, pool.divide, 1, 0)
+        self.assertEqual(0, pool.size)
+        self.assertRaises(Pyro4.errors.PyroError, pool.multiply, 1, 2)
+
+    def testProxyPoolCheckoutTimeout(self):
+        with Pyro4.core.ProxyPool(self.objectUri, max_size=1, checkout_timeout=0.1) as pool:
+            with pool.checkout():
+                self.assertRaises(Pyro4.errors.TimeoutError, pool.multiply, 1, 2)
+            self.assertEqual(2, pool.multiply(1, 2))
+
+    def testProxyPoolPingAndReap(self):
+        with Pyro4.core.ProxyPool(self.objectUri, ping_interval=0, idle_timeout=0.5) as pool:
+            with pool.checkout() as proxy:
+                proxy._pyroConnection.sock.shutdown(socket.SHUT_RDWR)   # break the connection
+            self.assertEqual(6, pool.multiply(2, 3), "ping check must replace the broken proxy")
+            self.assertEqual(1, pool.size)
+            with pool.checkout() as proxy1:
+                pass
+            time.sleep(0.6)
+            with pool.checkout() as proxy2:
+                self.assertIsNot(proxy1, proxy2, "the idle proxy must have been reaped")
+                self.assertIsNone(proxy1._pyroConnection)
+            self.assertEqual(1, pool.size)
+
     def testOnewayMetaOn(self):
         config.METADATA = True
         with Pyro4.core.Proxy(self.objectUri) as p:
@@ -1124,6 +1607,124 @@ class ServerTestsThreadNoTimeout(unittest.TestCase):
             # so 6 threads taking 0.5 seconds =~ 0.5 seconds passed
             self.assertTrue(0.4 < duration < 0.9)
 
+    def testServerCallContextPerCall(self):
+        results = {}
+
+        def client(number):
+            Pyro4.core.current_context.correlation_id = corr_id = uuid.uuid4()
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                p._pyroTimeout = 5.0
+                p._pyroBind()
+                Pyro4.core.current_context.annotations = {"XYZZ": str(number).encode()}
+                values = p.contextValues(0.2)
+                results[number] = (values, str(corr_id), Pyro4.core.current_context.response_annotations.get("ANN2"))
+
+        threads = [threading.Thread(target=client, args=(number,)) for number in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(4, len(results))
+        for number, (values, corr_id, response_annotation) in results.items():
+            self.assertEqual([corr_id, True, True], values)
+            self.assertEqual(str(number).encode(), response_annotation)
+        # a call without annotations doesn't see the ones of a previous call
+        Pyro4.core.current_context.correlation_id = None
+        Pyro4.core.current_context.annotations = {}
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            values = p.contextValues(0)
+        self.assertNotIn("ANN2", Pyro4.core.current_context.response_annotations)
+        self.assertEqual([True, True], values[1:])
+
+    def testChunkedStream(self):
+        uri = self.daemon.register(StreamTestObject())
+        try:
+            config.ITER_STREAM_CHUNK = 100
+            with Pyro4.core.Proxy(uri) as p:
+                self.assertEqual(list(range(1000)), [row[0] for row in p.rows(1000)])
+                self.assertLess(p._pyroSeq, 30, "items must be fetched in chunks")
+                rows = p.failing(5)
+                self.assertEqual([0, 1, 2, 3, 4], [next(rows) for _ in range(5)])
+                self.assertRaises(ValueError, next, rows)
+                self.assertEqual([], list(p.rows(0)))
+                config.ITER_STREAM_PREFETCH = True
+                self.assertEqual(list(range(1000)), [row[0] for row in p.rows(1000)])
+                rows = p.rows(1000)
+                self.assertEqual([0, "row 0"], next(rows))
+                rows.close()
+                self.assertRaises(StopIteration, next, rows)
+                time.sleep(0.05)
+                self.assertEqual({}, self.daemon.streaming_responses)
+                # when the executor is full, the items are fetched without prefetching instead of waiting for it
+                shared = Pyro4.futures._executor
+                executor = Pyro4.futures._executor = Pyro4.futures.BoundedExecutor(max_workers=1, max_queue=1)
+                release = threading.Event()
+                try:
+                    executor.submit(release.wait)
+                    time.sleep(0.05)
+                    executor.submit(release.wait)
+                    self.assertEqual(list(range(1000)), [row[0] for row in p.rows(1000)])
+                finally:
+                    release.set()
+                    executor.shutdown()
+                    Pyro4.futures._executor = shared
+        finally:
+            config.ITER_STREAM_CHUNK = 1
+            config.ITER_STREAM_PREFETCH = False
+
+    def testPushedStream(self):
+        obj = StreamTestObject()
+        uri = self.daemon.register(obj)
+        with Pyro4.core.Proxy(uri) as p:
+            if config.SERVERTYPE == "multiplex":
+                with self.assertRaises(Pyro4.errors.PyroError):
+                    next(p.rows(10).push())
+                return
+            rows = p.rows(1000)
+            self.assertEqual([0, "row 0"], next(rows))
+            self.assertEqual(list(range(1, 1000)), [row[0] for row in rows.push(window=10)])
+            rows = p.failing(5).push()
+            self.assertEqual([0, 1, 2, 3, 4], [next(rows) for _ in range(5)])
+            self.assertRaises(ValueError, next, rows)
+            self.assertEqual([], list(p.rows(0).push()))
+            feed = p.feed().push(window=10)
+            self.assertEqual([1, 2, 3], [next(feed) for _ in range(3)])
+            time.sleep(0.1)
+            self.assertLessEqual(obj.produced, 3 + 10 + 1, "the daemon must not run ahead more than the window")
+            self.assertEqual(4, next(feed))
+            feed.close()
+            self.assertRaises(StopIteration, next, feed)
+            time.sleep(0.1)
+            self.assertEqual({}, self.daemon.streaming_responses)
+            self.assertEqual([[0, "row 0"]], list(p.rows(1)), "the proxy itself must still be usable")
+            # closing the stream also stops the daemon when it is waiting for credits
+            feed = p.feed().push(window=10)
+            self.assertEqual(1, next(feed))
+            time.sleep(0.1)
+            self.assertFalse(obj.feed_closed)
+            p._pyroInvoke("close_stream", [feed.streamId], {}, objectId=Pyro4.constants.DAEMON_NAME)
+            time.sleep(0.5)
+            self.assertTrue(obj.feed_closed, "the daemon must notice the close while waiting for credits")
+            self.assertEqual(list(range(2, 11)), list(feed))
+
+    def testPushedStreamTakesOverConnection(self):
+        if config.SERVERTYPE == "multiplex":
+            return
+        uri = self.daemon.register(StreamTestObject())
+        with Pyro4.core.Proxy(uri) as p:
+            rows = p.rows(20)
+            items = p._pyroPushedItems(rows.streamId, 4)
+            self.assertRaises(Pyro4.errors.PyroError, p.rows, 1)
+            other = []
+            thread = threading.Thread(target=lambda: other.append(list(p.rows(2))))
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive(), "calls from other threads must wait until the stream has ended")
+            self.assertEqual(list(range(20)), [row[0] for row in items])
+            thread.join(2)
+            self.assertEqual([[[0, "row 0"], [1, "row 1"]]], other)
+            del rows
+
     def testGeneratorProxyClose(self):
         p = Pyro4.core.Proxy(self.objectUri)
         generator = p.generator()
@@ -336,6 +336,84 @@ class TestSocketutil(unittest.TestCase):
         ss.close()
         cs.close()
 
+    def testReceiveDataInto(self):
+        ss = SU.createSocket(bind=("localhost", 0), timeout=2)
+        port = ss.getsockname()[1]
+        cs = SU.createSocket(connect=("localhost", port), timeout=2)
+        a = ss.accept()
+        try:
+            for waitall in (True, False):
+                config.USE_MSG_WAITALL = waitall
+                for size in [1, 1000, 60000, 65600, 80000, 999999]:
+                    SU.sendData(cs, tobytes("x") * size)
+                    buffer = bytearray(size)
+                    self.assertEqual(size, SU.receiveDataInto(a[0], buffer))
+                    self.assertEqual(tobytes("x") * size, buffer)
+            SU.sendData(cs, tobytes("y") * 100)
+            cs.shutdown(socket.SHUT_WR)
+            buffer = bytearray(200)
+            with self.assertRaises(Pyro4.errors.ConnectionClosedError) as x:
+                SU.receiveDataInto(a[0], buffer)
+            self.assertEqual(100, x.exception.partialSize)
+            self.assertEqual(tobytes("y") * 100, buffer[:100])
+        finally:
+            config.USE_MSG_WAITALL = hasattr(socket, "MSG_WAITALL") and platform.system() != "Windows"
+            a[0].close()
+            ss.close()
+            cs.close()
+
+    def testSocketConnectionRecvLarge(self):
+        ss = SU.createSocket(bind=("localhost", 0), timeout=2)
+        port = ss.getsockname()[1]
+        cs = SU.createSocket(connect=("localhost", port), timeout=2)
+        a = ss.accept()
+        conn = SU.SocketConnection(a[0])
+        try:
+            config.USE_MSG_WAITALL = False
+            SU.sendData(cs, tobytes("z") * 500000)
+            data = conn.recv(500000)
+            self.assertIsInstance(data, bytearray)
+            self.assertEqual(tobytes("z") * 500000, data)
+            SU.sendData(cs, tobytes("z") * 5000)
+            data = conn.recv(5000)
+            self.assertIsInstance(data, bytes)
+            self.assertEqual(tobytes("z") * 5000, data)
+        finally:
+            config.USE_MSG_WAITALL = hasattr(socket, "MSG_WAITALL") and platform.system() != "Windows"
+            conn.close()
+            ss.close()
+            cs.close()
+
+    @unittest.skipUnless(hasattr(socket.socket, "sendmsg"), "sendmsg required")
+    def testSendDataVectored(self):
+        ss = SU.createSocket(bind=("localhost", 0), timeout=2)
+        port = ss.getsockname()[1]
+        cs = SU.createSocket(connect=("localhost", port), timeout=2)
+        a = ss.accept()
+        try:
+            parts = [tobytes("header"), b"", bytearray(tobytes("annotations")), tobytes("x") * 300000]
+            SU.sendDataVectored(cs, parts)
+            data = SU.receiveData(a[0], 6 + 11 + 300000)
+            self.assertEqual(b"".join(parts), data)
+        finally:
+            a[0].close()
+            ss.close()
+            cs.close()
+
+    def testSocketConnectionSendmsg(self):
+        ss = SU.createSocket(bind=("localhost", 0), timeout=2)
+        port = ss.getsockname()[1]
+        cs = SU.createSocket(connect=("localhost", port), timeout=2)
+        a = ss.accept()
+        conn = SU.SocketConnection(cs)
+        try:
+            conn.sendmsg([tobytes("foo"), tobytes("bar") * 1000])
+            self.assertEqual(tobytes("foo") + tobytes("bar") * 1000, SU.receiveData(a[0], 3003))
+        finally:
+            a[0].close()
+            ss.close()
+            conn.close()
+
     def testMsgWaitAllConfig(self):
         if platform.system() == "Windows":
             # default config should be False on these platforms even though socket.MSG_WAITALL might exist
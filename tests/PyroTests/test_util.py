@@ -338,6 +338,45 @@ class TestMetaAndExpose(unittest.TestCase):
         self.assertEqual({"classmethod", "staticmethod", "oneway", "__dunder__", "method", "exposed",
                           "oneway2", "sub_exposed", "sub_unexposed"}, m["methods"])
 
+    def testCacheable(self):
+        class Thingy(object):
+            @Pyro4.core.expose
+            @Pyro4.core.cacheable(ttl=10, maxsize=5)
+            def lookup(self):
+                pass
+
+            @Pyro4.core.expose
+            @Pyro4.core.cacheable
+            def other(self):
+                pass
+
+            @Pyro4.core.cacheable
+            def notexposed(self):
+                pass
+
+        m = Pyro4.util.get_exposed_members(Thingy)
+        self.assertEqual({"lookup", "other"}, m["methods"])
+        self.assertEqual({"lookup": (10, 5), "other": (60.0, 128)}, m["cacheable"])
+        m = Pyro4.util.get_exposed_members(Thingy, as_lists=True)
+        self.assertEqual({"lookup": [10, 5], "other": [60.0, 128]}, m["cacheable"])
+        self.assertNotIn("cacheable", Pyro4.util.get_exposed_members(MyThingFullExposed))
+
+    def testIdempotent(self):
+        class Thingy(object):
+            @Pyro4.core.expose
+            @Pyro4.core.idempotent
+            def lookup(self):
+                pass
+
+            @Pyro4.core.expose
+            def other(self):
+                pass
+
+        m = Pyro4.util.get_exposed_members(Thingy)
+        self.assertEqual({"lookup"}, m["idempotent"])
+        self.assertEqual(["lookup"], Pyro4.util.get_exposed_members(Thingy, as_lists=True)["idempotent"])
+        self.assertNotIn("idempotent", Pyro4.util.get_exposed_members(MyThingFullExposed))
+
     def testExposePrivateFails(self):
         with self.assertRaises(AttributeError):
             class Test1(object):
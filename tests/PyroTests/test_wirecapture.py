@@ -0,0 +1,106 @@
+"""
+Tests for the wire capture and replay.
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+import os
+import time
+import threading
+import unittest
+import Pyro4.core
+import Pyro4.message
+import Pyro4.utils.wirecapture as wirecapture
+from Pyro4.configuration import config
+from testsupport import *
+
+
+CAPTUREFILE = "pyro-test-capture.bin"
+
+
+@Pyro4.core.expose
+class CaptureTestObject(object):
+    def multiply(self, x, y):
+        return x * y
+
+    @Pyro4.core.oneway
+    def oneway_multiply(self, x, y):
+        return x * y
+
+    def fail(self):
+        raise ValueError("failure")
+
+
+class WireCaptureTests(unittest.TestCase):
+    def setUp(self):
+        if os.path.exists(CAPTUREFILE):
+            os.remove(CAPTUREFILE)
+        self.daemon = Pyro4.core.Daemon(port=0)
+        self.uri = self.daemon.register(CaptureTestObject(), "capture")
+        self.daemonthread = threading.Thread(target=self.daemon.requestLoop)
+        self.daemonthread.daemon = True
+        self.daemonthread.start()
+
+    def tearDown(self):
+        config.WIRECAPTURE = ""
+        self.daemon.shutdown()
+        self.daemonthread.join()
+        if wirecapture._capture_file.file:
+            wirecapture._capture_file.file.close()
+            wirecapture._capture_file.file = wirecapture._capture_file.filename = None
+        if os.path.exists(CAPTUREFILE):
+            os.remove(CAPTUREFILE)
+
+    def testCaptureAndReplay(self):
+        config.WIRECAPTURE = CAPTUREFILE
+        with Pyro4.core.Proxy(self.uri) as p:
+            for i in range(5):
+                self.assertEqual(i * 6, p.multiply(i, 6))
+            p.oneway_multiply(5, 6)
+            time.sleep(0.05)
+        config.WIRECAPTURE = ""
+        captured = list(wirecapture.read_capture(CAPTUREFILE))
+        sent = [c for c in captured if c.direction == wirecapture.SENT]
+        received = [c for c in captured if c.direction == wirecapture.RECEIVED]
+        # the proxy and the daemon both capture, so every message is in there twice (sent and received)
+        self.assertEqual(len(sent), len(received))
+        requests = [c.message.type for c in sent
+                    if c.message.type != Pyro4.message.MSG_CONNECTOK and c.message.type != Pyro4.message.MSG_RESULT]
+        self.assertEqual([Pyro4.message.MSG_CONNECT] + [Pyro4.message.MSG_INVOKE] * 6, requests)
+        self.assertEqual(2, len(set(c.connection_id for c in captured)))
+        timestamps = [c.timestamp for c in captured]
+        self.assertEqual(sorted(timestamps), timestamps)
+        msg = Pyro4.message.Message.recv(ConnectionMock(sent[-1].frame))
+        self.assertTrue(msg.flags & Pyro4.message.FLAGS_ONEWAY)
+        results = wirecapture.replay(CAPTUREFILE, "%s:%d" % (self.uri.host, self.uri.port), speed=0)
+        self.assertEqual(7, results["requests"])
+        self.assertEqual(0, results["errors"])
+        self.assertEqual(6, len(results["latencies"]))   # connect + 5 calls, the oneway call has no response
+        self.assertEqual(sorted(results["latencies"]), results["latencies"])
+
+    def testReplayErrors(self):
+        config.WIRECAPTURE = CAPTUREFILE
+        with Pyro4.core.Proxy(self.uri) as p:
+            self.assertRaises(ValueError, p.fail)
+        config.WIRECAPTURE = ""
+        results = wirecapture.replay(CAPTUREFILE, "%s:%d" % (self.uri.host, self.uri.port), speed=0, direction=wirecapture.RECEIVED)
+        self.assertEqual(2, results["requests"])
+        self.assertEqual(1, results["errors"])
+
+    def testInvalidFile(self):
+        with open(CAPTUREFILE, "wb") as f:
+            f.write(b"NOTPYRO!\x00\x01\x00\x30")
+        with self.assertRaises(Pyro4.errors.ProtocolError):
+            list(wirecapture.read_capture(CAPTUREFILE))
+
+    def testPercentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, wirecapture.percentile(values, 50))
+        self.assertEqual(99, wirecapture.percentile(values, 99))
+        self.assertEqual(100, wirecapture.percentile(values, 100))
+        self.assertEqual(1, wirecapture.percentile(values, 0))
+        self.assertEqual(0.0, wirecapture.percentile([], 50))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+Compares asynchronous proxy calls on the shared bounded executor (that reuses connected proxy copies),
+with the old way of doing them: a new thread, proxy copy and connection handshake for every call.
+"""
+
+from __future__ import print_function
+from timeit import default_timer as perf_timer
+import copy
+import threading
+import Pyro4
+import Pyro4.futures
+
+
+CALLS = 10000
+
+
+@Pyro4.expose
+class Thing(object):
+    def multiply(self, x, y):
+        return x * y
+
+
+def old_async_call(proxy, methodname, *args):
+    # this is how the asynchronous proxy did its calls before the shared executor
+    result = Pyro4.futures.FutureResult()
+
+    def call():
+        try:
+            with copy.copy(proxy) as p:
+                result.value = getattr(p, methodname)(*args)
+        except Exception as x:
+            result.value = Pyro4.futures._ExceptionWrapper(x)
+
+    thread = threading.Thread(target=call)
+    thread.daemon = True
+    thread.start()
+    return result
+
+
+def run():
+    Pyro4.config.THREADPOOL_SIZE = 200
+    daemon = Pyro4.Daemon()
+    uri = daemon.register(Thing, "thing")
+    thread = threading.Thread(target=daemon.requestLoop)
+    thread.daemon = True
+    thread.start()
+    print("%d asynchronous calls, %d executor workers\n" % (CALLS, Pyro4.config.ASYNC_WORKERS))
+    with Pyro4.Proxy(uri) as p:
+        p._pyroBind()
+        start = perf_timer()
+        results = [old_async_call(p, "multiply", i, 2) for i in range(CALLS)]
+        assert [r.value for r in results] == [i * 2 for i in range(CALLS)]
+        old = CALLS / (perf_timer() - start)
+        print("thread+connection per call: %8.0f calls/sec" % old)
+        Pyro4.asyncproxy(p)
+        start = perf_timer()
+        results = [p.multiply(i, 2) for i in range(CALLS)]
+        assert [r.value for r in results] == [i * 2 for i in range(CALLS)]
+        new = CALLS / (perf_timer() - start)
+        print("shared executor:            %8.0f calls/sec  (%.1fx)" % (new, new / old))
+    daemon.shutdown()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,59 @@
+"""
+Measures the cost of the message hmac for the available digest algorithms,
+in milliseconds per megabyte of payload data. It times the creation of a message
+(which computes the hmac) and receiving it again (which validates the hmac).
+The 'none' row is the same without hmac, which is what SSL_SKIP_HMAC gives you on SSL connections.
+"""
+
+from __future__ import print_function
+from timeit import default_timer as perf_timer
+import hashlib
+from Pyro4.message import Message, MSG_RESULT
+
+
+class ConnectionMock(object):
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def recv(self, size):
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+
+SIZES = [("10 KB", 10 * 1024), ("1 MB", 1024 * 1024), ("20 MB", 20 * 1024 * 1024)]
+DIGESTS = ["sha1", "sha256", "sha512", "blake2b", "blake2s"]
+
+
+def measure(data, hmac_key, digest):
+    count = max(5, 100 * 1024 * 1024 // len(data))
+    count = min(count, 2000)
+    start = perf_timer()
+    for _ in range(count):
+        msg = Message(MSG_RESULT, data, 42, 0, 1, hmac_key=hmac_key, hmac_digest=digest)
+        conn = ConnectionMock(msg.to_bytes())
+        Message.recv(conn, hmac_key=hmac_key)
+    return (perf_timer() - start) / count
+
+
+def run():
+    print("hmac cost (create + validate) in msec per MB of message data\n")
+    print("%-8s" % "", "".join("%12s" % name for name, _ in SIZES))
+    results = {}
+    for name, size in SIZES:
+        data = b"x" * size
+        results["none", name] = measure(data, None, None)
+        for digest in DIGESTS:
+            if hasattr(hashlib, digest):
+                # subtract the cost of the message handling itself
+                results[digest, name] = measure(data, b"secret", digest) - results["none", name]
+    for digest in ["none"] + DIGESTS:
+        if (digest, SIZES[0][0]) in results:
+            timings = [results[digest, name] * 1000.0 / (size / 1024.0 / 1024.0) for name, size in SIZES]
+            print("%-8s" % digest, "".join("%12.3f" % t for t in timings))
+    print("\n('none' is the cost of the message handling itself, without hmac)")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,99 @@
+"""
+Compares normal (one at a time) remote calls with pipelined remote calls on a single connection.
+The connection goes through a local relay that delays all data by a fixed amount of time,
+to simulate a network link with a higher latency.
+"""
+
+from __future__ import print_function
+from timeit import default_timer as perf_timer
+import collections
+import socket
+import threading
+import time
+import Pyro4
+
+
+LATENCIES = [0.0, 0.001, 0.005, 0.020]   # one way delay, in seconds
+CALLS = 400
+
+
+@Pyro4.expose
+class Thing(object):
+    def multiply(self, x, y):
+        return x * y
+
+
+def delay_line(source, destination, delay):
+    queue = collections.deque()
+    ready = threading.Condition()
+
+    def reader():
+        while True:
+            data = source.recv(65536)
+            with ready:
+                queue.append((time.time() + delay, data))
+                ready.notify()
+            if not data:
+                return
+
+    thread = threading.Thread(target=reader)
+    thread.daemon = True
+    thread.start()
+    while True:
+        with ready:
+            while not queue:
+                ready.wait()
+            deadline, data = queue.popleft()
+        wait = deadline - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        if not data:
+            destination.close()
+            return
+        destination.sendall(data)
+
+
+def relay(listener, target, delay):
+    while True:
+        client, _ = listener.accept()
+        server = socket.create_connection(target)
+        for source, destination in ((client, server), (server, client)):
+            thread = threading.Thread(target=delay_line, args=(source, destination, delay))
+            thread.daemon = True
+            thread.start()
+
+
+def run():
+    daemon = Pyro4.Daemon()
+    uri = daemon.register(Thing, "thing")
+    thread = threading.Thread(target=daemon.requestLoop)
+    thread.daemon = True
+    thread.start()
+    print("%d calls per measurement\n" % CALLS)
+    print("%12s %14s %14s %14s" % ("latency", "normal", "pipelined", "speedup"))
+    for latency in LATENCIES:
+        listener = socket.socket()
+        listener.bind(("localhost", 0))
+        listener.listen(5)
+        thread = threading.Thread(target=relay, args=(listener, (uri.host, uri.port), latency))
+        thread.daemon = True
+        thread.start()
+        relayed_uri = "PYRO:thing@localhost:%d" % listener.getsockname()[1]
+        with Pyro4.Proxy(relayed_uri) as p:
+            p._pyroBind()
+            start = perf_timer()
+            for i in range(CALLS):
+                p.multiply(i, 2)
+            normal = CALLS / (perf_timer() - start)
+            with p._pyroPipeline(max_inflight=200) as pipeline:
+                pipeline.multiply(0, 2).value   # make the connection
+                start = perf_timer()
+                results = [pipeline.multiply(i, 2) for i in range(CALLS)]
+                [r.value for r in results]
+                pipelined = CALLS / (perf_timer() - start)
+        print("%9.1f ms %9.0f/sec %9.0f/sec %13.1fx" % (latency * 1000, normal, pipelined, pipelined / normal))
+    daemon.shutdown()
+
+
+if __name__ == "__main__":
+    run()
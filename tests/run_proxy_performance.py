@@ -0,0 +1,87 @@
+"""
+Measures the overhead of the proxy's own invoke path. The daemon runs in a separate process
+on a local unix domain socket, so the calls per second depend mostly on the local round trip,
+and the CPU time that the client process spends per call is the overhead of the proxy itself.
+"""
+
+from __future__ import print_function
+from timeit import default_timer as perf_timer
+import multiprocessing
+import os
+import tempfile
+import time
+import Pyro4
+
+
+CALLS = 2000
+RUNS = 25   # the best of these runs is reported, to reduce the influence of other activity on the machine
+process_time = getattr(time, "process_time", None) or time.clock   # python 2.7 doesn't have process_time
+
+
+@Pyro4.expose
+class Thing(object):
+    def ping(self):
+        pass
+
+    def multiply(self, x, y):
+        return x * y
+
+
+class AnnotatingProxy(Pyro4.Proxy):
+    def _pyroAnnotations(self):
+        return {"XYZZ": b"annotation"}
+
+
+def serve(socketname):
+    daemon = Pyro4.Daemon(unixsocket=socketname)
+    daemon.register(Thing, "thing")
+    daemon.requestLoop()
+
+
+def measure(proxy, call):
+    call(proxy)  # warm up
+    best_rate = best_cpu = None
+    for _ in range(RUNS):
+        start, start_cpu = perf_timer(), process_time()
+        for _ in range(CALLS):
+            call(proxy)
+        rate = CALLS / (perf_timer() - start)
+        cpu = (process_time() - start_cpu) / CALLS * 1e6
+        best_rate = max(best_rate or rate, rate)
+        best_cpu = min(best_cpu or cpu, cpu)
+    return best_rate, best_cpu
+
+
+def run():
+    socketname = os.path.join(tempfile.mkdtemp(), "pyro-proxyperf.sock")
+    server = multiprocessing.Process(target=serve, args=(socketname,))
+    server.daemon = True
+    server.start()
+    while not os.path.exists(socketname):
+        time.sleep(0.05)
+    uri = "PYRO:thing@./u:" + socketname
+    print("best of %d runs of %d calls, over %s\n" % (RUNS, CALLS, socketname))
+    print("%-28s %12s %18s" % ("", "calls/sec", "client cpu/call"))
+    with Pyro4.Proxy(uri) as p:
+        p._pyroBind()
+        print("%-28s %12.0f %15.1f us" % (("p.ping()",) + measure(p, lambda p: p.ping())))
+        print("%-28s %12.0f %15.1f us" % (("p.multiply(6, 7)",) + measure(p, lambda p: p.multiply(6, 7))))
+    with AnnotatingProxy(uri) as p:
+        p._pyroBind()
+        print("%-28s %12.0f %15.1f us" % (("p.ping() with annotations",) + measure(p, lambda p: p.ping())))
+    Pyro4.config.CALL_STATS = True
+    with Pyro4.Proxy(uri) as p:
+        p._pyroBind()
+        print("%-28s %12.0f %15.1f us" % (("p.ping() with CALL_STATS",) + measure(p, lambda p: p.ping())))
+        print("\nphases of p.ping() (p50 / p99):")
+        for phase, stats in sorted(p._pyroCallStats()["ping"].items()):
+            if phase.endswith("_bytes"):
+                print("    %-16s %8d / %d bytes" % (phase, stats["p50"], stats["p99"]))
+            elif phase != "calls":
+                print("    %-16s %8.1f / %.1f us" % (phase, stats["p50"] * 1e6, stats["p99"] * 1e6))
+    server.terminate()
+    server.join()
+
+
+if __name__ == "__main__":
+    run()
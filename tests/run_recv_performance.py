@@ -0,0 +1,72 @@
+"""
+Compares the two ways of receiving message payload data from a socket:
+the chunked socketutil.receiveData (joins a list of chunks) and the
+zero-copy socketutil.receiveDataInto (recv_into a preallocated bytearray).
+Prints the time taken and the peak memory allocated during the receive.
+"""
+
+from __future__ import print_function
+from timeit import default_timer as perf_timer
+import socket
+import threading
+import tracemalloc
+import Pyro4.socketutil
+from Pyro4.configuration import config
+
+
+SIZES = [("1 KB", 1024), ("1 MB", 1024 * 1024), ("100 MB", 100 * 1024 * 1024)]
+
+
+def sender(sock, data, count):
+    for _ in range(count):
+        Pyro4.socketutil.sendData(sock, data)
+
+
+def receive_old(sock, size):
+    return Pyro4.socketutil.receiveData(sock, size)
+
+
+def receive_new(sock, size):
+    buffer = bytearray(size)
+    Pyro4.socketutil.receiveDataInto(sock, buffer)
+    return buffer
+
+
+def measure(receiver, size, count):
+    data = b"x" * size
+    s1, s2 = socket.socketpair()
+    try:
+        thread = threading.Thread(target=sender, args=(s1, data, count))
+        thread.daemon = True
+        thread.start()
+        tracemalloc.start()
+        start = perf_timer()
+        for _ in range(count):
+            result = receiver(s2, size)
+            assert len(result) == size
+            del result
+        duration = perf_timer() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        thread.join()
+        return duration / count, peak
+    finally:
+        s1.close()
+        s2.close()
+
+
+def run():
+    for waitall in (True, False):
+        config.USE_MSG_WAITALL = waitall
+        print("\nUSE_MSG_WAITALL =", waitall)
+        for name, size in SIZES:
+            count = max(3, min(2000, 200 * 1024 * 1024 // size))
+            old_time, old_peak = measure(receive_old, size, count)
+            new_time, new_peak = measure(receive_new, size, count)
+            print("%-7s receiveData: %10.1f usec  peak %9.1f kb  |  receiveDataInto: %10.1f usec  peak %9.1f kb" %
+                  (name, old_time * 1e6, old_peak / 1024.0, new_time * 1e6, new_peak / 1024.0))
+    config.reset()
+
+
+if __name__ == "__main__":
+    run()
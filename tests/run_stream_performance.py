@@ -0,0 +1,56 @@
+"""
+Compares streaming the items of a remote generator one item per round trip,
+with getting them in adaptive chunks (ITER_STREAM_CHUNK), with and without background prefetching,
+and with letting the daemon push them.
+"""
+
+from __future__ import print_function
+from timeit import default_timer as perf_timer
+import threading
+import Pyro4
+
+
+ROWS = 100000
+
+
+@Pyro4.expose
+class Report(object):
+    def rows(self, count):
+        for i in range(count):
+            yield [i, "row %d" % i, i * 1.5]
+
+
+def stream(uri, chunk, prefetch, window=0):
+    Pyro4.config.ITER_STREAM_CHUNK = chunk
+    Pyro4.config.ITER_STREAM_PREFETCH = prefetch
+    with Pyro4.Proxy(uri) as p:
+        p._pyroBind()
+        start = perf_timer()
+        rows = p.rows(ROWS)
+        if window:
+            rows = rows.push(window)
+        count = sum(1 for _ in rows)
+        assert count == ROWS
+        return ROWS / (perf_timer() - start)
+
+
+def run():
+    daemon = Pyro4.Daemon()
+    uri = daemon.register(Report, "report")
+    thread = threading.Thread(target=daemon.requestLoop)
+    thread.daemon = True
+    thread.start()
+    print("streaming %d rows\n" % ROWS)
+    single = stream(uri, 1, False)
+    print("one item per round trip:   %10.0f rows/sec" % single)
+    chunked = stream(uri, 1000, False)
+    print("chunks of up to 1000:      %10.0f rows/sec  (%.1fx)" % (chunked, chunked / single))
+    prefetched = stream(uri, 1000, True)
+    print("chunks + prefetch:         %10.0f rows/sec  (%.1fx)" % (prefetched, prefetched / single))
+    pushed = stream(uri, 1, False, 1000)
+    print("pushed, window of 1000:    %10.0f rows/sec  (%.1fx)" % (pushed, pushed / single))
+    daemon.shutdown()
+
+
+if __name__ == "__main__":
+    run()